@@ -5,6 +5,14 @@ const arxivService = require('../services/arxivService');
 const semanticScholarService = require('../services/semanticScholarService');
 const mlService = require('../services/mlService');
 
+// Paper fields the ML service indexes for filtered semantic search
+const embeddingMetadata = (paper) => ({
+  title: paper.title,
+  authors: paper.authors,
+  categories: paper.categories,
+  publishedDate: paper.publishedDate
+});
+
 // @desc    Search papers from external APIs
 // @route   GET /api/papers/search
 // @access  Private
@@ -69,7 +77,7 @@ const addPaper = async (req, res, next) => {
     paper = await Paper.create(paperData);
 
     // Generate embeddings asynchronously
-    mlService.generateEmbedding(paper._id, paper.abstract)
+    mlService.generateEmbedding(paper._id, paper.abstract, embeddingMetadata(paper))
       .then(embeddingId => {
         paper.embeddingId = embeddingId;
         paper.save();
@@ -181,11 +189,23 @@ const updatePaper = async (req, res, next) => {
       });
     }
 
+    const previous = paper;
     paper = await Paper.findByIdAndUpdate(req.params.id, req.body, {
       new: true,
       runValidators: true
     });
 
+    // Re-embed if the encoded text changed (the ML service replaces the old vector); otherwise
+    // re-send just the metadata its filters and keyword search use, if any of it changed
+    const metadata = embeddingMetadata(paper);
+    if (paper.title !== previous.title || paper.abstract !== previous.abstract) {
+      mlService.generateEmbedding(paper._id, paper.abstract, metadata)
+        .catch(err => logger.error('Embedding generation error:', err));
+    } else if (JSON.stringify(metadata) !== JSON.stringify(embeddingMetadata(previous))) {
+      mlService.updateEmbeddingMetadata(paper._id, metadata)
+        .catch(err => logger.error('Embedding metadata update error:', err));
+    }
+
     logger.info(`Paper updated: ${paper.title}`);
 
     res.status(200).json({
@@ -222,6 +242,9 @@ const deletePaper = async (req, res, next) => {
 
     await paper.deleteOne();
 
+    mlService.removeEmbedding(paper._id)
+      .catch(err => logger.error('Embedding removal error:', err));
+
     logger.info(`Paper deleted: ${paper.title}`);
 
     res.status(200).json({
@@ -239,10 +262,11 @@ const deletePaper = async (req, res, next) => {
 // @access  Private
 const semanticSearch = async (req, res, next) => {
   try {
-    const { query, limit = 10 } = req.body;
+    const { query, limit = 10, filters, mode } = req.body;
 
-    // Call ML service for semantic search
-    const results = await mlService.semanticSearch(query, limit);
+    // Call ML service for semantic search (filters are applied inside the vector search,
+    // mode 'hybrid' also matches exact terms such as model names and arXiv IDs)
+    const results = await mlService.semanticSearch(query, limit, filters, mode);
 
     logger.info(`Semantic search for: ${query}, found ${results.length} papers`);
 
@@ -285,7 +309,7 @@ const getPaperByArxivId = async (req, res, next) => {
       });
 
       // Generate embeddings asynchronously
-      mlService.generateEmbedding(paper._id, paper.abstract)
+      mlService.generateEmbedding(paper._id, paper.abstract, embeddingMetadata(paper))
         .then(embeddingId => {
           paper.embeddingId = embeddingId;
           paper.save();
@@ -4,11 +4,12 @@ const logger = require('../utils/logger');
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
 
 // @desc    Generate embedding for paper
-const generateEmbedding = async (paperId, text) => {
+const generateEmbedding = async (paperId, text, metadata = {}) => {
   try {
     const response = await axios.post(`${ML_SERVICE_URL}/embeddings/generate`, {
       paperId,
-      text
+      text,
+      metadata
     });
 
     logger.info(`Embedding generated for paper: ${paperId}`);
@@ -20,12 +21,46 @@ const generateEmbedding = async (paperId, text) => {
   }
 };
 
+// @desc    Remove paper embedding from the vector index
+const removeEmbedding = async (paperId) => {
+  try {
+    await axios.delete(`${ML_SERVICE_URL}/papers/${paperId}`);
+
+    logger.info(`Embedding removed for paper: ${paperId}`);
+  } catch (error) {
+    if (error.response && error.response.status === 404) {
+      return;
+    }
+    logger.error('Remove embedding error:', error.message);
+    throw new Error('Failed to remove embedding');
+  }
+};
+
+// @desc    Update an embedded paper's searchable metadata without re-encoding it
+const updateEmbeddingMetadata = async (paperId, metadata) => {
+  try {
+    await axios.put(`${ML_SERVICE_URL}/papers/${paperId}/metadata`, {
+      metadata
+    });
+
+    logger.info(`Embedding metadata updated for paper: ${paperId}`);
+  } catch (error) {
+    if (error.response && error.response.status === 404) {
+      return;
+    }
+    logger.error('Update embedding metadata error:', error.message);
+    throw new Error('Failed to update embedding metadata');
+  }
+};
+
 // @desc    Semantic search using embeddings
-const semanticSearch = async (query, limit = 10) => {
+const semanticSearch = async (query, limit = 10, filters = undefined, mode = 'semantic') => {
   try {
     const response = await axios.post(`${ML_SERVICE_URL}/search/semantic`, {
       query,
-      limit
+      limit,
+      filters,
+      mode
     });
 
     logger.info(`Semantic search performed: ${query}`);
@@ -37,6 +72,25 @@ const semanticSearch = async (query, limit = 10) => {
   }
 };
 
+// @desc    Semantic search for many queries in one request
+const batchSemanticSearch = async (queries, limit = 10, filters = undefined, mode = 'semantic') => {
+  try {
+    const response = await axios.post(`${ML_SERVICE_URL}/search/semantic/batch`, {
+      queries,
+      limit,
+      filters,
+      mode
+    });
+
+    logger.info(`Batch semantic search performed: ${queries.length} queries`);
+
+    return response.data.results.map((entry) => entry.results);
+  } catch (error) {
+    logger.error('Batch semantic search error:', error.message);
+    throw new Error('Failed to perform batch semantic search');
+  }
+};
+
 // @desc    Generate answer using RAG
 const generateAnswer = async (question, papers) => {
   try {
@@ -106,7 +160,10 @@ const extractGraphData = async (papers) => {
 
 module.exports = {
   generateEmbedding,
+  removeEmbedding,
+  updateEmbeddingMetadata,
   semanticSearch,
+  batchSemanticSearch,
   generateAnswer,
   extractGraphData
 };
\ No newline at end of file
@@ -0,0 +1,158 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+from config.settings import settings
+from utils import setup_logger
+from embeddings import embedding_generator
+from query_cache import normalize_query, query_cache
+
+logger = setup_logger(__name__)
+
+class AnswerKey(NamedTuple):
+    """Where a RAG answer is cached: paper set and configuration, question, and the question's embedding"""
+    library: str
+    question: str
+    vector: Optional[np.ndarray]
+
+def library_fingerprint(papers: List[Dict], config: str) -> str:
+    """Hash of the papers (sorted by ID, with their contents) and the answering configuration"""
+    contents = sorted((paper.get('id') or '', paper.get('title', ''), paper.get('abstract', '')) for paper in papers)
+    return hashlib.sha256(json.dumps([config, contents]).encode()).hexdigest()
+
+class AnswerCache:
+    """
+    Bounded LRU cache of RAG answers with a time-to-live
+
+    Keyed on a fingerprint of the paper set and the answering configuration
+    (LLM, embedding model, prompt budget) plus the normalised question.
+    Similarity matching is opt-in: with ANSWER_CACHE_SIMILARITY set, a
+    question with no exact entry still hits if its embedding is at least
+    that cosine-similar to a question cached for the same papers, so
+    rephrasings in a chat session don't pay for a generation. Questions
+    that close can still ask different things ("...before 2020" vs
+    "...after 2020"), so it is off by default.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, similarity: Optional[float]):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._entries: OrderedDict = OrderedDict()  # (library, question) -> (expires_at, vector, result)
+        self._libraries: Dict[str, Dict[str, None]] = {}  # library -> its cached questions
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    async def key(self, question: str, papers: List[Dict], config: str) -> AnswerKey:
+        """
+        Cache key for a question over a set of papers
+
+        The question is embedded (through the query cache) only when
+        similarity matching is on.
+
+        Args:
+            question: User question
+            papers: List of paper dicts with id, title and abstract
+            config: Identifies the model producing the answer
+
+        Returns:
+            AnswerKey for get() and put()
+        """
+        library = library_fingerprint(papers, f"{config}|{embedding_generator.fingerprint}|{settings.RAG_PROMPT_MAX_TOKENS}")
+        vector = None
+        if self.enabled and self.similarity is not None:
+            vector = np.asarray(await query_cache.get_embedding(question), dtype='float32')
+            vector = vector / (np.linalg.norm(vector) + 1e-12)
+        return AnswerKey(library, normalize_query(question), vector)
+
+    def get(self, key: AnswerKey) -> Optional[Dict]:
+        """
+        Cached answer for the key's question, or for the most similar cached question over the same papers
+
+        Returns:
+            Copy of the cached result dict, or None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live_entry((key.library, key.question), now)
+            if entry is not None:
+                self._entries.move_to_end((key.library, key.question))
+                self.hits += 1
+                return copy.deepcopy(entry[2])
+
+            if key.vector is not None:
+                questions = [question for question in list(self._libraries.get(key.library, ()))
+                             if self._live_entry((key.library, question), now) is not None]
+                if questions:
+                    scores = np.stack([self._entries[(key.library, question)][1] for question in questions]) @ key.vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        match = (key.library, questions[best])
+                        self._entries.move_to_end(match)
+                        self.similar_hits += 1
+                        logger.debug(f"Answer cache: '{key.question}' matched '{questions[best]}' ({scores[best]:.3f})")
+                        return copy.deepcopy(self._entries[match][2])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: AnswerKey, result: Dict):
+        """Cache a result under the key, evicting the least recently used entries beyond max_size"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[(key.library, key.question)] = (time.monotonic() + self.ttl_seconds, key.vector, copy.deepcopy(result))
+            self._entries.move_to_end((key.library, key.question))
+            self._libraries.setdefault(key.library, {})[key.question] = None
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._libraries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    def _live_entry(self, key, now: float):
+        """Entry for the key if it hasn't expired; expired entries are dropped (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key):
+        del self._entries[key]
+        questions = self._libraries[key[0]]
+        del questions[key[1]]
+        if not questions:
+            del self._libraries[key[0]]
+
+# Global instance
+answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL_SECONDS, settings.ANSWER_CACHE_SIMILARITY)
@@ -1,23 +1,38 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+import asyncio
+import json
+import threading
 import time
-from typing import List
+from typing import List, Optional
 import numpy as np
 
 from config.settings import settings
 from utils import setup_logger
 from embeddings import embedding_generator
 from vector_db import vector_db
+from query_cache import query_cache
+from answer_cache import answer_cache
+from embedding_batcher import embedding_batcher
+from generation_batcher import generation_batcher
+from executors import (
+    embedding_executor, index_executor, generation_executor, cpu_executor,
+    get_executor_stats, shutdown_executors
+)
+from bulk_ingest import bulk_ingestor
 from rag_model import rag_model
 from graph_extractor import graph_extractor
 from paper_parser import paper_parser
 from models import (
     EmbeddingRequest, EmbeddingResponse,
     SemanticSearchRequest, SemanticSearchResponse, SearchResult,
+    BatchSemanticSearchRequest, BatchSemanticSearchResponse, SearchFilters,
+    BuildSnapshotRequest, RollbackSnapshotRequest,
     RAGRequest, RAGResponse,
     GraphRequest, GraphResponse,
-    AddPaperRequest,
+    AddPaperRequest, UpdatePaperMetadataRequest,
     HealthResponse, ErrorResponse
 )
 
@@ -40,6 +55,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ==================== Readiness ====================
+
+# Heavy components, loaded and warmed up by a background task at startup:
+# name -> pending | loading | ready | failed
+component_status = {"vector_db": "pending", "embedding_model": "pending", "llm": "pending"}
+
+def _is_ready() -> bool:
+    return all(status == "ready" for status in component_status.values())
+
+def _require_ready(*components: str):
+    """Answer 503 until the components a route uses are loaded, instead of blocking on them"""
+    waiting = [name for name in components if component_status[name] != "ready"]
+    if waiting:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service warming up ({', '.join(waiting)} not ready)",
+            headers={"Retry-After": "5"}
+        )
+
+def _load_vector_db():
+    vector_db.load()
+    if settings.WARM_UP:
+        vector_db.warm_up()
+    vector_db.build_search_indexes()
+    vector_db.start_compaction()
+    vector_db.start_sync()
+
+def _load_embedding_model():
+    embedding_generator.load()
+    if settings.WARM_UP:
+        embedding_generator.warm_up()
+
+def _load_llm():
+    rag_model.load()
+    if settings.WARM_UP:
+        rag_model.warm_up()
+
+async def _start_component(name: str, load):
+    """Run a component's blocking load in a thread and record the outcome"""
+    component_status[name] = "loading"
+    started = time.time()
+    try:
+        await asyncio.to_thread(load)
+        component_status[name] = "ready"
+        logger.info(f"{name} ready after {time.time() - started:.1f}s")
+    except Exception as e:
+        component_status[name] = "failed"
+        logger.error(f"Failed to load {name}: {e}")
+
+async def _load_models():
+    # One after the other: importing transformers from two threads at once can fail
+    await _start_component("embedding_model", _load_embedding_model)
+    await _start_component("llm", _load_llm)
+
 # ==================== Health & Info Routes ====================
 
 @app.get("/", response_model=HealthResponse)
@@ -48,32 +117,49 @@ async def root():
     return {
         "status": "running",
         "message": "PaperNova ML Service is operational",
-        "models_loaded": True,
+        "models_loaded": _is_ready(),
         "vector_db_stats": vector_db.get_stats()
     }
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint"""
+    """
+    Liveness probe: answers as soon as the process serves HTTP, whether or not
+    the models have loaded (use /ready to decide on traffic)
+    """
     try:
         stats = vector_db.get_stats()
         return {
             "status": "healthy",
-            "message": "All systems operational",
-            "models_loaded": True,
+            "message": "All systems operational" if _is_ready() else "Loading models",
+            "models_loaded": _is_ready(),
             "vector_db_stats": stats
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once every component is loaded and warmed up, 503 before"""
+    return JSONResponse(
+        status_code=200 if _is_ready() else 503,
+        content={"ready": _is_ready(), "components": component_status}
+    )
+
 @app.get("/stats")
 async def get_stats():
     """Get service statistics"""
     return {
         "embedding_model": settings.EMBEDDING_MODEL,
-        "embedding_dimension": embedding_generator.get_dimension(),
+        "embedding_dimension": embedding_generator.get_dimension() if embedding_generator.loaded else None,
         "vector_db": vector_db.get_stats(),
+        "query_cache": query_cache.get_stats(),
+        "answer_cache": answer_cache.get_stats(),
+        "embedding_cache": embedding_generator.cache.get_stats() if embedding_generator.cache else None,
+        "embedding_batcher": embedding_batcher.get_stats(),
+        "generation_batcher": generation_batcher.get_stats(),
+        "executors": get_executor_stats(),
         "llm_provider": settings.LLM_PROVIDER
     }
 
@@ -82,24 +168,28 @@ async def get_stats():
 @app.post("/embeddings/generate", response_model=EmbeddingResponse)
 async def generate_embedding(request: EmbeddingRequest):
     """Generate embedding for a single paper"""
+    _require_ready("embedding_model", "vector_db")
     try:
         logger.info(f"Generating embedding for paper: {request.paperId}")
         
-        # Generate embedding
-        embedding = embedding_generator.generate_embedding(request.text)
+        # Generate embedding (batched with concurrent requests)
+        embedding = await embedding_batcher.embed(request.text)
         
         # Add to vector database
         metadata = {
+            **(request.metadata or {}),
             'id': request.paperId,
             'text': request.text[:500]  # Store truncated text
         }
-        vector_db.add_embedding(request.paperId, embedding, metadata)
+        await index_executor.run(vector_db.add_embedding, request.paperId, embedding, metadata)
         
         return {
             "embeddingId": request.paperId,
             "dimension": len(embedding),
             "success": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -107,6 +197,7 @@ async def generate_embedding(request: EmbeddingRequest):
 @app.post("/embeddings/batch")
 async def generate_embeddings_batch(papers: List[dict]):
     """Generate embeddings for multiple papers"""
+    _require_ready("embedding_model", "vector_db")
     try:
         logger.info(f"Generating embeddings for {len(papers)} papers")
         
@@ -115,52 +206,231 @@ async def generate_embeddings_batch(papers: List[dict]):
         metadatas = [{'id': p['paperId'], 'text': p['text'][:500]} for p in papers]
         
         # Generate embeddings
-        embeddings = embedding_generator.generate_embeddings_batch(texts)
+        embeddings = await embedding_executor.run(embedding_generator.generate_embeddings_batch, texts)
         
         # Add to vector database
-        vector_db.add_embeddings_batch(paper_ids, embeddings, metadatas)
+        await index_executor.run(vector_db.add_embeddings_batch, paper_ids, embeddings, metadatas)
         
         return {
             "success": True,
             "count": len(papers),
             "message": f"Generated {len(papers)} embeddings"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating batch embeddings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/embeddings/stream")
+async def stream_embeddings(request: Request, job: str):
+    """
+    Ingest an NDJSON stream of papers ({"paperId", "text", "metadata"} per line)
+    
+    The body is ingested as it arrives: every INGEST_CHUNK_SIZE records are
+    encoded and committed as soon as they are read, and progress is
+    streamed back as NDJSON after every committed chunk, while the upload
+    is still going. If the upload breaks off, the chunks committed so far
+    stay, and posting the same stream again with the same job id resumes
+    after the last committed line.
+    """
+    _require_ready("embedding_model", "vector_db")
+    if bulk_ingestor.is_running(job):
+        raise HTTPException(status_code=409, detail=f"Ingestion job {job} is already running")
+    
+    async def progress():
+        try:
+            async for update in bulk_ingestor.ingest(job, request.stream()):
+                yield json.dumps(update) + "\n"
+        except ClientDisconnect:
+            committed = await index_executor.run(bulk_ingestor.get_progress, job)
+            logger.warning(f"Client disconnected from ingestion job {job} after {committed} committed lines")
+        except Exception as e:
+            # The status code is already sent, report the failure in the stream
+            logger.error(f"Error in ingestion job {job}: {e}")
+            committed = await index_executor.run(bulk_ingestor.get_progress, job)
+            yield json.dumps({'job': job, 'committed': committed, 'error': str(e)}) + "\n"
+    
+    return BodyStreamingResponse(progress(), media_type="application/x-ndjson")
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose content is produced while the request body is still being read
+    
+    StreamingResponse watches for the client disconnecting by reading
+    request messages itself, which would take body chunks away from the
+    content generator. Here only the generator reads them;
+    request.stream() raises ClientDisconnect if the client goes away.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+@app.get("/embeddings/stream/{job}")
+async def stream_embeddings_progress(job: str):
+    """Progress of an ingestion job"""
+    _require_ready("vector_db")
+    return {
+        "job": job,
+        "committed": await index_executor.run(bulk_ingestor.get_progress, job),
+        "running": bulk_ingestor.is_running(job)
+    }
+
 # ==================== Search Routes ====================
 
 @app.post("/search/semantic", response_model=SemanticSearchResponse)
 async def semantic_search(request: SemanticSearchRequest):
     """Perform semantic search"""
+    _require_ready("embedding_model", "vector_db")
     try:
         logger.info(f"Semantic search: {request.query}")
         
-        # Generate query embedding
-        query_embedding = embedding_generator.generate_embedding(request.query)
+        # Generate query embedding (repeated queries come from the cache)
+        query_embedding = await query_cache.get_embedding(request.query)
         
         # Search vector database
-        results = vector_db.search(query_embedding, k=request.limit)
+        results = await index_executor.run(
+            vector_db.search, query_embedding, k=request.limit, filters=_search_filters(request.filters),
+            query_text=request.query if request.mode == "hybrid" else None
+        )
+        
+        return _search_response(request.query, results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in semantic search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search/semantic/batch", response_model=BatchSemanticSearchResponse)
+async def semantic_search_batch(request: BatchSemanticSearchRequest):
+    """Perform many semantic searches with one encoding pass and one index search"""
+    _require_ready("embedding_model", "vector_db")
+    try:
+        logger.info(f"Batch semantic search: {len(request.queries)} queries")
         
-        # Format results
-        search_results = []
-        for result in results:
-            search_results.append(SearchResult(
-                paperId=result['paperId'],
-                title=result.get('title', 'Unknown'),
-                abstract=result.get('abstract', result.get('text', '')),
-                similarity=result['similarity'],
-                distance=result['distance']
-            ))
+        # Generate all uncached query embeddings at once
+        query_embeddings = await embedding_executor.run(query_cache.get_embeddings, request.queries)
         
-        return SemanticSearchResponse(
-            query=request.query,
-            results=search_results,
-            count=len(search_results)
+        # Search vector database with the whole query matrix
+        batch_results = await index_executor.run(
+            vector_db.search_batch, query_embeddings, k=request.limit, filters=_search_filters(request.filters),
+            query_texts=request.queries if request.mode == "hybrid" else None
         )
+        
+        responses = [
+            _search_response(query, results)
+            for query, results in zip(request.queries, batch_results)
+        ]
+        return BatchSemanticSearchResponse(results=responses, count=len(responses))
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in semantic search: {e}")
+        logger.error(f"Error in batch semantic search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _search_filters(filters: Optional[SearchFilters]) -> Optional[dict]:
+    """Filters set on a search request, as passed to the vector database"""
+    return filters.model_dump(exclude_none=True) if filters else None
+
+def _search_response(query: str, results: List[dict]) -> SemanticSearchResponse:
+    """Format vector database hits as a search response"""
+    search_results = []
+    for result in results:
+        search_results.append(SearchResult(
+            paperId=result['paperId'],
+            title=result.get('title', 'Unknown'),
+            abstract=result.get('abstract', result.get('text', '')),
+            similarity=result['similarity'],
+            distance=result['distance'],
+            score=result.get('score')
+        ))
+    
+    return SemanticSearchResponse(
+        query=query,
+        results=search_results,
+        count=len(search_results)
+    )
+
+# ==================== Index Routes ====================
+
+@app.get("/index/recall")
+async def index_recall(k: int = 10, sample_size: int = 100,
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Measure recall@k of the ANN index against a flat baseline"""
+    _require_ready("vector_db")
+    try:
+        logger.info(f"Evaluating index recall@{k} on {sample_size} queries")
+        return await index_executor.run(
+            vector_db.evaluate_recall, k=k, sample_size=sample_size, nprobe=nprobe, ef_search=ef_search, timeout=None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error evaluating recall: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/index/compact")
+async def compact_index():
+    """Rebuild the index without deleted (tombstoned) vectors"""
+    _require_ready("vector_db")
+    try:
+        await index_executor.run(vector_db.compact, timeout=None)
+        return {
+            "success": True,
+            "vector_db": vector_db.get_stats()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error compacting index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/index/snapshots")
+async def list_snapshots():
+    """List retained index snapshots, the active one and the last build/rollback task"""
+    _require_ready("vector_db")
+    try:
+        return await index_executor.run(vector_db.get_snapshots)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing snapshots: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/index/snapshots", status_code=202)
+async def build_snapshot(request: BuildSnapshotRequest):
+    """Build a new index snapshot in the background and activate it when it is ready"""
+    _require_ready("vector_db")
+    try:
+        task = await index_executor.run(vector_db.request_snapshot_task, 'build', index_type=request.index_type)
+        return {"success": True, "task": task}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error queueing snapshot build: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/index/snapshots/rollback", status_code=202)
+async def rollback_snapshot(request: RollbackSnapshotRequest):
+    """Roll the index back to an earlier snapshot in the background"""
+    _require_ready("vector_db")
+    try:
+        task = await index_executor.run(vector_db.request_snapshot_task, 'rollback', version=request.version)
+        return {"success": True, "task": task}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error queueing snapshot rollback: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==================== RAG Routes ====================
@@ -168,6 +438,7 @@ async def semantic_search(request: SemanticSearchRequest):
 @app.post("/rag/generate", response_model=RAGResponse)
 async def generate_answer(request: RAGRequest):
     """Generate answer using RAG"""
+    _require_ready("embedding_model", "llm")
     try:
         start_time = time.time()
         logger.info(f"Generating answer for: {request.question}")
@@ -175,8 +446,13 @@ async def generate_answer(request: RAGRequest):
         # Convert papers to dict format
         papers = [p.dict() for p in request.papers]
         
-        # Generate answer
-        result = rag_model.generate_answer(request.question, papers)
+        # Repeated (or closely rephrased) questions over the same papers skip generation
+        key = await answer_cache.key(request.question, papers, rag_model.fingerprint)
+        result = answer_cache.get(key)
+        cached = result is not None
+        if not cached:
+            result = await generation_batcher.generate(request.question, papers)
+            answer_cache.put(key, result)
         
         processing_time = time.time() - start_time
         
@@ -184,12 +460,105 @@ async def generate_answer(request: RAGRequest):
             question=request.question,
             answer=result['answer'],
             citations=result['citations'],
-            processing_time=processing_time
+            processing_time=processing_time,
+            cached=cached
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating answer: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rag/stream")
+async def stream_answer(request: RAGRequest):
+    """
+    Generate an answer as Server-Sent Events
+    
+    Sends a "token" event per decoded piece of the answer as soon as it is
+    generated, then a "done" event with the full answer, citations,
+    time_to_first_token and processing_time (or an "error" event).
+    Generation stops once the client disconnects. A cached answer is sent
+    as a single "token" event.
+    """
+    _require_ready("embedding_model", "llm")
+    logger.info(f"Streaming answer for: {request.question}")
+    papers = [p.dict() for p in request.papers]
+    start_time = time.time()
+    
+    key = await answer_cache.key(request.question, papers, rag_model.fingerprint)
+    cached = answer_cache.get(key)
+    if cached is not None:
+        async def replay():
+            yield _sse("token", {"text": cached['answer']})
+            yield _sse("done", {
+                "question": request.question,
+                "answer": cached['answer'],
+                "citations": cached['citations'],
+                "time_to_first_token": time.time() - start_time,
+                "processing_time": time.time() - start_time,
+                "cached": True
+            })
+        return _sse_response(replay())
+    
+    loop = asyncio.get_running_loop()
+    pieces: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    
+    def generate():
+        try:
+            return rag_model.stream_answer(
+                request.question, papers, lambda text: loop.call_soon_threadsafe(pieces.put_nowait, text), stop
+            )
+        finally:
+            loop.call_soon_threadsafe(pieces.put_nowait, None)
+    
+    generation = asyncio.ensure_future(generation_executor.run(generate, timeout=None))
+    # A full pool rejects the call before its first await: answer 429 before the stream starts
+    await asyncio.sleep(0)
+    if generation.done() and generation.exception() is not None:
+        raise generation.exception()
+    
+    async def events():
+        first_token_time = None
+        try:
+            while (text := await pieces.get()) is not None:
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                yield _sse("token", {"text": text})
+            
+            result = await generation
+            if not stop.is_set():
+                answer_cache.put(key, result)
+            processing_time = time.time() - start_time
+            logger.info(f"Streamed answer in {processing_time:.2f}s (first token after {first_token_time or 0:.2f}s)")
+            yield _sse("done", {
+                "question": request.question,
+                "answer": result['answer'],
+                "citations": result['citations'],
+                "time_to_first_token": first_token_time,
+                "processing_time": processing_time,
+                "cached": False
+            })
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Runs when the client disconnects too (the response cancels this generator)
+            stop.set()
+            generation.cancel()  # drops the call if it is still queued
+    
+    return _sse_response(events())
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    # No caching or proxy buffering, so events reach the client as they are sent
+    return StreamingResponse(
+        events, media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================== Graph Routes ====================
 
 @app.post("/graph/extract", response_model=GraphResponse)
@@ -202,13 +571,15 @@ async def extract_graph(request: GraphRequest):
         papers = [p.dict() for p in request.papers]
         
         # Extract graph
-        graph_data = graph_extractor.extract_graph(papers)
+        graph_data = await cpu_executor.run(graph_extractor.extract_graph, papers)
         
         return GraphResponse(
             nodes=graph_data['nodes'],
             edges=graph_data['edges'],
             metadata=graph_data['metadata']
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error extracting graph: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -218,14 +589,15 @@ async def extract_graph(request: GraphRequest):
 @app.post("/papers/add")
 async def add_paper(request: AddPaperRequest):
     """Add paper to vector database"""
+    _require_ready("embedding_model", "vector_db")
     try:
         logger.info(f"Adding paper: {request.paperId}")
         
         # Create text from metadata
         text = f"{request.metadata.title}. {request.metadata.abstract}"
         
-        # Generate embedding
-        embedding = embedding_generator.generate_embedding(text)
+        # Generate embedding (batched with concurrent requests)
+        embedding = await embedding_batcher.embed(text)
         
         # Prepare metadata
         metadata = {
@@ -233,17 +605,20 @@ async def add_paper(request: AddPaperRequest):
             'title': request.metadata.title,
             'abstract': request.metadata.abstract,
             'authors': request.metadata.authors,
-            'categories': request.metadata.categories
+            'categories': request.metadata.categories,
+            'publishedDate': request.metadata.publishedDate
         }
         
         # Add to vector database
-        vector_db.add_embedding(request.paperId, embedding, metadata)
+        await index_executor.run(vector_db.add_embedding, request.paperId, embedding, metadata)
         
         return {
             "success": True,
             "paperId": request.paperId,
             "message": "Paper added successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error adding paper: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -258,7 +633,7 @@ async def parse_pdf(file: UploadFile = File(...)):
         pdf_bytes = await file.read()
         
         # Parse PDF
-        result = paper_parser.parse_pdf(pdf_bytes)
+        result = await cpu_executor.run(paper_parser.parse_pdf, pdf_bytes)
         
         return {
             "success": True,
@@ -266,6 +641,8 @@ async def parse_pdf(file: UploadFile = File(...)):
             "text": result['text'][:1000] + "...",  # Return truncated
             "num_pages": result['num_pages']
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error parsing PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -273,8 +650,9 @@ async def parse_pdf(file: UploadFile = File(...)):
 @app.get("/papers/{paper_id}")
 async def get_paper(paper_id: str):
     """Get paper from vector database"""
+    _require_ready("vector_db")
     try:
-        paper = vector_db.get_paper(paper_id)
+        paper = await index_executor.run(vector_db.get_paper, paper_id)
         if not paper:
             raise HTTPException(status_code=404, detail="Paper not found")
         return paper
@@ -284,13 +662,52 @@ async def get_paper(paper_id: str):
         logger.error(f"Error getting paper: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/papers/{paper_id}/metadata")
+async def update_paper_metadata(paper_id: str, request: UpdatePaperMetadataRequest):
+    """Update an indexed paper's searchable fields, keeping its vector"""
+    _require_ready("vector_db")
+    try:
+        logger.info(f"Updating metadata of paper: {paper_id}")
+        if not await index_executor.run(vector_db.update_metadata, paper_id, request.metadata):
+            raise HTTPException(status_code=404, detail="Paper not found")
+        return {
+            "success": True,
+            "paperId": paper_id,
+            "message": "Paper metadata updated successfully"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating paper metadata: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/papers/{paper_id}")
+async def delete_paper(paper_id: str):
+    """Remove paper and its vector from the vector database"""
+    _require_ready("vector_db")
+    try:
+        logger.info(f"Removing paper: {paper_id}")
+        if not await index_executor.run(vector_db.remove_paper, paper_id):
+            raise HTTPException(status_code=404, detail="Paper not found")
+        return {
+            "success": True,
+            "paperId": paper_id,
+            "message": "Paper removed successfully"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error removing paper: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ==================== Error Handlers ====================
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail}
+        content={"error": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -312,8 +729,9 @@ async def startup_event():
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Embedding Model: {settings.EMBEDDING_MODEL}")
     logger.info(f"LLM Provider: {settings.LLM_PROVIDER}")
-    logger.info(f"Vector DB: {vector_db.get_stats()}")
     logger.info("=" * 60)
+    # Load in the background so the liveness probe answers while models load
+    app.state.loading = asyncio.gather(_start_component("vector_db", _load_vector_db), _load_models())
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -321,8 +739,16 @@ async def shutdown_event():
     logger.info("Shutting down PaperNova ML Service...")
     # Save vector database
     try:
-        vector_db._save_index()
-        logger.info("Vector database saved successfully")
+        await embedding_batcher.stop()
+        await generation_batcher.stop()
+        shutdown_executors()
+        vector_db.stop_sync()
+        vector_db.stop_compaction()
+        if vector_db.loaded:
+            if vector_db.save_if_changed():
+                logger.info("Vector database saved successfully")
+            else:
+                logger.info("Vector database unchanged since its last snapshot")
     except Exception as e:
         logger.error(f"Error saving vector database: {e}")
 
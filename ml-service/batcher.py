@@ -0,0 +1,180 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException
+from utils import setup_logger
+from executors import ExecutorBusy, ExecutorTimeout
+
+logger = setup_logger(__name__)
+
+class BatcherStopped(HTTPException):
+    """The batcher was stopped (the service is shutting down) before a request got its result"""
+
+    def __init__(self, name: str):
+        super().__init__(status_code=503, detail=f"{name.capitalize()} batcher stopped, service shutting down")
+
+class Batcher(ABC):
+    """
+    Coalesce concurrent requests into batched calls
+
+    Requests wait in a queue until the oldest has waited the batching window
+    or max_batch_size requests are queued, then one _process call serves
+    them all. Requests arriving while a batch is being processed form the
+    next batch, so under load batches fill up without any added wait, and a
+    lone request waits at most the window. With max_queue set, requests
+    beyond it are answered 429 instead of queueing, and with timeout set a
+    request still without a result after that many seconds, queued or in
+    a running batch, is answered 504.
+
+    Subclasses implement _process, which returns one result per item in
+    order; an exception in an item's place fails only that item's request.
+    """
+
+    name = "batch"
+
+    def __init__(self, max_batch_size: int, window_ms: float, max_queue: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []  # (item, future, enqueued at)
+        self._running: List[Tuple[Any, asyncio.Future, float]] = []  # the batch being processed
+        self._arrived: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_batch = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.batch_sizes = {}  # power-of-two bucket -> batches
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result from the next batch"""
+        if self.max_queue is not None and len(self._pending) >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(self.name)
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future, time.monotonic()))
+        self.max_queued = max(self.max_queued, len(self._pending))
+        self._arrived.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        try:
+            # A timed-out future is cancelled, so the scheduler skips it if it is still queued
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ExecutorTimeout(self.name, self.timeout)
+
+    async def stop(self):
+        """Stop the scheduler, answering 503 to requests queued or in the batch being processed"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for _, future, _ in self._running + self._pending:
+            if not future.done():
+                future.set_exception(BatcherStopped(self.name))
+        self._running = []
+        self._pending.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'window_ms': self.window * 1000,
+            'queued': len(self._pending),
+            'max_queued': self.max_queued,
+            'max_queue': self.max_queue,
+            'rejected': self.rejected,
+            'timeout': self.timeout,
+            'timed_out': self.timed_out,
+            'batches': self.batches,
+            'requests': self.requests,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'max_batch': self.max_batch,
+            'batch_sizes': {f"<={size}": count for size, count in sorted(self.batch_sizes.items())},
+            'avg_queue_wait_ms': round(1000 * self.total_wait / self.requests, 2) if self.requests else 0.0,
+            'max_queue_wait_ms': round(1000 * self.max_wait, 2)
+        }
+
+    @abstractmethod
+    async def _process(self, items: List[Any]) -> List[Any]:
+        """Process one batch, returning a result (or an exception) per item in order"""
+
+    def _ensure_running(self):
+        """Start the scheduler on the running event loop at first use"""
+        if self._task is None or self._task.done():
+            self._arrived = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._arrived.wait()
+
+            # Fill the batch until the oldest request has waited the window
+            if len(self._pending) < self.max_batch_size:
+                timeout = self._pending[0][2] + self.window - time.monotonic()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if not self._pending:
+                self._arrived.clear()
+            if len(self._pending) < self.max_batch_size:
+                self._full.clear()
+
+            # Requests whose caller went away don't need processing
+            batch = [entry for entry in batch if not entry[1].done()]
+            if batch:
+                await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        started = time.monotonic()
+        self._record(len(batch), [started - enqueued for _, _, enqueued in batch])
+        # Kept when the scheduler is cancelled mid-batch, so stop() can answer these requests
+        self._running = batch
+        try:
+            results = await self._process([item for item, _, _ in batch])
+        except Exception as e:
+            self._running = []
+            if not isinstance(e, HTTPException):
+                logger.error(f"Error processing {self.name} batch: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._running = []
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _record(self, size: int, waits: List[float]):
+        self.batches += 1
+        self.requests += size
+        self.max_batch = max(self.max_batch, size)
+        bucket = 1 << (size - 1).bit_length()
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        self.total_wait += sum(waits)
+        self.max_wait = max(self.max_wait, max(waits))
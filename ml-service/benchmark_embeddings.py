@@ -0,0 +1,92 @@
+"""
+Compare the PyTorch and ONNX Runtime embedding backends
+
+Encodes a sample of papers with SentenceTransformer (PyTorch fp32) and the
+ONNX export (fp32 and int8), reports throughput for each and checks that
+the ONNX embeddings agree with PyTorch's by cosine similarity. Exits with
+status 1 if a backend falls below its minimum cosine, so it can gate a
+model or export change.
+
+Usage:
+    python benchmark_embeddings.py papers.jsonl --samples 2000 --threads 8
+"""
+
+import argparse
+import time
+import numpy as np
+from itertools import islice
+from pathlib import Path
+from config.settings import settings
+from utils import setup_logger
+from build_index import read_records, to_paper
+from onnx_encoder import INT8_FILE, OnnxEncoder, export_onnx_model, onnx_model_dir
+
+logger = setup_logger(__name__)
+
+def benchmark(name: str, encode, texts, batch_size: int):
+    """Encode texts once to warm up, then time a full pass"""
+    encode(texts[:batch_size])
+    started = time.perf_counter()
+    embeddings = np.asarray(encode(texts), dtype='float32')
+    elapsed = time.perf_counter() - started
+    logger.info(f"{name:<12} {len(texts) / elapsed:8.1f} texts/s ({elapsed:.2f}s)")
+    return embeddings, len(texts) / elapsed
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity"""
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and parity-check the embedding backends")
+    parser.add_argument("input", type=Path, help="JSONL or CSV file of papers (as for build_index.py)")
+    parser.add_argument("--samples", type=int, default=1000, help="Papers to encode")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for both backends (default: all)")
+    parser.add_argument("--min-cosine-fp32", type=float, default=0.999, help="Lowest acceptable cosine, ONNX fp32")
+    parser.add_argument("--min-cosine-int8", type=float, default=0.98, help="Lowest acceptable cosine, ONNX int8")
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    papers = (to_paper(record) for record in read_records(args.input))
+    texts = [paper['text'] for paper in islice(filter(None, papers), args.samples)]
+    if not texts:
+        raise SystemExit(f"No papers in {args.input}")
+
+    directory = onnx_model_dir(settings.EMBEDDING_ONNX_DIR, settings.EMBEDDING_MODEL)
+    if not (directory / INT8_FILE).exists():
+        export_onnx_model(settings.EMBEDDING_MODEL, directory, quantize=True)
+
+    logger.info("=" * 60)
+    logger.info(f"Encoding {len(texts)} papers with {settings.EMBEDDING_MODEL}, batch size {args.batch_size}")
+    logger.info("=" * 60)
+
+    model = SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
+    reference, baseline = benchmark(
+        "torch fp32", lambda batch: model.encode(batch, batch_size=args.batch_size, convert_to_numpy=True), texts, args.batch_size
+    )
+
+    failed = False
+    for quantized, minimum in ((False, args.min_cosine_fp32), (True, args.min_cosine_int8)):
+        name = "onnx int8" if quantized else "onnx fp32"
+        encoder = OnnxEncoder(directory, quantized=quantized, threads=args.threads, batch_size=args.batch_size)
+        embeddings, rate = benchmark(name, encoder.encode, texts, args.batch_size)
+        similarity = cosine(reference, embeddings)
+        ok = similarity.min() >= minimum
+        failed |= not ok
+        logger.info(
+            f"{'':<12} {rate / baseline:.2f}x torch, cosine mean {similarity.mean():.5f} "
+            f"min {similarity.min():.5f} (>= {minimum}: {'ok' if ok else 'FAILED'})"
+        )
+
+    logger.info("=" * 60)
+    if failed:
+        logger.error("❌ ONNX embeddings disagree with PyTorch")
+        raise SystemExit(1)
+    logger.info("✅ ONNX embeddings match PyTorch")
+
+if __name__ == "__main__":
+    main()
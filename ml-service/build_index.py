@@ -0,0 +1,202 @@
+"""
+Build a ready-to-serve vector index offline from a dump of papers
+
+Reads a JSONL or CSV file of papers, encodes them across a pool of
+processes and writes snapshots, metadata store and write-ahead log in the
+service's data layout under --output. Point the service at the result
+(or copy it over its data directory) to serve it.
+
+The job checkpoints after every chunk: the chunk's vectors and the number
+of input records consumed are committed together, so running the same
+command again after the job was killed resumes with the next chunk.
+
+Usage:
+    python build_index.py papers.jsonl --output ./data/build --workers 8
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from config.settings import settings
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Store state key holding the number of input records already added
+PROGRESS_KEY = "build:records"
+
+def read_records(path: Path) -> Iterator[Dict]:
+    """Yield raw paper dicts from a JSONL (one object per line) or CSV file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == '.csv':
+            yield from csv.DictReader(f)
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    # Still counted as a record, so resume positions stay aligned
+                    logger.warning(f"Invalid JSON on line {number}: {e}")
+                    yield {}
+
+def to_paper(record: Dict) -> Optional[Dict]:
+    """
+    Normalise a raw record into paperId, text to embed and metadata
+
+    Papers are embedded as "title. abstract" like /papers/add, or from
+    their "text" field when there is no abstract. In CSV dumps, list
+    fields (authors, categories) are separated by ";".
+    """
+    paper_id = record.get('paperId') or record.get('id') or record.get('arxivId')
+    title = record.get('title') or ''
+    abstract = record.get('abstract') or ''
+    text = f"{title}. {abstract}" if abstract else record.get('text') or title
+    if not paper_id or not text:
+        return None
+
+    metadata = {'id': str(paper_id), 'title': title, 'abstract': abstract or text[:500]}
+    for field in ('authors', 'categories'):
+        value = record.get(field) or []
+        metadata[field] = [v.strip() for v in value.split(';') if v.strip()] if isinstance(value, str) else value
+    if record.get('publishedDate'):
+        metadata['publishedDate'] = record['publishedDate']
+    return {'paperId': str(paper_id), 'text': text, 'metadata': metadata}
+
+def chunks(records: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    """Group records into lists of at most `size`"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _init_worker(threads: int):
+    """Split the CPU between worker processes instead of each using every core"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def _encode(texts: List[str]):
+    # The model loads on a worker's first batch (once per process). Loading it in
+    # the pool initializer would make the pool respawn workers forever if it fails.
+    from embeddings import embedding_generator
+    return embedding_generator.generate_embeddings_batch(texts)
+
+def encode_chunk(pool, papers: List[Dict], batch_size: int):
+    """
+    Encode a chunk with length-sorted batches spread over the pool
+
+    Sorting by length keeps the texts of a batch similarly long, so little
+    compute goes into padding. Vectors come back in the chunk's order.
+    """
+    order = sorted(range(len(papers)), key=lambda i: len(papers[i]['text']))
+    batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+    results = pool.map(_encode, [[papers[i]['text'] for i in batch] for batch in batches], chunksize=1)
+
+    embeddings = np.empty((len(papers), results[0].shape[1]), dtype='float32')
+    for batch, vectors in zip(batches, results):
+        embeddings[batch] = vectors
+    return embeddings
+
+def configure_output(output: Path, index_type: Optional[str], shards: Optional[int]):
+    """Point the vector database settings at the output directory"""
+    settings.CHECKPOINT_DIR = str(output / "vectors" / "checkpoints")
+    settings.WAL_PATH = str(output / "vectors" / "wal.log")
+    settings.WRITER_LOCK_PATH = str(output / "vectors" / "writer.lock")
+    settings.METADATA_DB_PATH = str(output / "embeddings" / "metadata.db")
+    # No legacy files to migrate in a fresh build
+    settings.FAISS_INDEX_PATH = str(output / "vectors" / "faiss_index.bin")
+    settings.EMBEDDING_METADATA_PATH = str(output / "embeddings" / "metadata.json")
+    if index_type:
+        settings.FAISS_INDEX_TYPE = index_type
+    if shards:
+        settings.FAISS_SHARDS = shards
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a vector index offline from a JSONL/CSV dump of papers")
+    parser.add_argument("input", type=Path, help="JSONL or CSV file of papers")
+    parser.add_argument("--output", type=Path, default=Path("./data/build"), help="Data directory to build into")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Encoding processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per encoding batch")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Records per checkpoint")
+    parser.add_argument("--index-type", default=None, help="flat | hnsw | ivf_flat | ivf_pq (default FAISS_INDEX_TYPE)")
+    parser.add_argument("--shards", type=int, default=None, help="Number of index shards (default FAISS_SHARDS)")
+    args = parser.parse_args()
+
+    configure_output(args.output, args.index_type, args.shards)
+    # Imported only now so the database opens in the output directory
+    from vector_db import vector_db
+    vector_db.load()
+
+    if not vector_db.is_writer:
+        logger.error(f"Another process is writing to {args.output}")
+        raise SystemExit(1)
+
+    done = vector_db.store.get_state(PROGRESS_KEY)
+    if done:
+        logger.info(f"Resuming after {done} records")
+
+    logger.info("=" * 60)
+    logger.info(f"Building {settings.FAISS_INDEX_TYPE} index from {args.input} with {args.workers} workers")
+    logger.info("=" * 60)
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    context = multiprocessing.get_context("spawn")
+    started = time.time()
+    added = 0
+    skipped = 0
+
+    with context.Pool(args.workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        consumed = 0
+        for chunk in chunks(read_records(args.input), args.chunk_size):
+            consumed += len(chunk)
+            if consumed <= done:
+                continue
+
+            # Only the part of the chunk not added before the interruption
+            chunk = chunk[max(0, done - (consumed - len(chunk))):]
+            papers = [paper for paper in (to_paper(record) for record in chunk) if paper]
+            skipped += len(chunk) - len(papers)
+
+            if papers:
+                embeddings = encode_chunk(pool, papers, args.batch_size)
+                vector_db.add_embeddings_batch(
+                    [paper['paperId'] for paper in papers], embeddings,
+                    [paper['metadata'] for paper in papers], state={PROGRESS_KEY: consumed}
+                )
+            else:
+                vector_db.set_state({PROGRESS_KEY: consumed})
+
+            added += len(papers)
+            rate = added / max(time.time() - started, 1e-6)
+            logger.info(f"{consumed} records read, {added} added this run ({rate:.0f}/s)")
+
+    # Training the configured index type runs on the snapshot task thread; let it finish first
+    if vector_db._task_thread is not None:
+        vector_db._task_thread.join()
+    vector_db._save_index(source='build')
+    stats = vector_db.get_stats()
+
+    logger.info("=" * 60)
+    logger.info(
+        f"✅ Built snapshot {stats['snapshot']}: {stats['total_papers']} papers, "
+        f"{stats['index_type']} index, {skipped} invalid records skipped"
+    )
+    logger.info(f"Serve it with CHECKPOINT_DIR, WAL_PATH and METADATA_DB_PATH pointing into {args.output}")
+    logger.info("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import json
+import time
+from typing import AsyncIterator, Dict, List, Set
+from config.settings import settings
+from utils import setup_logger
+from embeddings import embedding_generator
+from vector_db import vector_db
+from executors import embedding_executor, index_executor
+
+logger = setup_logger(__name__)
+
+class BulkIngestor:
+    """
+    Stream NDJSON paper records into the vector database in fixed-size chunks
+
+    Each line is {"paperId": ..., "text": ..., "metadata": {...}}. Lines are
+    read from the request body as it arrives, so memory stays bounded by
+    one chunk whatever the size of the upload, and a chunk is committed as
+    soon as its last line is in. Every chunk is encoded in one batch, added
+    with one index add and committed together with the job's progress (the
+    number of input lines consumed).
+
+    Sending the same stream again under the same job id skips the lines
+    already committed, so an interrupted backfill resumes where it stopped.
+    A chunk that was encoded but not committed is simply redone; adds
+    replace by paperId, so nothing is duplicated.
+    """
+
+    def __init__(self):
+        self._running: Set[str] = set()
+
+    def get_progress(self, job_id: str) -> int:
+        """Input lines of a job committed so far"""
+        # Replaying the write-ahead log may still advance the committed count
+        vector_db.load()
+        return vector_db.store.get_state(self._key(job_id))
+
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._running
+
+    async def ingest(self, job_id: str, body: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+        """
+        Ingest an NDJSON stream, yielding progress after every committed chunk
+
+        Args:
+            job_id: Identifies the stream across retries
+            body: Raw request body chunks
+
+        Yields:
+            Progress dicts; the last one has done=True
+        """
+        if job_id in self._running:
+            raise RuntimeError(f"Ingestion job {job_id} is already running")
+        self._running.add(job_id)
+
+        try:
+            resume_from = self.get_progress(job_id)
+            started = time.time()
+            progress = {'job': job_id, 'committed': resume_from, 'added': 0, 'skipped': 0, 'errors': 0, 'done': False}
+            if resume_from:
+                logger.info(f"Resuming ingestion job {job_id} after line {resume_from}")
+
+            line_number = 0
+            chunk: List[Dict] = []
+            async for line in self._lines(body):
+                line_number += 1
+                if line_number <= resume_from:
+                    progress['skipped'] += 1
+                    continue
+
+                record = self._parse(line, line_number)
+                if record is None:
+                    progress['errors'] += 1
+                elif record:
+                    chunk.append(record)
+
+                if len(chunk) >= settings.INGEST_CHUNK_SIZE:
+                    await self._commit(job_id, chunk, line_number)
+                    progress['added'] += len(chunk)
+                    progress['committed'] = line_number
+                    progress['rate'] = round(progress['added'] / max(time.time() - started, 1e-6), 1)
+                    chunk = []
+                    yield dict(progress)
+
+            if line_number > progress['committed']:
+                await self._commit(job_id, chunk, line_number)
+                progress['added'] += len(chunk)
+                progress['committed'] = line_number
+            progress['rate'] = round(progress['added'] / max(time.time() - started, 1e-6), 1)
+            progress['done'] = True
+            logger.info(
+                f"Ingestion job {job_id} finished: {progress['added']} added, "
+                f"{progress['skipped']} skipped, {progress['errors']} invalid lines"
+            )
+            yield progress
+        finally:
+            self._running.discard(job_id)
+
+    async def _commit(self, job_id: str, chunk: List[Dict], line_number: int):
+        """Encode and add one chunk, recording the job's progress in the same commit"""
+        state = {self._key(job_id): line_number}
+        if not chunk:
+            # Only invalid or blank lines: advance the resume cursor alone
+            await index_executor.run(vector_db.set_state, state, timeout=None)
+            return
+
+        # No timeouts: a large chunk may legitimately take long, and the stream waits for it
+        texts = [record['text'] for record in chunk]
+        embeddings = await embedding_executor.run(embedding_generator.generate_embeddings_batch, texts, timeout=None)
+        await index_executor.run(
+            vector_db.add_embeddings_batch,
+            [record['paperId'] for record in chunk],
+            embeddings,
+            [record['metadata'] for record in chunk],
+            state,
+            timeout=None
+        )
+
+    async def _lines(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Split a byte stream into lines without holding more than one line in memory"""
+        buffer = b''
+        async for data in body:
+            *lines, buffer = (buffer + data).split(b'\n')
+            for line in lines:
+                yield line
+            if len(buffer) > settings.INGEST_MAX_LINE_BYTES:
+                raise ValueError(f"NDJSON line longer than {settings.INGEST_MAX_LINE_BYTES} bytes")
+        if buffer:
+            yield buffer
+
+    def _parse(self, line: bytes, line_number: int):
+        """
+        Turn one NDJSON line into a record
+
+        Returns:
+            The record, {} for a blank line, or None if the line is invalid
+        """
+        if not line.strip():
+            return {}
+        try:
+            data = json.loads(line)
+            paper_id, text = str(data['paperId']), data['text']
+            if not isinstance(text, str) or not text:
+                raise ValueError("text must be a non-empty string")
+            metadata = {
+                **(data.get('metadata') or {}),
+                'id': paper_id,
+                'text': text[:500]  # Store truncated text
+            }
+            return {'paperId': paper_id, 'text': text, 'metadata': metadata}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Skipping invalid NDJSON line {line_number}: {e}")
+            return None
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"ingest:{job_id}"
+
+# Global instance
+bulk_ingestor = BulkIngestor()
@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     PORT: int = 8000
     WORKERS: int = 1
     ENVIRONMENT: str = "development"
+    WARM_UP: bool = True  # run a throwaway inference per model before reporting ready
     
     # Paths
     BASE_DIR: Path = Path(__file__).parent.parent
@@ -19,16 +20,100 @@ class Settings(BaseSettings):
     
     # Model Configuration
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
-    MAX_SEQUENCE_LENGTH: int = 512
+    MAX_SEQUENCE_LENGTH: int = 512  # tokens, capped by the model's own limit
     EMBEDDING_DIMENSION: int = 384  # for all-MiniLM-L6-v2
+    EMBEDDING_BACKEND: str = "torch"  # torch | onnx (ONNX Runtime on CPU)
+    EMBEDDING_ONNX_DIR: str = "./models/onnx"  # exported models, one directory per model
+    EMBEDDING_ONNX_QUANTIZE: bool = True  # run the dynamically int8-quantised export
+    EMBEDDING_ONNX_THREADS: Optional[int] = None  # None = ONNX Runtime default (all cores)
+    EMBEDDING_CACHE_DIR: str = "./data/embeddings/cache"  # persistent cache keyed by model and text
+    EMBEDDING_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 0 disables the cache
+    EMBEDDING_CACHE_DTYPE: str = "float32"  # float16 halves the size at a small precision cost
+    EMBEDDING_BATCH_SIZE: int = 256  # most texts per forward pass
+    EMBEDDING_BATCH_TOKENS: int = 2048  # most padded tokens per forward pass (raise on many-core nodes)
+    EMBEDDING_BATCH_MAX_SIZE: int = 64  # concurrent single-text requests encoded together
+    EMBEDDING_BATCH_WINDOW_MS: float = 5  # longest a request waits for others to join its batch
+    EMBEDDING_BATCH_MAX_QUEUE: int = 256  # requests waiting for a batch before answering 429
     
     # Vector Database
-    FAISS_INDEX_PATH: str = "./data/vectors/faiss_index.bin"
-    EMBEDDING_METADATA_PATH: str = "./data/embeddings/metadata.json"
-    
+    FAISS_INDEX_PATH: str = "./data/vectors/faiss_index.bin"  # legacy layout, migrated on startup
+    EMBEDDING_METADATA_PATH: str = "./data/embeddings/metadata.json"  # legacy layout, migrated on startup
+    CHECKPOINT_DIR: str = "./data/vectors/checkpoints"  # numbered snapshots plus manifest.json
+    SNAPSHOT_RETAIN_BUILDS: int = 3  # index builds kept as rollback targets
+    METADATA_DB_PATH: str = "./data/embeddings/metadata.db"
+    METADATA_CACHE_SIZE: int = 10000  # hot records kept in memory
+    WAL_PATH: str = "./data/vectors/wal.log"
+    WAL_FSYNC: bool = True
+    WAL_CHECKPOINT_RATIO: float = 0.5  # checkpoint once the log reaches this fraction of the last checkpoint
+    WAL_CHECKPOINT_MIN_BYTES: int = 64 * 1024 * 1024
+
+    # Multiple workers: one writer checkpoints, the others map checkpoints read-only
+    WRITER_LOCK_PATH: str = "./data/vectors/writer.lock"
+    FAISS_MMAP: bool = True  # reader workers memory-map the checkpointed index
+    METADATA_MMAP_BYTES: int = 256 * 1024 * 1024  # SQLite mmap_size
+    SNAPSHOT_POLL_SECONDS: float = 1.0  # how often readers look for new checkpoints and log records
+
+    # ANN Index (flat | hnsw | ivf_flat | ivf_pq)
+    FAISS_INDEX_TYPE: str = "flat"
+    FAISS_IVF_NLIST: int = 1024
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_PQ_M: int = 48  # sub-quantizers, must divide the (reduced) dimension
+    FAISS_PQ_NBITS: int = 8
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_TRAIN_MIN_VECTORS: Optional[int] = None  # None = derived from nlist / PQ bits
+    FAISS_TRAIN_SAMPLE_SIZE: int = 100000  # vectors sampled from the corpus to train on
+    # Compressed storage, any index type: vectors are transformed on insert and query alike
+    FAISS_REDUCTION: Optional[str] = None  # None | pca | opq (OPQ uses FAISS_PQ_M sub-spaces)
+    FAISS_REDUCED_DIMENSION: Optional[int] = None  # None = keep EMBEDDING_DIMENSION
+    FAISS_SCALAR_QUANTIZER: Optional[str] = None  # None | fp16 | int8 (not with ivf_pq)
+    COMPACTION_TOMBSTONE_RATIO: float = 0.2  # rebuild once this fraction of vectors is deleted
+    COMPACTION_INTERVAL_SECONDS: int = 60
+    FAISS_SHARDS: int = 1  # label-partitioned sub-indexes searched in parallel
+    FAISS_SHARD_THREADS: Optional[int] = None  # None = one per shard, up to the CPU count
+    FILTER_EXACT_MAX: int = 20000  # filtered searches matching at most this many papers are answered exactly
+
+    # Hybrid search (BM25 + vector, reciprocal rank fusion)
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    HYBRID_CANDIDATES: int = 100  # results taken from each retriever before fusion
+    HYBRID_RRF_K: int = 60
+
+    # Query embedding cache (semantic search)
+    QUERY_CACHE_SIZE: int = 10000  # 0 disables the cache
+    QUERY_CACHE_TTL_SECONDS: float = 3600
+
+    # Bulk ingestion
+    INGEST_CHUNK_SIZE: int = 256  # records encoded, added and committed together
+    INGEST_MAX_LINE_BYTES: int = 1024 * 1024
+
+    # Executors for blocking work (a full queue answers 429, a timeout 504)
+    EMBEDDING_EXECUTOR_WORKERS: int = 1  # torch already uses every core per encode
+    EMBEDDING_EXECUTOR_QUEUE: int = 32
+    EMBEDDING_TIMEOUT_SECONDS: float = 30
+    INDEX_EXECUTOR_WORKERS: int = 4
+    INDEX_EXECUTOR_QUEUE: int = 128
+    INDEX_TIMEOUT_SECONDS: float = 10
+    GENERATION_EXECUTOR_WORKERS: int = 1
+    GENERATION_EXECUTOR_QUEUE: int = 4
+    GENERATION_TIMEOUT_SECONDS: float = 120
+    CPU_EXECUTOR_WORKERS: int = 2  # processes for PDF parsing and graph extraction
+    CPU_EXECUTOR_QUEUE: int = 8
+    CPU_TIMEOUT_SECONDS: float = 60
+
     # LLM Configuration
     LLM_PROVIDER: str = "simple"
     HF_MODEL: str = "google/flan-t5-base"
+    RAG_PROMPT_MAX_TOKENS: int = 512  # whole prompt; the context gets what the question and template leave
+    RAG_STREAM_DO_SAMPLE: bool = False  # streamed answers decode greedily unless sampling is enabled
+    RAG_STREAM_TEMPERATURE: float = 0.7
+    GENERATION_BATCH_MAX_SIZE: int = 8  # concurrent /rag/generate prompts generated together
+    GENERATION_BATCH_WINDOW_MS: float = 20  # longest a request waits for others to join its batch
+    GENERATION_BATCH_MAX_QUEUE: int = 64  # requests waiting for a batch before answering 429
+    ANSWER_CACHE_SIZE: int = 1000  # cached RAG answers, 0 disables the cache
+    ANSWER_CACHE_TTL_SECONDS: float = 3600
+    ANSWER_CACHE_SIMILARITY: Optional[float] = None  # opt-in, e.g. 0.95: also reuse answers to questions this similar
     
     # API Keys
     OPENAI_API_KEY: Optional[str] = None
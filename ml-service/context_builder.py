@@ -0,0 +1,122 @@
+import re
+import numpy as np
+from typing import Dict, List, Tuple
+from utils import setup_logger
+from embeddings import embedding_generator
+
+logger = setup_logger(__name__)
+
+# A sentence ends at . ! or ? followed by whitespace and what looks like the start of the next one
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, dropping empty ones"""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+def paper_header(index: int, paper: Dict) -> str:
+    """Line introducing a paper's passages in the context"""
+    return f"Paper {index + 1}: {paper.get('title', '')}\n"
+
+class ContextBuilder:
+    """
+    Packs the passages of a set of papers most relevant to a question into a token budget
+
+    Abstracts are split into sentences, which are embedded together with the
+    question in one batch and ranked by cosine similarity. The best ones are
+    taken while they fit the budget, counted with the tokenizer of the model
+    that reads the prompt, and put back in document order under their
+    paper's title so the context still reads naturally.
+    """
+
+    def build(self, question: str, papers: List[Dict], max_tokens: int, tokenizer=None) -> Tuple[str, List[Dict]]:
+        """
+        Build a context of at most max_tokens tokens
+
+        Args:
+            question: User question
+            papers: List of paper dicts with title, abstract, etc.
+            max_tokens: Token budget for the context
+            tokenizer: Tokenizer to count with (default: the embedding model's)
+
+        Returns:
+            (context text, one dict per paper used with 'paper', 'passages' and
+            'relevance' (its best passage's score), most relevant first)
+        """
+        try:
+            tokenizer = tokenizer or self.tokenizer()
+
+            passages = [
+                (i, sentence) for i, paper in enumerate(papers)
+                for sentence in split_sentences(paper.get('abstract', '') or '')
+            ]
+            if not passages or max_tokens <= 0:
+                return "", []
+
+            # Question and passages in one batch; cached sentences aren't encoded again
+            embeddings = embedding_generator.generate_embeddings_batch([question] + [text for _, text in passages])
+            embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+            scores = embeddings[1:] @ embeddings[0]
+
+            headers = {i: paper_header(i, paper) for i, paper in enumerate(papers)}
+            # Separators cost no tokens with word-piece and SentencePiece tokenizers; the check below catches any that do
+            counts = tokenizer(
+                [text for _, text in passages] + [headers[i] for i in range(len(papers))], add_special_tokens=False
+            )['input_ids']
+            passage_tokens = [len(ids) for ids in counts[:len(passages)]]
+            header_tokens = [len(ids) for ids in counts[len(passages):]]
+
+            # Best first while they fit; a paper's header is paid for by its first passage
+            selected, opened, used_tokens = [], set(), 0
+            for p in np.argsort(-scores, kind='stable'):
+                paper = passages[p][0]
+                cost = passage_tokens[p] + (0 if paper in opened else header_tokens[paper])
+                if used_tokens + cost <= max_tokens:
+                    selected.append(int(p))
+                    opened.add(paper)
+                    used_tokens += cost
+
+            # Pieces tokenised apart can merge differently when joined, so check the real count
+            context = self._render(passages, headers, selected)
+            while selected and len(tokenizer(context, add_special_tokens=False, verbose=False)['input_ids']) > max_tokens:
+                selected.pop()  # the lowest scoring
+                context = self._render(passages, headers, selected)
+
+            used = {}
+            for p in selected:
+                i = passages[p][0]
+                entry = used.setdefault(i, {'paper': papers[i], 'passages': [], 'relevance': float(scores[p])})
+                entry['relevance'] = max(entry['relevance'], float(scores[p]))
+            for p in sorted(selected):
+                used[passages[p][0]]['passages'].append(passages[p][1])
+
+            logger.debug(
+                f"Context: {len(selected)}/{len(passages)} passages from {len(used)}/{len(papers)} papers, "
+                f"~{used_tokens} of {max_tokens} tokens"
+            )
+            return context, sorted(used.values(), key=lambda entry: -entry['relevance'])
+        except Exception as e:
+            logger.error(f"Error building context: {e}")
+            raise
+
+    def tokenizer(self):
+        """The embedding model's tokenizer, for counting tokens when no other is given"""
+        embedding_generator.load()
+        return embedding_generator.model.tokenizer
+
+    def _render(self, passages: List[Tuple[int, str]], headers: Dict[int, str], selected: List[int]) -> str:
+        """Selected passages in document order, grouped under their paper's header"""
+        parts, current = [], None
+        for p in sorted(selected):
+            paper, text = passages[p]
+            if paper != current:
+                if current is not None:
+                    parts.append("\n\n")
+                parts.append(headers[paper])
+                current = paper
+            else:
+                parts.append(" ")
+            parts.append(text)
+        return "".join(parts)
+
+# Global instance
+context_builder = ContextBuilder()
@@ -20,6 +20,22 @@ def download_embedding_model():
         logger.error(f"❌ Failed to download embedding model: {e}")
         return False
 
+def export_onnx_embedding_model():
+    """Export the embedding model to ONNX if using the ONNX Runtime backend"""
+    if settings.EMBEDDING_BACKEND != "onnx":
+        logger.info("Skipping ONNX export (not using the ONNX backend)")
+        return True
+    
+    try:
+        from onnx_encoder import export_onnx_model, onnx_model_dir
+        directory = onnx_model_dir(settings.EMBEDDING_ONNX_DIR, settings.EMBEDDING_MODEL)
+        export_onnx_model(settings.EMBEDDING_MODEL, directory, quantize=settings.EMBEDDING_ONNX_QUANTIZE)
+        logger.info("✅ Embedding model exported to ONNX successfully")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to export embedding model to ONNX: {e}")
+        return False
+
 def download_llm_model():
     """Download LLM model if using HuggingFace"""
     if settings.LLM_PROVIDER != "huggingface":
@@ -47,6 +63,10 @@ def main():
     if not download_embedding_model():
         success = False
     
+    # Export it for ONNX Runtime
+    if not export_onnx_embedding_model():
+        success = False
+    
     # Download LLM model
     if not download_llm_model():
         success = False
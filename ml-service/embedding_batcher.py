@@ -0,0 +1,37 @@
+import numpy as np
+from typing import List
+from config.settings import settings
+from batcher import Batcher
+from embeddings import embedding_generator
+from executors import embedding_executor
+
+class EmbeddingBatcher(Batcher):
+    """
+    Coalesce concurrent single-text embedding requests into batched encodes
+
+    Each batch is one generate_embeddings_batch call on the embedding
+    executor (see Batcher for the queueing).
+    """
+
+    name = "embedding"
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embedding of one text, encoded together with concurrent requests
+
+        Args:
+            text: Input text string
+
+        Returns:
+            numpy array of embeddings
+        """
+        return await self.submit(text)
+
+    async def _process(self, texts: List[str]) -> np.ndarray:
+        return await embedding_executor.run(embedding_generator.generate_embeddings_batch, texts)
+
+# Global instance
+embedding_batcher = EmbeddingBatcher(
+    settings.EMBEDDING_BATCH_MAX_SIZE, settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_BATCH_MAX_QUEUE,
+    settings.EMBEDDING_TIMEOUT_SECONDS
+)
@@ -0,0 +1,208 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+_KEY_BYTES = 16
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed cache of document embeddings
+
+    Vectors live in a fixed-capacity memory-mapped file of slots, each
+    holding the entry's key next to its vector; a SQLite table maps keys
+    (a hash of the model name and the exact text encoded) to slots and
+    tracks when each was last used. Once every slot is taken, the least
+    recently used entries are overwritten.
+
+    Several processes may share a cache directory. A reader only trusts a
+    slot whose stored key matches what it looked up, so a slot being
+    overwritten by another process, or lost in a crash, reads as a miss.
+    """
+
+    def __init__(self, directory: Path, model_name: str, dimension: int,
+                 max_bytes: int, dtype: str = "float32"):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.slot_dtype = np.dtype([('key', f'V{_KEY_BYTES}'), ('vector', self.dtype, (dimension,))])
+        self.capacity = max(1, max_bytes // self.slot_dtype.itemsize)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # One directory per model, so different dimensions never share a file
+        self.directory = Path(directory) / re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.directory / "index.db"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key BLOB PRIMARY KEY,"
+            " slot INTEGER NOT NULL UNIQUE,"
+            " used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS layout (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._open_slots()
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up the embeddings of several texts
+
+        Args:
+            texts: Texts exactly as they would be encoded
+
+        Returns:
+            (vectors as float32, found mask); rows not found are zero
+        """
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        found = np.zeros(len(texts), dtype=bool)
+        keys = [self._key(text) for text in texts]
+        try:
+            with self._lock:
+                slots = {}
+                unique = list(set(keys))
+                # Chunked to stay under SQLite's bound-parameter limit (999 on older builds)
+                for start in range(0, len(unique), 900):
+                    chunk = unique[start:start + 900]
+                    placeholders = ",".join("?" * len(chunk))
+                    slots.update(self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", chunk
+                    ).fetchall())
+
+                hit_keys = set()
+                for i, key in enumerate(keys):
+                    slot = slots.get(key)
+                    if slot is None:
+                        continue
+                    vector = np.array(self._slots['vector'][slot], dtype='float32')
+                    # Checked after copying: the slot may have been reused meanwhile
+                    if self._slots['key'][slot].tobytes() == key:
+                        vectors[i] = vector
+                        found[i] = True
+                        hit_keys.add(key)
+
+                if hit_keys:
+                    now = time.time_ns() // 1_000_000
+                    self._conn.executemany("UPDATE entries SET used = ? WHERE key = ?", ((now, key) for key in hit_keys))
+                    self._conn.commit()
+                self.hits += int(found.sum())
+                self.misses += len(texts) - int(found.sum())
+        except sqlite3.Error as e:
+            # A broken cache only costs recomputation
+            logger.warning(f"Embedding cache lookup failed: {e}")
+        return vectors, found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """
+        Store the embeddings of several texts, evicting the least recently used entries if full
+
+        Args:
+            texts: Texts exactly as they were encoded
+            vectors: Their embeddings (len(texts) x dimension)
+        """
+        entries = dict(zip((self._key(text) for text in texts), vectors))
+        try:
+            with self._lock:
+                # Allocate slots under SQLite's write lock so processes never pick the same one
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    entries = self._without_existing(entries)
+                    items = list(entries.items())[:self.capacity]
+                    slots = self._allocate(len(items))
+                    if items:
+                        keys = np.frombuffer(b"".join(key for key, _ in items), dtype=f'V{_KEY_BYTES}')
+                        # Invalidate before overwriting so concurrent readers see a miss, not a torn vector
+                        self._slots['key'][slots] = np.zeros(1, dtype=f'V{_KEY_BYTES}')
+                        self._slots['vector'][slots] = np.stack([vector for _, vector in items]).astype(self.dtype)
+                        self._slots['key'][slots] = keys
+                        now = time.time_ns() // 1_000_000
+                        self._conn.executemany(
+                            "INSERT INTO entries (key, slot, used) VALUES (?, ?, ?)",
+                            ((key, int(slot), now) for (key, _), slot in zip(items, slots))
+                        )
+                    self._conn.commit()
+                except Exception:
+                    self._conn.rollback()
+                    raise
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache update failed: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': size,
+            'capacity': self.capacity,
+            'bytes': size * self.slot_dtype.itemsize,
+            'dtype': self.dtype.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._slots.flush()
+            self._conn.close()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).digest()[:_KEY_BYTES]
+
+    def _without_existing(self, entries: dict) -> dict:
+        """Drop entries another process stored since our lookup"""
+        keys = list(entries)
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for (key,) in self._conn.execute(f"SELECT key FROM entries WHERE key IN ({placeholders})", chunk):
+                entries.pop(key, None)
+        return entries
+
+    def _allocate(self, count: int) -> np.ndarray:
+        """Free slots first, then the slots of the least recently used entries (deleted here)"""
+        next_slot = self._conn.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()[0]
+        fresh = list(range(next_slot, min(next_slot + count, self.capacity)))
+        reused = []
+        if len(fresh) < count:
+            rows = self._conn.execute(
+                "SELECT key, slot FROM entries ORDER BY used LIMIT ?", (count - len(fresh),)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in rows))
+            reused = [slot for _, slot in rows]
+        return np.array(fresh + reused, dtype='int64')
+
+    def _open_slots(self):
+        """Map the slot file, starting over if dimension, dtype or capacity changed"""
+        layout = {'dimension': str(self.dimension), 'dtype': self.dtype.name, 'capacity': str(self.capacity)}
+        path = self.directory / "vectors.bin"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = dict(self._conn.execute("SELECT key, value FROM layout").fetchall())
+                if current != layout or not path.exists():
+                    if current:
+                        logger.info(f"Embedding cache layout changed to {layout}, clearing {self.directory}")
+                    self._conn.execute("DELETE FROM entries")
+                    self._conn.execute("DELETE FROM layout")
+                    self._conn.executemany("INSERT INTO layout (key, value) VALUES (?, ?)", layout.items())
+                    # Sparse until written
+                    with open(path, 'wb') as f:
+                        f.truncate(self.capacity * self.slot_dtype.itemsize)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        self._slots = np.memmap(path, dtype=self.slot_dtype, mode='r+', shape=(self.capacity,))
+        logger.info(f"Embedding cache at {self.directory}: {self.capacity} slots of {self.dtype.name}")
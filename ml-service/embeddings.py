@@ -1,29 +1,99 @@
+import threading
 import numpy as np
-from typing import List, Union
-from sentence_transformers import SentenceTransformer
+from typing import List, Tuple, Union
 from config.settings import settings
 from utils import setup_logger
+from embedding_cache import EmbeddingCache
 
 logger = setup_logger(__name__)
 
 class EmbeddingGenerator:
-    """Generate embeddings using Sentence Transformers"""
+    """
+    Generate embeddings using Sentence Transformers (PyTorch) or ONNX Runtime
+    
+    Constructing the generator is cheap: the model is loaded by load(),
+    which the service calls from a background startup task and the encode
+    methods call on first use.
+    """
     
     def __init__(self):
         self.model = None
         self.model_name = settings.EMBEDDING_MODEL
-        self._load_model()
+        self.backend = settings.EMBEDDING_BACKEND
+        # Identifies the vectors produced (model and backend) for the caches
+        self.fingerprint = self.model_name
+        self.cache = None
+        # Special token ids the tokenizer puts before and after a single text
+        self.prefix_ids: List[int] = []
+        self.suffix_ids: List[int] = []
+        self.loaded = False
+        self._load_lock = threading.Lock()
+    
+    def load(self):
+        """Load the model and open the embedding cache (once; later calls return immediately)"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self._load_model()
+                self._open_cache()
+                self.loaded = True
+    
+    def warm_up(self):
+        """
+        Encode a few throwaway texts of different lengths, bypassing the cache
+        
+        The first forward passes allocate buffers and start the thread pools;
+        doing that here keeps it out of the first request's latency.
+        """
+        self.load()
+        _, ids = self._truncate(["warm up " * n for n in (4, 32, 256)])
+        self._encode_bucketed(ids)
     
     def _load_model(self):
         """Load the sentence transformer model"""
         try:
-            logger.info(f"Loading embedding model: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
+            logger.info(f"Loading embedding model: {self.model_name} ({self.backend})")
+            if self.backend == "onnx":
+                from onnx_encoder import load_onnx_encoder
+                self.model = load_onnx_encoder(
+                    self.model_name, settings.EMBEDDING_ONNX_DIR,
+                    quantize=settings.EMBEDDING_ONNX_QUANTIZE, threads=settings.EMBEDDING_ONNX_THREADS
+                )
+                self.fingerprint = f"{self.model_name}@onnx-{'int8' if self.model.quantized else 'fp32'}"
+            else:
+                # Imported here so the ONNX backend runs without PyTorch installed
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_name)
+                # The model is called directly with token ids, not through encode(), which would set this
+                self.model.eval()
+            self._find_special_tokens()
             logger.info(f"Model loaded successfully. Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise
     
+    def _find_special_tokens(self):
+        """Work out where the tokenizer adds special tokens, by tokenising a word with and without them"""
+        tokenizer = self.model.tokenizer
+        bare = tokenizer("word", add_special_tokens=False)['input_ids']
+        full = tokenizer("word")['input_ids']
+        start = next(i for i in range(len(full) - len(bare) + 1) if full[i:i + len(bare)] == bare)
+        self.prefix_ids, self.suffix_ids = full[:start], full[start + len(bare):]
+    
+    def _open_cache(self):
+        """Open the persistent embedding cache, unless disabled"""
+        if settings.EMBEDDING_CACHE_MAX_BYTES <= 0:
+            return
+        try:
+            self.cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_DIR, self.fingerprint, self.model.get_sentence_embedding_dimension(),
+                settings.EMBEDDING_CACHE_MAX_BYTES, settings.EMBEDDING_CACHE_DTYPE
+            )
+        except Exception as e:
+            # Encoding still works without it, just slower
+            logger.warning(f"Embedding cache unavailable: {e}")
+    
     def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text
@@ -35,11 +105,18 @@ class EmbeddingGenerator:
             numpy array of embeddings
         """
         try:
-            # Truncate if too long
-            if len(text) > settings.MAX_SEQUENCE_LENGTH * 4:  # Rough char estimate
-                text = text[:settings.MAX_SEQUENCE_LENGTH * 4]
+            self.load()
+            # Truncate to the model's token limit
+            (text,), ids = self._truncate([text])
             
-            embedding = self.model.encode(text, convert_to_numpy=True)
+            if self.cache is not None:
+                vectors, found = self.cache.get_many([text])
+                if found[0]:
+                    return vectors[0]
+            
+            embedding = self._encode_ids(ids)[0]
+            if self.cache is not None:
+                self.cache.put_many([text], embedding.reshape(1, -1))
             return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
@@ -56,25 +133,106 @@ class EmbeddingGenerator:
             numpy array of embeddings (batch_size x embedding_dim)
         """
         try:
-            # Truncate texts if needed
-            truncated_texts = []
-            for text in texts:
-                if len(text) > settings.MAX_SEQUENCE_LENGTH * 4:
-                    text = text[:settings.MAX_SEQUENCE_LENGTH * 4]
-                truncated_texts.append(text)
+            self.load()
+            # Truncate texts to the model's token limit
+            truncated_texts, ids = self._truncate(texts)
             
-            embeddings = self.model.encode(
-                truncated_texts,
-                convert_to_numpy=True,
-                show_progress_bar=len(texts) > 10
-            )
+            if self.cache is None:
+                return self._encode_bucketed(ids)
+            
+            # Only encode texts not in the cache
+            embeddings, found = self.cache.get_many(truncated_texts)
+            missing = np.flatnonzero(~found)
+            if len(missing):
+                missing_texts = [truncated_texts[i] for i in missing]
+                encoded = self._encode_bucketed([ids[i] for i in missing])
+                self.cache.put_many(missing_texts, encoded)
+                embeddings[missing] = encoded
             return embeddings
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             raise
     
+    def _truncate(self, texts: List[str]) -> Tuple[List[str], List[List[int]]]:
+        """
+        Cut texts at the model's token limit, tokenising each text once
+        
+        The token ids are what gets encoded, so the model never tokenises a
+        text again; the truncated texts are only the embedding cache's keys.
+        
+        Returns:
+            (truncated texts, token ids of each without special tokens)
+        """
+        tokenizer = self.model.tokenizer
+        limit = min(self.model.max_seq_length, settings.MAX_SEQUENCE_LENGTH) - len(self.prefix_ids) - len(self.suffix_ids)
+        if self.backend != "onnx" and getattr(self.model[0], 'do_lower_case', False):
+            # sentence-transformers lowercases before tokenising for these models
+            texts = [text.lower() for text in texts]
+        # Bounds the tokenizer's work on very long inputs (no real text averages 16 chars per token)
+        texts = [text[:limit * 16] for text in texts]
+        encoded = tokenizer(
+            texts, add_special_tokens=False, truncation=True, max_length=limit + 1,
+            return_offsets_mapping=True, return_attention_mask=False, return_token_type_ids=False
+        )
+        
+        truncated_texts, ids = [], []
+        for text, text_ids, offsets in zip(texts, encoded['input_ids'], encoded['offset_mapping']):
+            if len(text_ids) > limit:
+                text = text[:offsets[limit - 1][1]]
+                text_ids = text_ids[:limit]
+            truncated_texts.append(text)
+            ids.append(text_ids)
+        return truncated_texts, ids
+    
+    def _encode_bucketed(self, ids: List[List[int]]) -> np.ndarray:
+        """
+        Encode tokenised texts in batches of similar length, returning rows in input order
+        
+        Texts are sorted by length and cut into batches of at most
+        EMBEDDING_BATCH_SIZE texts and EMBEDDING_BATCH_TOKENS padded tokens,
+        so short titles are batched together instead of being padded to the
+        length of an abstract.
+        """
+        special = len(self.prefix_ids) + len(self.suffix_ids)
+        lengths = [len(text_ids) + special for text_ids in ids]
+        embeddings = np.empty((len(ids), self.get_dimension()), dtype='float32')
+        order = np.argsort(lengths, kind='stable')
+        start = 0
+        while start < len(order):
+            end = start + 1
+            # Sorted ascending, so the padded size of a batch is its last length times its size
+            while (end < len(order) and end - start < settings.EMBEDDING_BATCH_SIZE
+                   and lengths[order[end]] * (end - start + 1) <= settings.EMBEDDING_BATCH_TOKENS):
+                end += 1
+            bucket = order[start:end]
+            embeddings[bucket] = self._encode_ids([ids[i] for i in bucket])
+            start = end
+        return embeddings
+    
+    def _encode_ids(self, batch: List[List[int]]) -> np.ndarray:
+        """Run the model on one batch of token ids (without special tokens), padded to its longest row"""
+        tokenizer = self.model.tokenizer
+        rows = [self.prefix_ids + text_ids + self.suffix_ids for text_ids in batch]
+        input_ids = np.full((len(rows), max(len(row) for row in rows)), tokenizer.pad_token_id or 0, dtype='int64')
+        attention_mask = np.zeros_like(input_ids)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        
+        if self.backend == "onnx":
+            return self.model.encode_ids(input_ids, attention_mask)
+        
+        import torch
+        features = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in tokenizer.model_input_names:
+            features['token_type_ids'] = np.zeros_like(input_ids)
+        with torch.inference_mode():
+            features = {name: torch.from_numpy(value).to(self.model.device) for name, value in features.items()}
+            return self.model(features)['sentence_embedding'].float().cpu().numpy()
+    
     def get_dimension(self) -> int:
         """Get embedding dimension"""
+        self.load()
         return self.model.get_sentence_embedding_dimension()
 
 # Global instance
@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+from fastapi import HTTPException
+from config.settings import settings
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+class ExecutorBusy(HTTPException):
+    """A pool's queue is full; the client should retry later"""
+
+    def __init__(self, name: str):
+        super().__init__(status_code=429, detail=f"Server busy ({name} queue full), retry later",
+                         headers={"Retry-After": "1"})
+
+class ExecutorTimeout(HTTPException):
+    """A call didn't finish within its pool's timeout"""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(status_code=504, detail=f"{name} work timed out after {timeout:g}s")
+
+class BoundedExecutor:
+    """
+    Worker pool for blocking work called from the event loop, with a bounded queue
+
+    At most workers + max_queue calls are admitted at once; further calls
+    fail immediately with ExecutorBusy (HTTP 429) instead of piling up.
+    Callers stop waiting after the pool's timeout (ExecutorTimeout, HTTP
+    504). A call that is already running can't be interrupted, so it keeps
+    its place in the pool until it actually returns.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int, timeout: Optional[float], processes: bool = False):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.processes = processes
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = -1, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool
+
+        Args:
+            fn: Blocking callable (picklable for process pools)
+            timeout: Seconds to wait; -1 for the pool's default, None to wait indefinitely
+
+        Returns:
+            fn's return value
+        """
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(self.name)
+            self._in_flight += 1
+
+        try:
+            future = self._get_pool().submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout == -1 else timeout
+        try:
+            # shield: a timed-out caller must not cancel work already running
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.CancelledError:
+            # The client went away; drop the work if it hasn't started
+            future.cancel()
+            raise
+        except asyncio.TimeoutError:
+            # Still queued work is dropped; running work finishes in the background
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            logger.warning(f"{self.name} call {getattr(fn, '__name__', fn)} timed out after {timeout}s")
+            raise ExecutorTimeout(self.name, timeout)
+        except BrokenProcessPool:
+            # A worker process died (e.g. killed for memory); start a fresh pool for later calls
+            logger.error(f"{self.name} worker process died, restarting the pool")
+            with self._lock:
+                pool, self._pool = self._pool, None
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.processes:
+                    # spawn: forking a process that runs FAISS/torch threads can deadlock the child
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+            return self._pool
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future is not None and not future.cancelled():
+                self.completed += 1
+
+# Global instances
+# Sentence-transformer encodes (torch releases the GIL and uses every core itself)
+embedding_executor = BoundedExecutor(
+    "embedding", settings.EMBEDDING_EXECUTOR_WORKERS, settings.EMBEDDING_EXECUTOR_QUEUE, settings.EMBEDDING_TIMEOUT_SECONDS
+)
+# FAISS searches and vector database writes (FAISS releases the GIL)
+index_executor = BoundedExecutor(
+    "index", settings.INDEX_EXECUTOR_WORKERS, settings.INDEX_EXECUTOR_QUEUE, settings.INDEX_TIMEOUT_SECONDS
+)
+# RAG answer generation, kept apart so slow answers never hold up search
+generation_executor = BoundedExecutor(
+    "generation", settings.GENERATION_EXECUTOR_WORKERS, settings.GENERATION_EXECUTOR_QUEUE, settings.GENERATION_TIMEOUT_SECONDS
+)
+# Pure-Python CPU work (PDF parsing, graph extraction) that would hold the GIL
+cpu_executor = BoundedExecutor(
+    "cpu", settings.CPU_EXECUTOR_WORKERS, settings.CPU_EXECUTOR_QUEUE, settings.CPU_TIMEOUT_SECONDS, processes=True
+)
+
+def get_executor_stats() -> dict:
+    return {executor.name: executor.get_stats() for executor in
+            (embedding_executor, index_executor, generation_executor, cpu_executor)}
+
+def shutdown_executors():
+    for executor in (embedding_executor, index_executor, generation_executor, cpu_executor):
+        executor.shutdown()
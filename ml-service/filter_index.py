@@ -0,0 +1,101 @@
+import numpy as np
+from array import array
+from datetime import date
+from typing import Dict, Optional, Tuple
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Metadata fields with one posting list per distinct value
+FILTER_FIELDS = ("categories", "authors")
+
+def _parse_date(value) -> int:
+    """Proleptic ordinal of an ISO date (or datetime) string, 0 when missing or unparseable"""
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            pass
+    return 0
+
+class FilterIndex:
+    """
+    Precomputed label sets for filtering searches by metadata
+
+    Keeps one posting list of labels per category and per author, and the
+    publication date of every label. Posting lists are append-only: labels
+    of removed or replaced papers stay in them and are masked out by the
+    caller's liveness bitmap, so removals cost nothing here.
+    """
+
+    def __init__(self):
+        self.postings: Dict[Tuple[str, str], array] = {}
+        self.dates = np.zeros(0, dtype='int32')
+
+    def add(self, label: int, metadata: Dict):
+        """Index the filterable fields of a paper's metadata under its label"""
+        for field in FILTER_FIELDS:
+            for value in metadata.get(field) or []:
+                key = (field, self._normalize(value))
+                if key not in self.postings:
+                    self.postings[key] = array('q')
+                self.postings[key].append(label)
+
+        published = _parse_date(metadata.get('publishedDate'))
+        if published:
+            if label >= len(self.dates):
+                grown = np.zeros(max(label + 1, 2 * len(self.dates), 1024), dtype='int32')
+                grown[:len(self.dates)] = self.dates
+                self.dates = grown
+            self.dates[label] = published
+
+    def match(self, live: np.ndarray, filters: Dict) -> np.ndarray:
+        """
+        Boolean mask of the live labels matching every given filter
+
+        Args:
+            live: Liveness bitmap indexed by label
+            filters: Any of categories / authors (match any listed value) and
+                publishedFrom / publishedTo (inclusive ISO dates)
+
+        Returns:
+            Mask the same length as live
+        """
+        mask = np.array(live, dtype=bool)
+        for field in FILTER_FIELDS:
+            values = filters.get(field)
+            if not values:
+                continue
+            field_mask = np.zeros(len(mask), dtype=bool)
+            for value in values:
+                labels = self.postings.get((field, self._normalize(value)))
+                if labels:
+                    labels = np.frombuffer(labels, dtype='int64')
+                    field_mask[labels[labels < len(mask)]] = True
+            mask &= field_mask
+
+        published_from = _parse_date(filters.get('publishedFrom'))
+        published_to = _parse_date(filters.get('publishedTo'))
+        if published_from or published_to:
+            dates = np.zeros(len(mask), dtype='int32')
+            n = min(len(mask), len(self.dates))
+            dates[:n] = self.dates[:n]
+            # Papers without a date never match a date filter
+            in_range = dates > 0
+            if published_from:
+                in_range &= dates >= published_from
+            if published_to:
+                in_range &= dates <= published_to
+            mask &= in_range
+        return mask
+
+    @staticmethod
+    def _normalize(value) -> str:
+        return str(value).strip().lower()
+
+    @staticmethod
+    def is_empty(filters: Optional[Dict]) -> bool:
+        """Whether a filter dict restricts nothing"""
+        return not filters or not any(filters.get(key) for key in FILTER_FIELDS + ('publishedFrom', 'publishedTo'))
@@ -0,0 +1,39 @@
+from typing import Dict, List, Tuple
+from config.settings import settings
+from batcher import Batcher
+from executors import generation_executor
+from rag_model import rag_model
+
+class GenerationBatcher(Batcher):
+    """
+    Coalesce concurrent RAG answer requests into batched generations
+
+    Each batch is one rag_model.generate_answers call on the generation
+    executor: the prompts are padded into a single model.generate, which
+    keeps the CPU's vector units busier than one prompt at a time (see
+    Batcher for the queueing). Streamed answers are generated on their own.
+    """
+
+    name = "generation"
+
+    async def generate(self, question: str, papers: List[Dict]) -> Dict:
+        """
+        Answer a question, generated together with concurrent requests
+
+        Args:
+            question: User question
+            papers: List of paper dicts with title, abstract, etc.
+
+        Returns:
+            Dict with answer and citations
+        """
+        return await self.submit((question, papers))
+
+    async def _process(self, requests: List[Tuple[str, List[Dict]]]) -> List[Dict]:
+        return await generation_executor.run(rag_model.generate_answers, requests)
+
+# Global instance
+generation_batcher = GenerationBatcher(
+    settings.GENERATION_BATCH_MAX_SIZE, settings.GENERATION_BATCH_WINDOW_MS, settings.GENERATION_BATCH_MAX_QUEUE,
+    settings.GENERATION_TIMEOUT_SECONDS
+)
@@ -0,0 +1,399 @@
+import faiss
+import os
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional
+from config.settings import settings
+from utils import setup_logger
+from sharded_index import ShardedIndex
+
+logger = setup_logger(__name__)
+
+# Supported values for settings.FAISS_INDEX_TYPE
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# Supported values for settings.FAISS_REDUCTION and settings.FAISS_SCALAR_QUANTIZER
+REDUCTIONS = ("pca", "opq")
+SCALAR_QUANTIZERS = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+def create_index(dimension: int, index_type: Optional[str] = None, shards: Optional[int] = None,
+                 compress: bool = True) -> faiss.Index:
+    """
+    Build an empty FAISS index of the given type
+
+    Every index returned here is addressed by caller-supplied int64 labels
+    (add_with_ids / reconstruct(label)): IVF indexes store ids natively,
+    flat and HNSW are wrapped in an IndexIDMap2. With more than one shard
+    the result is a ShardedIndex of identical sub-indexes.
+
+    With FAISS_REDUCTION set, the index sits behind an IndexPreTransform
+    that projects vectors (PCA or OPQ) to FAISS_REDUCED_DIMENSION on add and
+    search alike; FAISS_SCALAR_QUANTIZER stores the (projected) vectors as
+    fp16 or int8 codes instead of float32. Callers keep passing and getting
+    back full-dimension vectors either way.
+
+    Args:
+        dimension: Embedding dimension
+        index_type: One of INDEX_TYPES (defaults to settings.FAISS_INDEX_TYPE)
+        shards: Number of shards (defaults to settings.FAISS_SHARDS)
+        compress: Apply the configured compression (off for bootstrap and delta indexes)
+
+    Returns:
+        FAISS index (untrained for the IVF types and PCA/OPQ/int8 compression)
+    """
+    index_type = index_type or settings.FAISS_INDEX_TYPE
+    shards = shards or settings.FAISS_SHARDS
+    if shards > 1:
+        return ShardedIndex([create_index(dimension, index_type, shards=1, compress=compress) for _ in range(shards)])
+
+    transform = _create_transform(dimension) if compress else None
+    stored = transform.d_out if transform is not None else dimension
+    qtype = _scalar_quantizer_type(index_type) if compress else None
+
+    if index_type == "flat":
+        index = faiss.IndexScalarQuantizer(stored, qtype) if qtype is not None else faiss.IndexFlatL2(stored)
+    elif index_type == "hnsw":
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(stored, qtype, settings.FAISS_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(stored, settings.FAISS_HNSW_M)
+        index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(stored)
+        if qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, stored, settings.FAISS_IVF_NLIST, qtype)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, stored, settings.FAISS_IVF_NLIST)
+    elif index_type == "ivf_pq":
+        if stored % settings.FAISS_PQ_M != 0:
+            raise ValueError(
+                f"FAISS_PQ_M ({settings.FAISS_PQ_M}) must divide the stored dimension ({stored})"
+            )
+        quantizer = faiss.IndexFlatL2(stored)
+        index = faiss.IndexIVFPQ(
+            quantizer, stored, settings.FAISS_IVF_NLIST,
+            settings.FAISS_PQ_M, settings.FAISS_PQ_NBITS
+        )
+    else:
+        raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {INDEX_TYPES})")
+
+    if transform is not None:
+        index = faiss.IndexPreTransform(transform, index)
+    if index_type in ("flat", "hnsw"):
+        # Outermost, so labels address the pre-transform index as a whole
+        index = faiss.IndexIDMap2(index)
+
+    configure_search(index)
+    return index
+
+def _create_transform(dimension: int) -> Optional[faiss.LinearTransform]:
+    """The configured dimensionality reduction, untrained (None if disabled)"""
+    reduction = settings.FAISS_REDUCTION
+    if not reduction:
+        return None
+
+    reduced = settings.FAISS_REDUCED_DIMENSION or dimension
+    if reduced > dimension:
+        raise ValueError(f"FAISS_REDUCED_DIMENSION ({reduced}) exceeds the embedding dimension ({dimension})")
+    if reduction == "pca":
+        return faiss.PCAMatrix(dimension, reduced)
+    if reduction == "opq":
+        if reduced % settings.FAISS_PQ_M != 0:
+            raise ValueError(f"FAISS_PQ_M ({settings.FAISS_PQ_M}) must divide the reduced dimension ({reduced}) for OPQ")
+        return faiss.OPQMatrix(dimension, settings.FAISS_PQ_M, reduced)
+    raise ValueError(f"Unknown FAISS reduction: {reduction} (expected one of {REDUCTIONS})")
+
+def _scalar_quantizer_type(index_type: str) -> Optional[int]:
+    """FAISS quantizer type for FAISS_SCALAR_QUANTIZER (None if disabled)"""
+    name = settings.FAISS_SCALAR_QUANTIZER
+    if not name:
+        return None
+    if name not in SCALAR_QUANTIZERS:
+        raise ValueError(f"Unknown scalar quantizer: {name} (expected one of {tuple(SCALAR_QUANTIZERS)})")
+    if index_type == "ivf_pq":
+        raise ValueError("FAISS_SCALAR_QUANTIZER does not apply to ivf_pq, which already stores PQ codes")
+    return SCALAR_QUANTIZERS[name]
+
+def read_index(path: str, mmap: bool = False, index_type: Optional[str] = None) -> faiss.Index:
+    """
+    Read a saved index, optionally memory-mapped read-only
+
+    A mapped index shares page-cache pages with every process mapping the
+    same file and loads without copying, but it must never be modified
+    (FAISS aborts on add to mapped storage).
+
+    Args:
+        path: Index file
+        mmap: Map the file instead of reading it into memory
+        index_type: Type of the saved index, if known (picks the mmap flags)
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # Inverted lists are mapped in place as OnDiskInvertedLists
+        flags = faiss.IO_FLAG_MMAP
+    elif hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    else:
+        logger.warning("This FAISS build cannot map flat/HNSW indexes, reading into memory")
+        return faiss.read_index(str(path))
+    return faiss.read_index(str(path), flags)
+
+def serialize_index(index: faiss.Index, previous: Optional[Path] = None) -> Dict[str, Optional[np.ndarray]]:
+    """
+    Copy an index into memory as the files write_index() writes
+
+    Taking this copy is the only part of saving that must not overlap with
+    changes to the index; the files can be written from it meanwhile.
+
+    Args:
+        index: Index to serialise
+        previous: Snapshot directory the index was last saved to or loaded from
+
+    Returns:
+        File name -> serialised index; shards unchanged since they were saved
+        to `previous` map to None and are linked from there
+    """
+    if not isinstance(index, ShardedIndex):
+        return {'index.faiss': faiss.serialize_index(index)}
+
+    files = {}
+    for i, shard in enumerate(index.shards):
+        name = f'shard_{i:03d}.faiss'
+        unchanged = i not in index.dirty and previous is not None and (previous / name).exists()
+        files[name] = None if unchanged else faiss.serialize_index(shard)
+    return files
+
+def write_index(files: Dict[str, Optional[np.ndarray]], directory: Path, previous: Optional[Path] = None):
+    """
+    Write a serialised index into a snapshot directory
+
+    A single index is written to index.faiss, a sharded one to one
+    shard_NNN.faiss file per shard. Unchanged shards are hard-linked from
+    the previous snapshot instead of being rewritten.
+
+    Args:
+        files: From serialize_index()
+        directory: Destination directory (must exist)
+        previous: Snapshot directory passed to serialize_index()
+    """
+    for name, data in files.items():
+        if data is None:
+            try:
+                os.link(previous / name, directory / name)
+            except OSError:
+                shutil.copyfile(previous / name, directory / name)  # e.g. no hard links on this filesystem
+            continue
+        with open(directory / name, 'wb') as f:
+            data.tofile(f)
+
+def load_index(directory: Path, mmap: bool = False, index_type: Optional[str] = None) -> faiss.Index:
+    """
+    Read an index written by write_index(), each shard loaded independently
+
+    Args:
+        directory: Snapshot directory
+        mmap: Map the files instead of reading them into memory
+        index_type: Type of the saved index, if known (picks the mmap flags)
+    """
+    shard_paths = sorted(Path(directory).glob('shard_*.faiss'))
+    if not shard_paths:
+        return read_index(Path(directory) / 'index.faiss', mmap=mmap, index_type=index_type)
+
+    index = ShardedIndex([read_index(path, mmap=mmap, index_type=index_type) for path in shard_paths])
+    index.dirty.clear()
+    return index
+
+def shard_count(index: faiss.Index) -> int:
+    """Number of shards behind an index (1 for a plain FAISS index)"""
+    return len(index.shards) if isinstance(index, ShardedIndex) else 1
+
+def requires_training(index_type: Optional[str] = None) -> bool:
+    """Whether the index type (with the configured compression) needs a training pass before vectors can be added"""
+    return (
+        (index_type or settings.FAISS_INDEX_TYPE) in ("ivf_flat", "ivf_pq")
+        or bool(settings.FAISS_REDUCTION)
+        or settings.FAISS_SCALAR_QUANTIZER == "int8"  # per-dimension ranges; fp16 needs none
+    )
+
+def min_training_vectors(index_type: Optional[str] = None) -> int:
+    """Number of vectors to collect before training (FAISS wants ~39 points per centroid)"""
+    if settings.FAISS_TRAIN_MIN_VECTORS:
+        return settings.FAISS_TRAIN_MIN_VECTORS
+
+    index_type = index_type or settings.FAISS_INDEX_TYPE
+    minimum = 0
+    if index_type in ("ivf_flat", "ivf_pq"):
+        minimum = settings.FAISS_IVF_NLIST * 39
+    if index_type == "ivf_pq" or settings.FAISS_REDUCTION == "opq":
+        minimum = max(minimum, (2 ** settings.FAISS_PQ_NBITS) * 39)
+    if settings.FAISS_REDUCTION == "pca":
+        # A stable covariance estimate wants several samples per input dimension
+        minimum = max(minimum, settings.EMBEDDING_DIMENSION * 4)
+    if settings.FAISS_SCALAR_QUANTIZER == "int8":
+        minimum = max(minimum, 1000)
+    return minimum
+
+def train_index(index: faiss.Index, vectors: np.ndarray):
+    """
+    Train an index on a random sample of at most FAISS_TRAIN_SAMPLE_SIZE vectors
+
+    Centroids, PCA/OPQ projections and quantizer ranges are all estimated
+    well from a sample, and training time grows with the sample, not the corpus.
+    """
+    if len(vectors) > settings.FAISS_TRAIN_SAMPLE_SIZE:
+        sample = np.random.choice(len(vectors), settings.FAISS_TRAIN_SAMPLE_SIZE, replace=False)
+        vectors = vectors[np.sort(sample)]
+    index.train(np.ascontiguousarray(vectors, dtype='float32'))
+
+def unwrap(index: faiss.Index) -> faiss.Index:
+    """Return the index behind IndexIDMap and IndexPreTransform wrappers (or the index itself)"""
+    if isinstance(index, ShardedIndex):
+        index = index.shards[0]
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def ensure_id_mapped(index: faiss.Index) -> faiss.Index:
+    """
+    Upgrade an index saved before label addressing was introduced
+
+    Legacy flat/HNSW indexes stored vectors by position, which is exactly
+    the label they were assigned, so they are re-added under those labels.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexPreTransform, faiss.IndexIVF)):
+        return index
+
+    logger.info(f"Migrating legacy {get_index_type(index)} index to labelled storage")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    migrated = create_index(index.d, get_index_type(index), compress=False)
+    migrated.add_with_ids(vectors, np.arange(index.ntotal, dtype='int64'))
+    return migrated
+
+def supports_remove(index: faiss.Index) -> bool:
+    """Whether vectors can be deleted in place (HNSW graphs cannot)"""
+    return not isinstance(unwrap(index), faiss.IndexHNSW)
+
+def get_index_type(index: faiss.Index) -> str:
+    """Map a FAISS index back to its INDEX_TYPES name"""
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"  # IndexIVFFlat or IndexIVFScalarQuantizer
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+def get_compression(index: faiss.Index) -> Optional[str]:
+    """
+    Describe how an index compresses vectors, e.g. "pca128+int8" (None if it stores them as-is)
+
+    Comparable with configured_compression().
+    """
+    if isinstance(index, ShardedIndex):
+        index = index.shards[0]
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+
+    parts = []
+    if isinstance(index, faiss.IndexPreTransform):
+        transform = faiss.downcast_VectorTransform(index.chain.at(0))
+        parts.append(f"{'opq' if isinstance(transform, faiss.OPQMatrix) else 'pca'}{transform.d_out}")
+    index = unwrap(index)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        parts.extend(name for name, qtype in SCALAR_QUANTIZERS.items() if qtype == index.sq.qtype)
+    return "+".join(parts) or None
+
+def configured_compression() -> Optional[str]:
+    """get_compression() of an index created with the current settings"""
+    parts = []
+    if settings.FAISS_REDUCTION:
+        parts.append(f"{settings.FAISS_REDUCTION}{settings.FAISS_REDUCED_DIMENSION or settings.EMBEDDING_DIMENSION}")
+    if settings.FAISS_SCALAR_QUANTIZER:
+        parts.append(settings.FAISS_SCALAR_QUANTIZER)
+    return "+".join(parts) or None
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    """Size of one stored vector code (excluding ids, HNSW links and IVF list overhead)"""
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return int(index.code_size)
+
+def configure_search(index: faiss.Index):
+    """Apply the default search-time parameters from settings to an index"""
+    if isinstance(index, ShardedIndex):
+        for shard in index.shards:
+            configure_search(shard)
+        return
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = settings.FAISS_IVF_NPROBE
+        # A hashtable direct map supports both reconstruct(label) and remove_ids()
+        if index.direct_map.type != faiss.DirectMap.Hashtable:
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                  selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-call search parameters overriding the index defaults
+
+    Passing these to index.search() is thread-safe, unlike mutating
+    index.nprobe / index.hnsw.efSearch in place.
+
+    Args:
+        index: Index the parameters are for
+        nprobe: IVF lists to visit
+        ef_search: HNSW candidate list size
+        selector: Restricts the search to the labels it accepts
+    """
+    inner = unwrap(index)
+    if isinstance(inner, faiss.IndexIVF):
+        if nprobe is None and selector is None:
+            return None
+        return faiss.SearchParametersIVF(nprobe=nprobe or inner.nprobe, sel=selector)
+    if isinstance(inner, faiss.IndexHNSW):
+        if ef_search is None and selector is None:
+            return None
+        return faiss.SearchParametersHNSW(efSearch=ef_search or inner.hnsw.efSearch, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+def recall_at_k(index: faiss.Index, vectors: np.ndarray, queries: np.ndarray, k: int,
+                ids: Optional[np.ndarray] = None,
+                params: Optional[faiss.SearchParameters] = None) -> float:
+    """
+    Measure recall@k of an approximate index against an exact flat baseline
+
+    Args:
+        index: Index under test, holding `vectors` under the labels `ids`
+        vectors: Exact vectors the index was built from
+        queries: Query vectors
+        k: Number of neighbours compared per query
+        ids: Label of each row of `vectors` (defaults to 0..n-1)
+        params: Optional search parameters for the index under test
+
+    Returns:
+        Fraction of true top-k neighbours the index also returned
+    """
+    baseline = faiss.IndexFlatL2(vectors.shape[1])
+    baseline.add(vectors)
+    k = min(k, len(vectors))
+
+    _, expected = baseline.search(queries, k)
+    if ids is not None:
+        expected = ids[expected]
+    _, actual = index.search(queries, k, params=params)
+
+    hits = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    return hits / float(expected.size) if expected.size else 1.0
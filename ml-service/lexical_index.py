@@ -0,0 +1,137 @@
+import math
+import re
+import numpy as np
+from array import array
+from typing import Dict, List, Tuple
+from config.settings import settings
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Keeps identifiers such as "gpt-4", "cs.CL" and "2301.12345v2" in one token
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[._\-/]")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the their this to "
+    "was we were which with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text; compound identifiers also yield their parts"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if _SEPARATORS.search(token):
+            terms.extend(part for part in _SEPARATORS.split(token) if part and part not in _STOPWORDS)
+    return terms
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over paper titles and abstracts
+
+    Each term maps to two compact arrays, labels (uint32) and term
+    frequencies (uint16), appended to as papers are added. Scoring is
+    vectorised per posting list. Removing a paper zeroes its length and
+    leaves its postings in place: document frequencies count only the
+    postings of papers still indexed, and the dead postings are dropped
+    when the vector database rebuilds the index (see removed).
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.lengths = np.zeros(0, dtype='int32')  # document length per label, 0 once removed
+        self.doc_count = 0
+        self.total_length = 0
+        self.removed = 0  # removed papers whose postings are still in the lists
+
+    def add(self, label: int, metadata: Dict):
+        """Index the title and abstract (or stored text) of a paper under its label"""
+        if label < len(self.lengths) and self.lengths[label]:
+            # Labels are never reused, so this is a replayed add of a paper already indexed
+            return
+        text = f"{metadata.get('title') or ''} {metadata.get('abstract') or metadata.get('text') or ''}"
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return
+
+        for term, count in counts.items():
+            if term not in self.postings:
+                self.postings[term] = (array('I'), array('H'))
+            labels, frequencies = self.postings[term]
+            labels.append(label)
+            frequencies.append(min(count, 0xFFFF))
+
+        if label >= len(self.lengths):
+            grown = np.zeros(max(label + 1, 2 * len(self.lengths), 1024), dtype='int32')
+            grown[:len(self.lengths)] = self.lengths
+            self.lengths = grown
+        length = sum(counts.values())
+        self.lengths[label] = length
+        self.doc_count += 1
+        self.total_length += length
+
+    def remove(self, label: int):
+        """Drop a label from the collection statistics and document frequencies"""
+        if label < len(self.lengths) and self.lengths[label]:
+            self.doc_count -= 1
+            self.total_length -= int(self.lengths[label])
+            self.lengths[label] = 0
+            self.removed += 1
+
+    def search(self, text: str, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k labels by BM25 score
+
+        Args:
+            text: Query text
+            k: Number of results
+            mask: Boolean mask of labels allowed in the results (liveness, filters)
+
+        Returns:
+            (scores, labels), best first; fewer than k if fewer labels match
+        """
+        terms = set(tokenize(text))
+        if not terms or not self.doc_count:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+
+        k1, b = settings.BM25_K1, settings.BM25_B
+        average_length = self.total_length / self.doc_count
+        all_labels, all_scores = [], []
+        for term in terms:
+            if term not in self.postings:
+                continue
+            labels, frequencies = self.postings[term]
+            labels = np.frombuffer(labels, dtype='uint32').astype('int64')
+            tf = np.frombuffer(frequencies, dtype='uint16').astype('float32')
+            # Postings of removed papers have length 0; they count neither in df nor in the results
+            indexed = self.lengths[labels] > 0
+            df = int(indexed.sum())
+            if not df:
+                continue
+            labels, tf = labels[indexed], tf[indexed]
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * self.lengths[labels] / average_length)
+            all_labels.append(labels)
+            all_scores.append(idf * tf * (k1 + 1) / (tf + norm))
+        if not all_labels:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+
+        labels = np.concatenate(all_labels)
+        scores = np.concatenate(all_scores)
+        allowed = labels < len(mask)
+        allowed[allowed] = mask[labels[allowed]]
+        labels, scores = labels[allowed], scores[allowed]
+
+        # Sum the per-term scores of each label, then keep the k best
+        labels, inverse = np.unique(labels, return_inverse=True)
+        scores = np.bincount(inverse, weights=scores).astype('float32')
+        if len(labels) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            labels, scores = labels[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return scores[order], labels[order]
@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+class MetadataStore:
+    """
+    SQLite-backed paper metadata keyed by paperId and FAISS label
+
+    Only the rows needed for a lookup are read from disk; a small LRU keeps
+    recently returned records in memory. Durability of individual writes
+    comes from the vector database's write-ahead log, so SQLite runs with
+    synchronous=NORMAL and is only forced to disk at checkpoints.
+
+    Several worker processes may open the same database. Each remembers the
+    last log record reflected in the table (applied_seq), so records logged
+    by a worker that died before committing are applied by the next writer.
+    """
+
+    def __init__(self, path: Path, cache_size: int = 10000, mmap_size: int = 0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()  # label -> (paperId, metadata)
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Read through a shared mapping so workers don't each copy hot pages
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            " paper_id TEXT PRIMARY KEY,"
+            " label INTEGER NOT NULL UNIQUE,"
+            " metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def put(self, paper_id: str, label: int, metadata: Dict):
+        """Insert or replace a paper's label and metadata"""
+        with self._lock:
+            old = self._conn.execute("SELECT label FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            if old:
+                self._cache.pop(old[0], None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO papers (paper_id, label, metadata) VALUES (?, ?, ?)",
+                (paper_id, label, json.dumps(metadata))
+            )
+
+    def put_many(self, rows: Iterable[Tuple[str, int, Dict]]):
+        """Bulk insert (paperId, label, metadata) rows"""
+        rows = list(rows)
+        with self._lock:
+            if self._cache:
+                # Like put(): a replaced paper's record must not stay cached under its old label
+                paper_ids = [paper_id for paper_id, _, _ in rows]
+                for start in range(0, len(paper_ids), 900):
+                    chunk = paper_ids[start:start + 900]
+                    placeholders = ",".join("?" * len(chunk))
+                    for (label,) in self._conn.execute(
+                        f"SELECT label FROM papers WHERE paper_id IN ({placeholders})", chunk
+                    ):
+                        self._cache.pop(label, None)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO papers (paper_id, label, metadata) VALUES (?, ?, ?)",
+                ((paper_id, label, json.dumps(metadata)) for paper_id, label, metadata in rows)
+            )
+
+    def delete(self, paper_id: str):
+        """Remove a paper's row"""
+        with self._lock:
+            old = self._conn.execute("SELECT label FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            if old:
+                self._cache.pop(old[0], None)
+                self._conn.execute("DELETE FROM papers WHERE paper_id = ?", (paper_id,))
+
+    def get_applied_seq(self) -> int:
+        """Last write-ahead log record reflected in the table"""
+        return self.get_state('applied_seq')
+
+    def set_applied_seq(self, seq: int):
+        """Record the last applied log record (committed with the rows it covers)"""
+        self.set_state('applied_seq', seq)
+
+    def get_state(self, key: str, default: int = 0) -> int:
+        """Integer bookkeeping value stored alongside the papers"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value: int):
+        """Set a bookkeeping value (committed with the next commit())"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def commit(self):
+        """Commit pending writes (visible to other connections, not yet fsynced)"""
+        with self._lock:
+            self._conn.commit()
+
+    def sync(self):
+        """Commit and force everything written so far to disk"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def get(self, paper_id: str) -> Optional[Dict]:
+        """Metadata for a paperId"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT label, metadata FROM papers WHERE paper_id = ?", (paper_id,)
+            ).fetchone()
+        if not row:
+            return None
+        metadata = json.loads(row[1])
+        self._remember(row[0], paper_id, metadata)
+        return metadata
+
+    def get_label(self, paper_id: str) -> Optional[int]:
+        """FAISS label currently assigned to a paperId"""
+        with self._lock:
+            row = self._conn.execute("SELECT label FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_by_labels(self, labels: List[int]) -> Dict[int, Tuple[str, Dict]]:
+        """
+        Fetch (paperId, metadata) for a set of labels, e.g. the top-k hits of a search
+
+        Returns:
+            Dict label -> (paperId, metadata) for the labels that exist
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for label in labels:
+                if label in self._cache:
+                    self._cache.move_to_end(label)
+                    found[label] = self._cache[label]
+                else:
+                    missing.append(label)
+
+            # Chunked to stay under SQLite's bound-parameter limit (999 on older builds)
+            for start in range(0, len(missing), 900):
+                chunk = missing[start:start + 900]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT label, paper_id, metadata FROM papers WHERE label IN ({placeholders})", chunk
+                ).fetchall()
+                for label, paper_id, metadata in rows:
+                    found[label] = (paper_id, json.loads(metadata))
+                    self._remember(label, paper_id, found[label][1])
+        return found
+
+    def iter_metadata(self, page_size: int = 10000) -> Iterator[Tuple[int, Dict]]:
+        """Yield (label, metadata) for every stored paper in label order, a page at a time"""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT label, metadata FROM papers WHERE label > ? ORDER BY label LIMIT ?", (last, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for label, metadata in rows:
+                yield label, json.loads(metadata)
+            last = rows[-1][0]
+
+    def count(self) -> int:
+        """Number of stored papers"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def clear(self):
+        """Delete every row (used when importing a legacy metadata file)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM papers")
+            self._cache.clear()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def _remember(self, label: int, paper_id: str, metadata: Dict):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[label] = (paper_id, metadata)
+            self._cache.move_to_end(label)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from datetime import date
+from typing import List, Literal, Optional, Dict, Any
 
 # ==================== Embedding Models ====================
 
@@ -7,6 +8,7 @@ class EmbeddingRequest(BaseModel):
     """Request model for generating embeddings"""
     paperId: str = Field(..., description="Unique paper identifier")
     text: str = Field(..., description="Text to generate embedding for")
+    metadata: Optional[Dict[str, Any]] = Field(default=None, description="Searchable paper fields (title, authors, categories, publishedDate)")
 
 class EmbeddingResponse(BaseModel):
     """Response model for embedding generation"""
@@ -20,10 +22,19 @@ class BatchEmbeddingRequest(BaseModel):
 
 # ==================== Search Models ====================
 
+class SearchFilters(BaseModel):
+    """Metadata filters applied inside the vector search"""
+    categories: Optional[List[str]] = Field(default=None, description="Match papers in any of these categories")
+    authors: Optional[List[str]] = Field(default=None, description="Match papers by any of these authors")
+    publishedFrom: Optional[date] = Field(default=None, description="Earliest publication date (inclusive)")
+    publishedTo: Optional[date] = Field(default=None, description="Latest publication date (inclusive)")
+
 class SemanticSearchRequest(BaseModel):
     """Request model for semantic search"""
     query: str = Field(..., description="Search query")
     limit: int = Field(default=10, ge=1, le=100, description="Number of results")
+    filters: Optional[SearchFilters] = Field(default=None, description="Only return papers matching these filters")
+    mode: Literal["semantic", "hybrid"] = Field(default="semantic", description="hybrid fuses in BM25 keyword matches")
 
 class SearchResult(BaseModel):
     """Individual search result"""
@@ -32,6 +43,7 @@ class SearchResult(BaseModel):
     abstract: str
     similarity: float
     distance: float
+    score: Optional[float] = None  # fused rank score (hybrid mode)
 
 class SemanticSearchResponse(BaseModel):
     """Response model for semantic search"""
@@ -39,6 +51,28 @@ class SemanticSearchResponse(BaseModel):
     results: List[SearchResult]
     count: int
 
+class BatchSemanticSearchRequest(BaseModel):
+    """Request model for running many semantic searches in one call"""
+    queries: List[str] = Field(..., min_length=1, max_length=1000, description="Search queries")
+    limit: int = Field(default=10, ge=1, le=100, description="Number of results per query")
+    filters: Optional[SearchFilters] = Field(default=None, description="Filters applied to every query")
+    mode: Literal["semantic", "hybrid"] = Field(default="semantic", description="hybrid fuses in BM25 keyword matches")
+
+class BatchSemanticSearchResponse(BaseModel):
+    """Response model for batch semantic search, one entry per query in request order"""
+    results: List[SemanticSearchResponse]
+    count: int
+
+# ==================== Index Models ====================
+
+class BuildSnapshotRequest(BaseModel):
+    """Request model for building and activating a new index snapshot"""
+    index_type: Optional[str] = Field(default=None, description="flat | hnsw | ivf_flat | ivf_pq (defaults to the configured type)")
+
+class RollbackSnapshotRequest(BaseModel):
+    """Request model for rolling the index back to an earlier snapshot"""
+    version: Optional[int] = Field(default=None, description="Snapshot version (defaults to the previous build)")
+
 # ==================== RAG Models ====================
 
 class PaperInput(BaseModel):
@@ -65,6 +99,7 @@ class RAGResponse(BaseModel):
     answer: str
     citations: List[Citation]
     processing_time: Optional[float] = None
+    cached: bool = False  # served from the answer cache
 
 # ==================== Graph Models ====================
 
@@ -106,12 +141,17 @@ class PaperMetadata(BaseModel):
     abstract: str
     authors: Optional[List[str]] = []
     categories: Optional[List[str]] = []
+    publishedDate: Optional[str] = None
 
 class AddPaperRequest(BaseModel):
     """Request to add paper to vector database"""
     paperId: str
     metadata: PaperMetadata
 
+class UpdatePaperMetadataRequest(BaseModel):
+    """Request to update an indexed paper's searchable fields without re-encoding it"""
+    metadata: Dict[str, Any] = Field(..., description="Searchable paper fields (title, authors, categories, publishedDate)")
+
 # ==================== Generic Response Models ====================
 
 class HealthResponse(BaseModel):
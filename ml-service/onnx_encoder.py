@@ -0,0 +1,194 @@
+import inspect
+import json
+import re
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Union
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+CONFIG_FILE = "encoder.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+def onnx_model_dir(base_dir: Union[str, Path], model_name: str) -> Path:
+    """Directory an exported model lives in"""
+    return Path(base_dir) / re.sub(r"[^A-Za-z0-9._-]", "_", model_name)
+
+def export_onnx_model(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """
+    Export a sentence-transformers model to ONNX, optionally with an int8 copy
+
+    Only the transformer runs in ONNX; pooling and normalisation are read
+    from the sentence-transformers pipeline into encoder.json and applied in
+    numpy, so the output matches SentenceTransformer.encode.
+
+    Args:
+        model_name: sentence-transformers model name or path
+        output_dir: Directory for the ONNX files, tokenizer and encoder.json
+        quantize: Also write a dynamically int8-quantised model
+
+    Returns:
+        output_dir
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    try:
+        logger.info(f"Exporting {model_name} to ONNX in {output_dir}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        model = SentenceTransformer(model_name, device="cpu")
+        transformer = model[0].auto_model.eval()
+        tokenizer = model.tokenizer
+        tokenizer.save_pretrained(str(output_dir))
+
+        sample = tokenizer(["An example sentence to trace the graph"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {0: "batch", 1: "sequence"}
+
+        class Traced(torch.nn.Module):
+            # Passes inputs by name: the positional order of forward() differs between versions
+            def __init__(self):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *inputs):
+                return self.transformer(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+        # Newer torch defaults to the dynamo exporter; the TorchScript one handles these models reliably
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                Traced(),
+                tuple(sample[name] for name in input_names),
+                str(output_dir / FP32_FILE),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+                opset_version=14,
+                **legacy
+            )
+
+        pooling = next((module for module in model if isinstance(module, Pooling)), None)
+        config = {
+            "model": model_name,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "pooling": _pooling_mode(pooling) if pooling else "mean",
+            "normalize": any(isinstance(module, Normalize) for module in model)
+        }
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(str(output_dir / FP32_FILE), str(output_dir / INT8_FILE), weight_type=QuantType.QInt8)
+
+        # Written last: its presence marks a complete export
+        with open(output_dir / CONFIG_FILE, "w") as f:
+            json.dump(config, f, indent=2)
+        logger.info(f"Exported {model_name} ({config['pooling']} pooling, normalize={config['normalize']})")
+        return output_dir
+    except Exception as e:
+        logger.error(f"Failed to export {model_name} to ONNX: {e}")
+        raise
+
+def _pooling_mode(pooling) -> str:
+    if hasattr(pooling, "get_pooling_mode_str"):  # sentence-transformers < 6
+        return pooling.get_pooling_mode_str()
+    return pooling.pooling_mode
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported transformer with ONNX Runtime on CPU
+
+    Exposes the subset of the SentenceTransformer interface the service
+    uses (encode, get_sentence_embedding_dimension, tokenizer), so
+    EmbeddingGenerator can use either interchangeably; encode_ids takes
+    texts the generator has already tokenised.
+    """
+
+    def __init__(self, directory: Path, quantized: bool = True, threads: Optional[int] = None, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(directory / CONFIG_FILE) as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+        self.max_seq_length = config["max_seq_length"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.batch_size = batch_size
+        self.quantized = quantized and (directory / INT8_FILE).exists()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = directory / (INT8_FILE if self.quantized else FP32_FILE)
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        logger.info(f"Loaded ONNX encoder {path} ({'int8' if self.quantized else 'fp32'})")
+
+    def encode(self, sentences: Union[str, List[str]], convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Embed one text or a list of texts
+
+        Returns:
+            numpy array (dimension,) for a single text, else (len(sentences) x dimension)
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+
+        # Longest first, like sentence-transformers, so batches pad little
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            embeddings[batch] = self.encode_ids(features["input_ids"], features["attention_mask"])
+
+        return embeddings[0] if single else embeddings
+
+    def encode_ids(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """
+        Embed a batch that is already tokenised and padded (batch x sequence)
+
+        Texts are single sequences, so token type ids are all zeros.
+        """
+        features = {"input_ids": input_ids, "attention_mask": attention_mask}
+        inputs = {
+            name: (features[name] if name in features else np.zeros_like(attention_mask)).astype("int64")
+            for name in self.input_names
+        }
+        hidden = self.session.run(None, inputs)[0]
+        return self._pool(hidden, attention_mask)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        mask = mask[..., None].astype("float32")
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype("float32")
+
+def load_onnx_encoder(model_name: str, base_dir: Union[str, Path], quantize: bool = True,
+                      threads: Optional[int] = None) -> OnnxEncoder:
+    """Load the exported model, exporting it first if it isn't there yet"""
+    directory = onnx_model_dir(base_dir, model_name)
+    if not (directory / CONFIG_FILE).exists() or (quantize and not (directory / INT8_FILE).exists()):
+        export_onnx_model(model_name, directory, quantize)
+    return OnnxEncoder(directory, quantize, threads)
@@ -1,6 +1,5 @@
 import re
 from typing import Dict, Optional
-from PyPDF2 import PdfReader
 from io import BytesIO
 from utils import setup_logger
 
@@ -20,6 +19,9 @@ class PaperParser:
             Dict with extracted text and metadata
         """
         try:
+            # Imported on first use, in the worker process that parses
+            from PyPDF2 import PdfReader
+            
             pdf_file = BytesIO(pdf_bytes)
             reader = PdfReader(pdf_file)
             
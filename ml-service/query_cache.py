@@ -0,0 +1,124 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import List, Tuple
+from config.settings import settings
+from utils import setup_logger
+from embeddings import embedding_generator
+from embedding_batcher import embedding_batcher
+
+logger = setup_logger(__name__)
+
+def normalize_query(text: str) -> str:
+    """Cache key text: case and whitespace differences don't change the query"""
+    return " ".join(text.lower().split())
+
+class QueryCache:
+    """
+    Bounded LRU cache of query embeddings with a time-to-live
+
+    Keyed on the embedding model and backend and the normalised query text,
+    so repeated and near-identical searches (different case or spacing)
+    skip the model entirely. Entries expire after QUERY_CACHE_TTL_SECONDS so a
+    cache never outlives a model swap by long, and the least recently used
+    entry is evicted once QUERY_CACHE_SIZE is reached.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()  # (model, text) -> (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_embedding(self, text: str) -> np.ndarray:
+        """
+        Embedding of a search query, from the cache when possible
+
+        Misses are encoded through the batcher, together with concurrent requests.
+
+        Args:
+            text: Query text
+
+        Returns:
+            numpy array of embeddings (read-only)
+        """
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self._put(key, await embedding_batcher.embed(text))
+        return vector
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings of several queries; only cache misses are encoded, in one batch
+
+        Args:
+            texts: Query texts
+
+        Returns:
+            numpy array of embeddings (len(texts) x embedding_dim)
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        # Encode each distinct missing query once
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            encoded = embedding_generator.generate_embeddings_batch([texts[positions[0]] for positions in missing.values()])
+            for (key, positions), vector in zip(missing.items(), encoded):
+                vector = self._put(key, vector)
+                for i in positions:
+                    vectors[i] = vector
+        return np.stack(vectors)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return embedding_generator.fingerprint, normalize_query(text)
+
+    def _get(self, key: Tuple[str, str]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _put(self, key: Tuple[str, str], vector: np.ndarray) -> np.ndarray:
+        vector = np.array(vector, dtype='float32')
+        # Shared between requests, so nobody may modify it in place
+        vector.setflags(write=False)
+        if self.max_size <= 0:
+            return vector
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+# Global instance
+query_cache = QueryCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL_SECONDS)
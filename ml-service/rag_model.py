@@ -1,25 +1,53 @@
-import torch
-from typing import List, Dict
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+import re
+import threading
+from typing import Callable, List, Dict, Tuple, Union
 from config.settings import settings
 from utils import setup_logger
+from context_builder import context_builder
 
 logger = setup_logger(__name__)
 
 class RAGModel:
-    """RAG-based question answering system"""
+    """
+    RAG-based question answering system
+    
+    The HuggingFace model is loaded by load(), called from the service's
+    startup task or on the first answer, not when the module is imported.
+    """
     
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         self.model = None
         self.tokenizer = None
-        
-        if self.provider == "huggingface":
-            self._load_hf_model()
+        # Identifies what produces the answers, for the answer cache
+        self.fingerprint = self.provider
+        self.loaded = False
+        self._load_lock = threading.Lock()
+    
+    def load(self):
+        """Load the configured provider's model (once; later calls return immediately)"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                if self.provider == "huggingface":
+                    self._load_hf_model()
+                self.fingerprint = f"hf:{settings.HF_MODEL}" if self.provider == "huggingface" else self.provider
+                self.loaded = True
+    
+    def warm_up(self):
+        """Run a short generation so the first answer doesn't pay for lazy allocations"""
+        self.load()
+        if self.model is not None:
+            inputs = self.tokenizer("Answer: warm up", return_tensors="pt")
+            self.model.generate(inputs.input_ids, max_length=8)
     
     def _load_hf_model(self):
         """Load HuggingFace model for text generation"""
         try:
+            # Imported here: the simple provider never needs torch or transformers
+            from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+            
             logger.info(f"Loading HuggingFace model: {settings.HF_MODEL}")
             self.tokenizer = AutoTokenizer.from_pretrained(settings.HF_MODEL)
             self.model = AutoModelForSeq2SeqLM.from_pretrained(settings.HF_MODEL)
@@ -40,50 +68,116 @@ class RAGModel:
         Returns:
             Dict with answer and citations
         """
+        result = self.generate_answers([(question, papers)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    def generate_answers(self, requests: List[Tuple[str, List[Dict]]]) -> List[Union[Dict, Exception]]:
+        """
+        Generate answers to several questions with one batched model call
+        
+        A request that fails (e.g. its papers can't be built into a context)
+        gets its exception in its result slot; the others are still answered.
+        
+        Args:
+            requests: (question, papers) pairs
+            
+        Returns:
+            Dict with answer and citations for each request, or the exception it raised, in order
+        """
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}")
+            raise
+        
+        # Build each context from the passages most relevant to its question
+        results: List[Union[Dict, Exception]] = [None] * len(requests)
+        positions, questions, contexts = [], [], []
+        for position, (question, papers) in enumerate(requests):
+            try:
+                contexts.append(self._build_context(question, papers))
+            except Exception as e:
+                logger.error(f"Error building context for an answer: {e}")
+                results[position] = e
+                continue
+            positions.append(position)
+            questions.append(question)
+        if not positions:
+            return results
+        
+        # Generate answers based on provider, the model's in one padded batch
+        hf_answers = None
+        if self.provider == "huggingface" and self.model:
+            hf_answers = self._generate_with_hf(questions, contexts)
+        
+        for i, position in enumerate(positions):
+            used = contexts[i][1]
+            try:
+                answer = hf_answers[i] if hf_answers is not None else self._generate_simple(questions[i], used)
+                # Cite the passages the context was built from
+                results[position] = {'answer': answer, 'citations': self._extract_citations(used)}
+            except Exception as e:
+                logger.error(f"Error generating answer: {e}")
+                results[position] = e
+        return results
+    
+    def stream_answer(self, question: str, papers: List[Dict], on_text: Callable[[str], None],
+                      stop: threading.Event) -> Dict:
+        """
+        Generate an answer, handing each piece of text to on_text as it is decoded
+        
+        Uses greedy decoding (or sampling with RAG_STREAM_DO_SAMPLE) rather
+        than beam search, since beams only settle once generation ends.
+        
+        Args:
+            question: User question
+            papers: List of paper dicts with title, abstract, etc.
+            on_text: Called from this thread with each new piece of the answer
+            stop: Generation stops early once this is set (e.g. the client went away)
+            
+        Returns:
+            Dict with the full answer and citations
+        """
         try:
-            # Build context from papers
-            context = self._build_context(papers)
+            self.load()
+            context, used = self._build_context(question, papers)
             
-            # Generate answer based on provider
             if self.provider == "huggingface" and self.model:
-                answer = self._generate_with_hf(question, context)
+                answer = self._stream_with_hf(question, context, on_text, stop)
             else:
-                answer = self._generate_simple(question, papers)
-            
-            # Extract citations
-            citations = self._extract_citations(papers, answer)
+                answer = self._generate_simple(question, used)
+                for piece in re.findall(r"\S+\s*", answer):
+                    if stop.is_set():
+                        break
+                    on_text(piece)
             
             return {
                 'answer': answer,
-                'citations': citations
+                'citations': self._extract_citations(used)
             }
         except Exception as e:
-            logger.error(f"Error generating answer: {e}")
+            logger.error(f"Error streaming answer: {e}")
             raise
     
-    def _build_context(self, papers: List[Dict], max_length: int = 2000) -> str:
-        """Build context from paper abstracts"""
-        context_parts = []
-        current_length = 0
-        
-        for i, paper in enumerate(papers):
-            title = paper.get('title', '')
-            abstract = paper.get('abstract', '')
-            
-            paper_text = f"Paper {i+1}: {title}\n{abstract}\n\n"
-            
-            if current_length + len(paper_text) > max_length:
-                break
-            
-            context_parts.append(paper_text)
-            current_length += len(paper_text)
+    def _build_context(self, question: str, papers: List[Dict]) -> Tuple[str, List[Dict]]:
+        """
+        Fill the prompt's token budget with the passages most relevant to the question
         
-        return "".join(context_parts)
+        Tokens are counted with the LLM's tokenizer when one is loaded (the
+        embedding model's otherwise), and the question and prompt template
+        are taken off the budget first, so the prompt is never truncated.
+        
+        Returns:
+            (context text, papers used with their passages, most relevant first)
+        """
+        tokenizer = self.tokenizer if self.model is not None else context_builder.tokenizer()
+        overhead = len(tokenizer(self._prompt(question, ""))['input_ids'])
+        return context_builder.build(question, papers, settings.RAG_PROMPT_MAX_TOKENS - overhead, tokenizer)
     
-    def _generate_with_hf(self, question: str, context: str) -> str:
-        """Generate answer using HuggingFace model"""
-        try:
-            prompt = f"""Answer the following question based on the provided research papers.
+    def _prompt(self, question: str, context: str) -> str:
+        return f"""Answer the following question based on the provided research papers.
 
 Context:
 {context}
@@ -91,38 +185,74 @@ Context:
 Question: {question}
 
 Answer:"""
-            
-            inputs = self.tokenizer(prompt, return_tensors="pt", max_length=512, truncation=True)
+    
+    def _generate_with_hf(self, questions: List[str], contexts: List[Tuple[str, List[Dict]]]) -> List[str]:
+        """Generate answers using HuggingFace model, with the prompts padded into one batch"""
+        try:
+            inputs = self.tokenizer(
+                [self._prompt(question, context) for question, (context, _) in zip(questions, contexts)],
+                return_tensors="pt", padding=True, max_length=settings.RAG_PROMPT_MAX_TOKENS, truncation=True
+            )
             
             outputs = self.model.generate(
                 inputs.input_ids,
+                attention_mask=inputs.attention_mask,
                 max_length=256,
                 num_beams=4,
                 early_stopping=True,
                 temperature=0.7
             )
             
-            answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            return answer
+            return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
         except Exception as e:
             logger.error(f"Error in HF generation: {e}")
-            return self._generate_simple(question, context)
+            return [self._generate_simple(question, used) for question, (_, used) in zip(questions, contexts)]
+    
+    def _stream_with_hf(self, question: str, context: str, on_text: Callable[[str], None],
+                        stop: threading.Event) -> str:
+        """Generate with the HuggingFace model, streaming decoded words to on_text"""
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextStreamer
+        
+        class CallbackStreamer(TextStreamer):
+            # Runs in the generating thread, so no extra thread or queue is needed here
+            def on_finalized_text(self, text: str, stream_end: bool = False):
+                if text:
+                    on_text(text)
+        
+        class StopOnEvent(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.full((input_ids.shape[0],), stop.is_set(), dtype=torch.bool, device=input_ids.device)
+        
+        inputs = self.tokenizer(
+            self._prompt(question, context), return_tensors="pt",
+            max_length=settings.RAG_PROMPT_MAX_TOKENS, truncation=True
+        )
+        sampling = {"do_sample": True, "temperature": settings.RAG_STREAM_TEMPERATURE} if settings.RAG_STREAM_DO_SAMPLE else {}
+        outputs = self.model.generate(
+            inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            max_length=256,
+            num_beams=1,
+            streamer=CallbackStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True),
+            stopping_criteria=StoppingCriteriaList([StopOnEvent()]),
+            **sampling
+        )
+        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
     
-    def _generate_simple(self, question: str, papers: List[Dict]) -> str:
+    def _generate_simple(self, question: str, used: List[Dict]) -> str:
         """
         Simple rule-based answer generation
         (This is a fallback - in production you'd use a proper LLM)
         """
         # Extract key information from papers
         findings = []
-        methods = []
         
-        for paper in papers[:3]:  # Top 3 papers
-            abstract = paper.get('abstract', '')
-            title = paper.get('title', '')
+        for entry in used[:3]:  # Top 3 papers
+            title = entry['paper'].get('title', '')
             
-            # Simple extraction (can be improved with NLP)
-            findings.append(f"According to '{title}': {abstract[:200]}...")
+            # The passages most relevant to the question
+            findings.append(f"According to '{title}': {' '.join(entry['passages'])}")
         
         # Build answer
         answer = f"Based on the research papers:\n\n"
@@ -131,15 +261,15 @@ Answer:"""
         
         return answer
     
-    def _extract_citations(self, papers: List[Dict], answer: str) -> List[Dict]:
-        """Extract citations from papers used in answer"""
+    def _extract_citations(self, used: List[Dict]) -> List[Dict]:
+        """Cite each paper in the context with the passages taken from it"""
         citations = []
         
-        for i, paper in enumerate(papers[:3]):  # Top 3 most relevant
+        for entry in used:  # Most relevant first
             citation = {
-                'paperId': paper.get('id'),
-                'text': paper.get('abstract', '')[:200] + "...",
-                'relevance': 1.0 - (i * 0.2)  # Simple relevance scoring
+                'paperId': entry['paper'].get('id'),
+                'text': " ".join(entry['passages']),
+                'relevance': round(entry['relevance'], 4)  # best passage's cosine similarity to the question
             }
             citations.append(citation)
         
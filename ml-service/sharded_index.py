@@ -0,0 +1,113 @@
+import heapq
+import os
+import faiss
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, List, Optional, Set, Tuple
+from config.settings import settings
+from utils import setup_logger
+
+logger = setup_logger(__name__)
+
+_executor = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by every sharded index (FAISS releases the GIL while it works)"""
+    global _executor
+    if _executor is None:
+        workers = settings.FAISS_SHARD_THREADS or min(settings.FAISS_SHARDS, os.cpu_count() or 1)
+        _executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="faiss-shard")
+    return _executor
+
+class ShardedIndex:
+    """
+    A set of FAISS indexes partitioned by label and searched in parallel
+
+    Label l lives in shard l % n. Labels are handed out sequentially, so
+    shards stay balanced and any label is routed without a lookup table.
+    Searches fan out over a thread pool and the per-shard top-k lists are
+    merged with a heap. Mirrors the part of the faiss.Index API the vector
+    database uses, so it can stand in for a single index.
+    """
+
+    def __init__(self, shards: List[faiss.Index]):
+        """
+        Args:
+            shards: One index per shard, all of the same type and dimension
+        """
+        self.shards = shards
+        self.d = shards[0].d
+        self.dirty: Set[int] = set(range(len(shards)))  # shards changed since they were last saved
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    @property
+    def is_trained(self) -> bool:
+        return all(shard.is_trained for shard in self.shards)
+
+    def train(self, x: np.ndarray):
+        """Train one shard and copy it to the others, so every shard shares the same quantizer"""
+        self.shards[0].train(np.ascontiguousarray(x, dtype='float32'))
+        for i in range(1, len(self.shards)):
+            self.shards[i] = faiss.clone_index(self.shards[0])
+        self.dirty = set(range(len(self.shards)))
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        x = np.ascontiguousarray(x, dtype='float32')
+        ids = np.asarray(ids, dtype='int64')
+        self._for_each_shard(ids, lambda i, rows: self.shards[i].add_with_ids(x[rows], ids[rows]))
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        ids = np.asarray(ids, dtype='int64')
+        return sum(self._for_each_shard(ids, lambda i, rows: self.shards[i].remove_ids(ids[rows])))
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        ids = np.asarray(ids, dtype='int64')
+        vectors = np.empty((len(ids), self.d), dtype='float32')
+
+        def fetch(i: int, rows: np.ndarray):
+            vectors[rows] = self.shards[i].reconstruct_batch(ids[rows])
+
+        self._for_each_shard(ids, fetch, modifies=False)
+        return vectors
+
+    def search(self, x: np.ndarray, k: int,
+               params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every shard in parallel and merge the per-shard top-k
+
+        Args:
+            x: Query vectors
+            k: Number of results per query
+            params: Search parameters applied to every shard
+
+        Returns:
+            (distances, labels) like faiss.Index.search, -1 for missing results
+        """
+        x = np.ascontiguousarray(x, dtype='float32')
+        results = list(_get_executor().map(lambda shard: shard.search(x, k, params=params), self.shards))
+
+        distances = np.full((len(x), k), np.finfo('float32').max, dtype='float32')
+        labels = np.full((len(x), k), -1, dtype='int64')
+        for q in range(len(x)):
+            # Each shard's list is already sorted, so a k-way heap merge finds the global top-k
+            merged = heapq.merge(*(zip(d[q], i[q]) for d, i in results))
+            hits = islice(((dist, label) for dist, label in merged if label != -1), k)
+            for rank, (dist, label) in enumerate(hits):
+                distances[q, rank] = dist
+                labels[q, rank] = label
+        return distances, labels
+
+    def _for_each_shard(self, ids: np.ndarray, fn: Callable, modifies: bool = True) -> List:
+        """Call fn(shard_number, row_positions) for every shard owning some of ids, in parallel"""
+        owners = ids % len(self.shards)
+        groups = [(i, np.flatnonzero(owners == i)) for i in np.unique(owners).tolist()]
+        if modifies:
+            self.dirty.update(i for i, _ in groups)
+
+        if len(groups) == 1:
+            return [fn(*groups[0])]
+        return list(_get_executor().map(lambda group: fn(*group), groups))
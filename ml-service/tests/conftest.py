@@ -0,0 +1,91 @@
+"""
+Shared setup for the unit tests
+
+The service modules are imported from the ml-service directory, and
+their module-level instances (vector database, metadata store, caches)
+open files where settings point, so those paths go to a temporary
+directory before anything imports config.settings.
+"""
+
+import os
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+_data = Path(tempfile.mkdtemp(prefix="ml-service-tests-"))
+for name, path in {
+    "CHECKPOINT_DIR": "vectors/checkpoints",
+    "WAL_PATH": "vectors/wal.log",
+    "WRITER_LOCK_PATH": "vectors/writer.lock",
+    "METADATA_DB_PATH": "embeddings/metadata.db",
+    "FAISS_INDEX_PATH": "vectors/faiss_index.bin",
+    "EMBEDDING_METADATA_PATH": "embeddings/metadata.json",
+    "EMBEDDING_CACHE_DIR": "embeddings/cache",
+}.items():
+    os.environ.setdefault(name, str(_data / path))
+
+DIMENSION = 16
+
+def random_vectors(count: int, seed: int = 0) -> np.ndarray:
+    """Unit-length float32 vectors, reproducible per seed"""
+    vectors = np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class StubEncoder:
+    """Stands in for the embedding model: the same text always maps to the same random vector"""
+
+    fingerprint = "stub"
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return np.stack([random_vectors(1, seed=zlib.crc32(text.encode()))[0] for text in texts])
+
+@pytest.fixture
+def stub_encoder(monkeypatch):
+    """Route the service's embedding calls (direct and batched) to a StubEncoder"""
+    from embeddings import embedding_generator
+    from embedding_batcher import embedding_batcher
+
+    encoder = StubEncoder()
+    monkeypatch.setattr(embedding_generator, "fingerprint", encoder.fingerprint)
+    monkeypatch.setattr(embedding_generator, "generate_embeddings_batch", encoder.encode)
+
+    async def embed(text):
+        return encoder.encode([text])[0]
+
+    monkeypatch.setattr(embedding_batcher, "embed", embed)
+    return encoder
+
+@pytest.fixture
+def db_settings(tmp_path, monkeypatch):
+    """Point the vector database at tmp_path, with small vectors and no background checkpoints"""
+    from config.settings import settings
+
+    for name, value in {
+        "EMBEDDING_DIMENSION": DIMENSION,
+        "CHECKPOINT_DIR": str(tmp_path / "checkpoints"),
+        "WAL_PATH": str(tmp_path / "wal.log"),
+        "WRITER_LOCK_PATH": str(tmp_path / "writer.lock"),
+        "METADATA_DB_PATH": str(tmp_path / "metadata.db"),
+        "FAISS_INDEX_PATH": str(tmp_path / "faiss_index.bin"),
+        "EMBEDDING_METADATA_PATH": str(tmp_path / "metadata.json"),
+        "WAL_FSYNC": False,
+        "FAISS_INDEX_TYPE": "flat",
+        "FAISS_SHARDS": 1,
+        "FAISS_REDUCTION": None,
+        "FAISS_SCALAR_QUANTIZER": None,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return settings
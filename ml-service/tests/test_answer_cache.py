@@ -0,0 +1,70 @@
+import asyncio
+
+import numpy as np
+
+from answer_cache import AnswerCache, AnswerKey, library_fingerprint
+
+PAPERS = [
+    {'id': "p1", 'title': "Graph neural networks", 'abstract': "Message passing."},
+    {'id': "p2", 'title': "Attention", 'abstract': "Transformers."},
+]
+
+def _key(cache: AnswerCache, question: str, papers=PAPERS, config: str = "simple") -> AnswerKey:
+    return asyncio.run(cache.key(question, papers, config))
+
+def _vector(*values) -> np.ndarray:
+    vector = np.array(values, dtype='float32')
+    return vector / np.linalg.norm(vector)
+
+def test_library_fingerprint_ignores_paper_order_but_not_contents():
+    assert library_fingerprint(PAPERS, "simple") == library_fingerprint(PAPERS[::-1], "simple")
+    assert library_fingerprint(PAPERS, "simple") != library_fingerprint(PAPERS, "openai")
+    edited = [PAPERS[0], {**PAPERS[1], 'abstract': "Changed."}]
+    assert library_fingerprint(PAPERS, "simple") != library_fingerprint(edited, "simple")
+
+def test_exact_hits_are_copies(stub_encoder):
+    cache = AnswerCache(max_size=10, ttl_seconds=60, similarity=None)
+    cache.put(_key(cache, "What is a GNN?"), {'answer': "A network", 'sources': []})
+    result = cache.get(_key(cache, "what is a  GNN?"))
+    assert result == {'answer': "A network", 'sources': []}
+    result['sources'].append("mutated")
+    assert cache.get(_key(cache, "What is a GNN?"))['sources'] == []
+    assert cache.get(_key(cache, "What is a GNN?", papers=PAPERS[:1])) is None
+    assert cache.get(_key(cache, "What is a GNN?", config="openai")) is None
+
+def test_similarity_matching_is_off_by_default(stub_encoder):
+    cache = AnswerCache(max_size=10, ttl_seconds=60, similarity=None)
+    assert _key(cache, "What is a GNN?").vector is None
+    assert stub_encoder.calls == 0
+
+def test_similar_questions_hit_when_enabled():
+    cache = AnswerCache(max_size=10, ttl_seconds=60, similarity=0.95)
+    library = library_fingerprint(PAPERS, "simple")
+    cache.put(AnswerKey(library, "what is a gnn?", _vector(1, 0, 0)), {'answer': "A network"})
+
+    assert cache.get(AnswerKey(library, "explain gnns", _vector(1, 0.1, 0))) == {'answer': "A network"}
+    assert cache.similar_hits == 1
+    assert cache.get(AnswerKey(library, "what is attention?", _vector(1, 1, 0))) is None
+    assert cache.get(AnswerKey("other papers", "explain gnns", _vector(1, 0.1, 0))) is None
+
+def test_eviction_and_expiry(monkeypatch):
+    import answer_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(max_size=2, ttl_seconds=60, similarity=None)
+    for question in ("a", "b", "c"):
+        cache.put(AnswerKey("library", question, None), {'answer': question})
+    assert cache.evictions == 1
+    assert cache.get(AnswerKey("library", "a", None)) is None
+    assert cache.get(AnswerKey("library", "c", None)) == {'answer': "c"}
+
+    now[0] += 61
+    assert cache.get(AnswerKey("library", "c", None)) is None
+    assert cache.get_stats()['size'] == 1
+
+def test_disabled_cache_stores_nothing():
+    cache = AnswerCache(max_size=0, ttl_seconds=60, similarity=0.9)
+    key = AnswerKey("library", "a", None)
+    cache.put(key, {'answer': "a"})
+    assert cache.get(key) is None
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from batcher import Batcher, BatcherStopped
+from executors import ExecutorBusy, ExecutorTimeout
+
+class Doubler(Batcher):
+    name = "test"
+
+    def __init__(self, *args, delay: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.seen = []
+
+    async def _process(self, items):
+        self.seen.append(list(items))
+        await asyncio.sleep(self.delay)
+        if "fail" in items:
+            raise ValueError("bad item")
+        return [item * 2 for item in items]
+
+def test_concurrent_requests_share_a_batch():
+    async def main():
+        batcher = Doubler(max_batch_size=8, window_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert results == [0, 2, 4, 6, 8]
+    assert batcher.seen == [[0, 1, 2, 3, 4]]
+    assert batcher.get_stats()['avg_batch_size'] == 5
+
+def test_batches_are_capped_at_max_batch_size():
+    async def main():
+        batcher = Doubler(max_batch_size=2, window_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.stop()
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert results == [0, 2, 4, 6, 8]
+    assert [len(batch) for batch in batcher.seen] == [2, 2, 1]
+
+def test_errors_reach_every_request_in_the_batch():
+    async def main():
+        batcher = Doubler(max_batch_size=4, window_ms=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit("fail"), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
+
+def test_an_exception_in_an_items_place_fails_only_that_request():
+    class PerItem(Batcher):
+        async def _process(self, items):
+            return [ValueError(item) if item == "bad" else item * 2 for item in items]
+
+    async def main():
+        batcher = PerItem(max_batch_size=4, window_ms=10)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit("bad"), batcher.submit(3),
+                                       return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(main())
+    assert results[0] == 2 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+
+def test_full_queue_is_rejected_with_429():
+    async def main():
+        batcher = Doubler(max_batch_size=1, window_ms=0, max_queue=1, delay=0.05)
+        first = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.01)  # the first request is now being processed
+        second = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorBusy) as busy:
+            await batcher.submit(3)
+        results = await asyncio.gather(first, second)
+        await batcher.stop()
+        return batcher, busy.value, results
+
+    batcher, busy, results = asyncio.run(main())
+    assert busy.status_code == 429
+    assert results == [2, 4] and batcher.rejected == 1
+
+def test_slow_batches_time_out_with_504():
+    async def main():
+        batcher = Doubler(max_batch_size=4, window_ms=0, timeout=0.02, delay=0.2)
+        with pytest.raises(ExecutorTimeout) as timeout:
+            await batcher.submit(1)
+        await batcher.stop()
+        return batcher, timeout.value
+
+    batcher, timeout = asyncio.run(main())
+    assert timeout.status_code == 504 and batcher.timed_out == 1
+
+def test_stop_answers_running_and_queued_requests_with_503():
+    async def main():
+        batcher = Doubler(max_batch_size=1, window_ms=0, delay=10)
+        requests = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, BatcherStopped) and result.status_code == 503 for result in results)
@@ -0,0 +1,96 @@
+"""
+End-to-end test of NDJSON bulk ingestion against a real uvicorn server
+
+The body is sent chunked, so it arrives as many ASGI http.request
+messages, which is what TestClient doesn't reproduce.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+RECORDS = 3000
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def server(tmp_path):
+    """The service on a free port, with all of its data under tmp_path"""
+    port = _free_port()
+    data = tmp_path / "data"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(SERVICE_DIR),
+        "WAL_FSYNC": "false",
+        "WARM_UP": "false",
+        "CHECKPOINT_DIR": str(data / "vectors" / "checkpoints"),
+        "WAL_PATH": str(data / "vectors" / "wal.log"),
+        "WRITER_LOCK_PATH": str(data / "vectors" / "writer.lock"),
+        "METADATA_DB_PATH": str(data / "embeddings" / "metadata.db"),
+        "FAISS_INDEX_PATH": str(data / "vectors" / "faiss_index.bin"),
+        "EMBEDDING_METADATA_PATH": str(data / "embeddings" / "metadata.json"),
+        "EMBEDDING_CACHE_DIR": str(data / "embeddings" / "cache"),
+    }
+    (data / "vectors").mkdir(parents=True)
+    (data / "embeddings").mkdir(parents=True)
+    log = open(tmp_path / "server.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+        cwd=tmp_path, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 300
+        while True:
+            try:
+                response = httpx.get(f"{url}/ready")
+                if response.status_code == 200:
+                    break
+                if "failed" in response.json()["components"].values():
+                    # e.g. the embedding model can't be downloaded here
+                    pytest.skip(f"Service component failed to load: {response.json()['components']}")
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None or time.time() > deadline:
+                pytest.fail(f"Service didn't become ready:\n{(tmp_path / 'server.log').read_text()[-3000:]}")
+            time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+
+def _body():
+    # One line per chunk, so the upload spans thousands of request messages
+    for i in range(RECORDS):
+        yield (json.dumps({"paperId": f"paper-{i}", "text": f"Paper {i} on graph neural networks"}) + "\n").encode()
+
+def test_stream_ingests_every_record(server):
+    with httpx.Client(timeout=300) as client:
+        response = client.post(f"{server}/embeddings/stream", params={"job": "e2e"}, content=_body())
+        assert response.status_code == 200
+        updates = [json.loads(line) for line in response.text.splitlines()]
+
+        final = updates[-1]
+        assert "error" not in final
+        assert final["done"] is True
+        assert final["added"] == RECORDS
+        assert final["committed"] == RECORDS
+        assert client.get(f"{server}/stats").json()["vector_db"]["total_papers"] == RECORDS
+
+        # Posting the same stream again resumes after the last committed line
+        response = client.post(f"{server}/embeddings/stream", params={"job": "e2e"}, content=_body())
+        final = [json.loads(line) for line in response.text.splitlines()][-1]
+        assert final["added"] == 0
+        assert final["skipped"] == RECORDS
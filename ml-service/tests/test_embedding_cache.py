@@ -0,0 +1,57 @@
+import numpy as np
+
+from conftest import DIMENSION, random_vectors
+from embedding_cache import EmbeddingCache
+
+def _cache(path, slots: int = 100, dtype: str = "float32", model: str = "model") -> EmbeddingCache:
+    slot_size = 16 + DIMENSION * np.dtype(dtype).itemsize
+    return EmbeddingCache(path, model, DIMENSION, max_bytes=slots * slot_size, dtype=dtype)
+
+def test_round_trip_and_misses(tmp_path):
+    cache = _cache(tmp_path)
+    vectors = random_vectors(3)
+    cache.put_many(["a", "b", "c"], vectors)
+    found_vectors, found = cache.get_many(["b", "x", "a"])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(found_vectors[[0, 2]], vectors[[1, 0]])
+    assert not found_vectors[1].any()
+    assert cache.get_stats()['entries'] == 3
+
+def test_persists_across_instances(tmp_path):
+    vectors = random_vectors(2)
+    _cache(tmp_path).put_many(["a", "b"], vectors)
+    found_vectors, found = _cache(tmp_path).get_many(["a", "b"])
+    assert found.all()
+    np.testing.assert_array_equal(found_vectors, vectors)
+
+def test_models_do_not_share_entries(tmp_path):
+    _cache(tmp_path).put_many(["a"], random_vectors(1))
+    _, found = _cache(tmp_path, model="other/model").get_many(["a"])
+    assert not found.any()
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    import embedding_cache
+
+    # Last use is recorded in milliseconds, so step the clock between calls
+    clock = iter(range(10**9, 10**12, 10**9))
+    monkeypatch.setattr(embedding_cache.time, "time_ns", lambda: next(clock))
+    cache = _cache(tmp_path, slots=3)
+    assert cache.capacity == 3
+    cache.put_many(["a", "b", "c"], random_vectors(3))
+    cache.get_many(["a"])
+    cache.put_many(["d"], random_vectors(1, seed=1))
+    _, found = cache.get_many(["a", "b", "c", "d"])
+    assert found.tolist() == [True, False, True, True]
+
+def test_float16_storage(tmp_path):
+    cache = _cache(tmp_path, dtype="float16")
+    vectors = random_vectors(2)
+    cache.put_many(["a", "b"], vectors)
+    found_vectors, found = cache.get_many(["a", "b"])
+    assert found.all() and found_vectors.dtype == np.float32
+    np.testing.assert_allclose(found_vectors, vectors, atol=1e-3)
+
+def test_layout_change_clears_the_cache(tmp_path):
+    _cache(tmp_path).put_many(["a"], random_vectors(1))
+    _, found = _cache(tmp_path, dtype="float16").get_many(["a"])
+    assert not found.any()
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+from executors import BoundedExecutor, ExecutorBusy, ExecutorTimeout
+
+def test_runs_blocking_calls_in_the_pool():
+    executor = BoundedExecutor("test", workers=2, max_queue=2, timeout=5)
+    try:
+        assert asyncio.run(executor.run(pow, 2, 10)) == 1024
+        assert executor.get_stats()['completed'] == 1
+    finally:
+        executor.shutdown()
+
+def test_calls_beyond_workers_and_queue_get_429():
+    executor = BoundedExecutor("test", workers=1, max_queue=1, timeout=5)
+    release = threading.Event()
+
+    async def main():
+        admitted = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutorBusy) as busy:
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*admitted)
+        return busy.value
+
+    try:
+        busy = asyncio.run(main())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert busy.status_code == 429 and busy.headers == {"Retry-After": "1"}
+    assert executor.get_stats()['rejected'] == 1 and executor.get_stats()['in_flight'] == 0
+
+def test_slow_calls_get_504_and_keep_their_slot_until_done():
+    executor = BoundedExecutor("test", workers=1, max_queue=0, timeout=0.02)
+    release = threading.Event()
+
+    async def main():
+        with pytest.raises(ExecutorTimeout) as timeout:
+            await executor.run(release.wait)
+        # The timed-out call is still running, so the pool is full
+        with pytest.raises(ExecutorBusy):
+            await executor.run(pow, 2, 2)
+        release.set()
+        await asyncio.sleep(0.05)
+        return timeout.value, await executor.run(pow, 2, 2)
+
+    try:
+        timeout, result = asyncio.run(main())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert timeout.status_code == 504 and result == 4
+    assert executor.get_stats()['timed_out'] == 1
+
+def test_per_call_timeout_overrides_the_default():
+    executor = BoundedExecutor("test", workers=1, max_queue=0, timeout=0.01)
+    try:
+        assert asyncio.run(executor.run(lambda: threading.Event().wait(0.05) or "done", timeout=None)) == "done"
+    finally:
+        executor.shutdown()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from filter_index import FilterIndex
+
+PAPERS = [
+    {'categories': ["cs.LG"], 'authors': ["Ada Lovelace"], 'publishedDate': "2019-05-01"},
+    {'categories': ["cs.CL", "cs.LG"], 'authors': ["Alan Turing"], 'publishedDate': "2021-01-15T00:00:00Z"},
+    {'categories': ["q-bio"], 'authors': ["Ada Lovelace", "Alan Turing"]},
+    {'categories': ["CS.CL "], 'authors': [], 'publishedDate': "not a date"},
+]
+
+def _index() -> FilterIndex:
+    index = FilterIndex()
+    for label, paper in enumerate(PAPERS):
+        index.add(label, paper)
+    return index
+
+def _matches(index: FilterIndex, filters, live=None) -> list:
+    live = np.ones(len(PAPERS), dtype=bool) if live is None else live
+    return np.flatnonzero(index.match(live, filters)).tolist()
+
+def test_values_match_any_listed_case_insensitively():
+    index = _index()
+    assert _matches(index, {'categories': ["cs.cl"]}) == [1, 3]
+    assert _matches(index, {'categories': ["cs.CL", "q-bio"]}) == [1, 2, 3]
+    assert _matches(index, {'authors': ["ada lovelace"]}) == [0, 2]
+
+def test_fields_combine_with_and():
+    assert _matches(_index(), {'categories': ["cs.LG"], 'authors': ["Alan Turing"]}) == [1]
+
+def test_date_range_is_inclusive_and_skips_undated_papers():
+    index = _index()
+    assert _matches(index, {'publishedFrom': "2019-05-01"}) == [0, 1]
+    assert _matches(index, {'publishedTo': "2020-12-31"}) == [0]
+    assert _matches(index, {'publishedFrom': "2020-01-01", 'publishedTo': "2021-01-15"}) == [1]
+
+def test_removed_labels_are_masked_by_liveness():
+    live = np.array([True, False, True, True])
+    assert _matches(_index(), {'categories': ["cs.LG"]}, live) == [0]
+
+def test_labels_beyond_the_mask_are_ignored():
+    index = _index()
+    index.add(10, {'categories': ["cs.LG"], 'publishedDate': "2022-01-01"})
+    assert _matches(index, {'categories': ["cs.LG"]}) == [0, 1]
+    assert _matches(index, {'publishedFrom': "2022-01-01"}) == []
+
+def test_is_empty():
+    assert FilterIndex.is_empty(None)
+    assert FilterIndex.is_empty({'categories': [], 'publishedFrom': None})
+    assert not FilterIndex.is_empty({'authors': ["Ada Lovelace"]})
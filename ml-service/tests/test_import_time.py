@@ -0,0 +1,77 @@
+"""
+Import-time budget for the service
+
+Imports the app in a fresh interpreter with `python -X importtime`, takes
+the fastest of a few runs, and fails if the import takes longer than the
+budget or pulls in a heavy library that should only load on the code path
+that uses it (torch and transformers with the simple LLM provider, PyPDF2
+outside PDF parsing, ...). IMPORT_TIME_BUDGET_MS raises the budget on slow
+machines.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000))
+RUNS = 3
+
+# Top-level packages that must not load at import time
+FORBIDDEN = ("torch", "transformers", "sentence_transformers", "onnxruntime", "sklearn", "PyPDF2")
+
+def _measure(module: str, env: Dict[str, str]) -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    Import a module in a fresh interpreter
+
+    Returns:
+        (total milliseconds, cumulative ms of each module it imports directly, every module imported)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, f"import {module} failed:\n{result.stderr[-2000:]}"
+
+    # Lines look like "import time:  self [us] | cumulative | <indent>name", children before parents
+    total, children, imported = 0.0, {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        imported.append(name)
+        if depth == 0 and name == module:
+            total = int(cumulative) / 1000
+        elif depth == 1:
+            children[name] = int(cumulative) / 1000
+    return total, children, imported
+
+def test_app_import_time(tmp_path):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("faiss")
+    data = tmp_path / "data"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(SERVICE_DIR),
+        "LLM_PROVIDER": "simple",
+        "CHECKPOINT_DIR": str(data / "vectors" / "checkpoints"),
+        "WAL_PATH": str(data / "vectors" / "wal.log"),
+        "WRITER_LOCK_PATH": str(data / "vectors" / "writer.lock"),
+        "METADATA_DB_PATH": str(data / "embeddings" / "metadata.db"),
+        "FAISS_INDEX_PATH": str(data / "vectors" / "faiss_index.bin"),
+        "EMBEDDING_METADATA_PATH": str(data / "embeddings" / "metadata.json"),
+        "EMBEDDING_CACHE_DIR": str(data / "embeddings" / "cache"),
+    }
+
+    total, children, imported = min((_measure("app", env) for _ in range(RUNS)), key=lambda run: run[0])
+
+    loaded = sorted({name.split(".")[0] for name in imported} & set(FORBIDDEN))
+    assert not loaded, f"import app loads {', '.join(loaded)} at module level"
+    slowest = ", ".join(f"{name} {ms:.0f} ms" for name, ms in sorted(children.items(), key=lambda item: -item[1])[:8])
+    assert total <= BUDGET_MS, f"import app took {total:.0f} ms (budget {BUDGET_MS:.0f} ms): {slowest}"
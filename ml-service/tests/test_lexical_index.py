@@ -0,0 +1,72 @@
+import numpy as np
+
+from lexical_index import LexicalIndex, tokenize
+
+PAPERS = {
+    0: {'title': "Graph neural networks", 'abstract': "Message passing on graphs with neural networks."},
+    1: {'title': "Attention is all you need", 'abstract': "The transformer relies on attention alone."},
+    2: {'title': "Protein structure prediction", 'text': "Deep learning predicts protein structure."},
+    3: {'title': "Scaling GPT-4", 'abstract': "Evaluating gpt-4 on cs.CL benchmarks."},
+}
+
+def _index() -> LexicalIndex:
+    index = LexicalIndex()
+    for label, paper in PAPERS.items():
+        index.add(label, paper)
+    return index
+
+def _search(index: LexicalIndex, text: str, k: int = 10, mask=None) -> list:
+    mask = np.ones(len(PAPERS), dtype=bool) if mask is None else mask
+    return index.search(text, k, mask)[1].tolist()
+
+def test_tokenize_keeps_identifiers_and_drops_stopwords():
+    assert tokenize("The GPT-4 model on cs.CL") == ["gpt-4", "gpt", "4", "model", "cs.cl", "cs", "cl"]
+
+def test_search_ranks_by_bm25():
+    index = _index()
+    assert _search(index, "neural networks") == [0]
+    assert _search(index, "attention transformer")[0] == 1
+    # "protein" and "structure" twice in paper 2 beat a single "structure" elsewhere
+    assert _search(index, "protein structure") == [2]
+
+def test_compound_identifiers_match_their_parts():
+    assert _search(_index(), "gpt") == [3]
+    assert _search(_index(), "GPT-4") == [3]
+
+def test_search_respects_mask_and_k():
+    index = _index()
+    mask = np.array([False, True, True, True])
+    assert sorted(_search(index, "neural attention protein", mask=mask)) == [1, 2]
+    assert len(_search(index, "neural attention protein", k=2)) == 2
+
+def test_remove_updates_statistics_and_readd_is_ignored():
+    index = _index()
+    count, total = index.doc_count, index.total_length
+    index.remove(1)
+    assert index.doc_count == count - 1 and index.total_length < total
+    index.remove(1)
+    assert index.doc_count == count - 1
+
+    # Replaying an add for a label already indexed must not count it twice
+    index.add(0, PAPERS[0])
+    assert index.doc_count == count - 1
+    scores, labels = index.search("graph", 10, np.ones(len(PAPERS), dtype=bool))
+    assert labels.tolist() == [0] and len(scores) == 1
+
+def test_replaced_papers_leave_document_frequencies():
+    index = LexicalIndex()
+    index.add(0, {'title': "Message passing"})
+    # The same paper upserted 20 times: each version replaces the previous label
+    for label in range(1, 21):
+        index.add(label, {'title': "Graph neural networks"})
+        if label > 1:
+            index.remove(label - 1)
+    assert index.doc_count == 2 and index.removed == 19
+
+    mask = np.ones(21, dtype=bool)
+    scores, labels = index.search("neural", 10, mask)
+    assert labels.tolist() == [20] and scores[0] > 0
+
+def test_empty_query_and_index():
+    assert _search(_index(), "the of and") == []
+    assert _search(LexicalIndex(), "graph") == []
@@ -0,0 +1,82 @@
+"""
+ONNX Runtime encoder parity with sentence-transformers
+
+Exports a small randomly initialised BERT sentence-transformers model
+(built here, so nothing is downloaded) and checks that OnnxEncoder
+reproduces SentenceTransformer.encode: closely for the fp32 model, and
+within quantisation error for the int8 one.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+torch = pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+from onnx_encoder import OnnxEncoder, export_onnx_model  # noqa: E402
+
+WORDS = (
+    "the a of on in for with graph neural network networks paper papers deep learning model models "
+    "attention transformer language search vector retrieval embedding protein structure quantum"
+).split()
+
+TEXTS = [
+    "graph neural networks",
+    "a paper on deep learning models for protein structure",
+    "attention",
+    " ".join(WORDS * 3),
+]
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """A tiny mean-pooled, normalised sentence-transformers model saved to disk"""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp("tiny")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS + list("abcdefghijklmnopqrstuvwxyz")
+    (directory / "vocab.txt").write_text("\n".join(vocab))
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=128)
+    BertModel(config).save_pretrained(str(directory / "bert"))
+    BertTokenizerFast(str(directory / "vocab.txt")).save_pretrained(str(directory / "bert"))
+
+    transformer = models.Transformer(str(directory / "bert"), max_seq_length=64)
+    model = SentenceTransformer(modules=[transformer, models.Pooling(32, "mean"), models.Normalize()])
+    model.save(str(directory / "model"))
+    return directory / "model"
+
+@pytest.fixture(scope="module")
+def exported(model_dir, tmp_path_factory):
+    return export_onnx_model(str(model_dir), tmp_path_factory.mktemp("onnx"), quantize=True)
+
+@pytest.fixture(scope="module")
+def reference(model_dir):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(str(model_dir), device="cpu").encode(TEXTS, convert_to_numpy=True)
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def test_fp32_matches_torch(exported, reference):
+    encoder = OnnxEncoder(exported, quantized=False)
+    embeddings = encoder.encode(TEXTS)
+    assert embeddings.shape == reference.shape
+    np.testing.assert_allclose(embeddings, reference, atol=1e-4)
+
+def test_int8_close_to_torch(exported, reference):
+    encoder = OnnxEncoder(exported, quantized=True)
+    assert encoder.quantized
+    assert _cosines(encoder.encode(TEXTS), reference).min() >= 0.98
+
+def test_encode_ids_matches_encode(exported):
+    encoder = OnnxEncoder(exported, quantized=False)
+    features = encoder.tokenizer(
+        TEXTS, padding=True, truncation=True, max_length=encoder.max_seq_length, return_tensors="np"
+    )
+    np.testing.assert_allclose(
+        encoder.encode_ids(features["input_ids"], features["attention_mask"]), encoder.encode(TEXTS), atol=1e-5
+    )
@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+
+from query_cache import QueryCache, normalize_query
+
+def test_normalize_query():
+    assert normalize_query("  Graph   Neural\tNetworks ") == "graph neural networks"
+
+def test_hits_ignore_case_and_spacing(stub_encoder):
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    first = asyncio.run(cache.get_embedding("Graph neural networks"))
+    second = asyncio.run(cache.get_embedding("graph  neural networks "))
+    assert second is first
+    assert stub_encoder.calls == 1
+    assert not first.flags.writeable
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 1
+
+def test_batch_encodes_each_distinct_miss_once(stub_encoder):
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    asyncio.run(cache.get_embedding("attention"))
+    vectors = cache.get_embeddings(["attention", "protein", "Protein", "quantum"])
+    assert stub_encoder.calls == 2 and stub_encoder.texts == 3
+    np.testing.assert_array_equal(vectors[1], vectors[2])
+    assert vectors.shape == (4, 16)
+
+def test_least_recently_used_entry_is_evicted(stub_encoder):
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    cache.get_embeddings(["a", "b"])
+    cache.get_embeddings(["a"])
+    cache.get_embeddings(["c"])
+    calls = stub_encoder.calls
+    cache.get_embeddings(["a", "c"])
+    assert stub_encoder.calls == calls
+    cache.get_embeddings(["b"])
+    assert stub_encoder.calls == calls + 1
+
+def test_entries_expire(stub_encoder, monkeypatch):
+    import query_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    cache.get_embeddings(["graph"])
+    now[0] += 59
+    cache.get_embeddings(["graph"])
+    assert stub_encoder.calls == 1
+    now[0] += 2
+    cache.get_embeddings(["graph"])
+    assert stub_encoder.calls == 2
+
+def test_entries_are_keyed_on_the_model(stub_encoder, monkeypatch):
+    from embeddings import embedding_generator
+
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    cache.get_embeddings(["graph"])
+    monkeypatch.setattr(embedding_generator, "fingerprint", "another model")
+    cache.get_embeddings(["graph"])
+    assert stub_encoder.calls == 2
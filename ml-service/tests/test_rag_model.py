@@ -0,0 +1,34 @@
+import pytest
+
+from rag_model import RAGModel
+
+PAPERS = [{'id': "p1", 'title': "Graph neural networks", 'abstract': "Message passing on graphs."}]
+
+@pytest.fixture
+def model(monkeypatch):
+    """The simple provider, with contexts built without loading a tokenizer"""
+    model = RAGModel()
+    model.provider = "simple"
+
+    def build_context(question, papers):
+        if not all(isinstance(paper, dict) for paper in papers):
+            raise ValueError("malformed paper")
+        return "context", [{'paper': paper, 'passages': [paper['abstract']], 'relevance': 0.5} for paper in papers]
+
+    monkeypatch.setattr(model, "_build_context", build_context)
+    return model
+
+def test_a_failing_request_does_not_fail_its_batch(model):
+    results = model.generate_answers([
+        ("What is a GNN?", PAPERS),
+        ("Broken", ["not a paper"]),
+        ("How do graphs pass messages?", PAPERS),
+    ])
+    assert isinstance(results[1], ValueError)
+    for result in (results[0], results[2]):
+        assert result['answer'] and result['citations']
+
+def test_generate_answer_raises_its_own_error(model):
+    with pytest.raises(ValueError):
+        model.generate_answer("Broken", ["not a paper"])
+    assert model.generate_answer("What is a GNN?", PAPERS)['answer']
@@ -0,0 +1,50 @@
+import faiss
+import numpy as np
+
+from conftest import DIMENSION, random_vectors
+from sharded_index import ShardedIndex
+
+def _flat() -> faiss.Index:
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(DIMENSION))
+
+def _pair(count: int, shards: int = 4):
+    """A sharded index and a single index holding the same vectors"""
+    vectors = random_vectors(count)
+    labels = np.arange(count)
+    sharded = ShardedIndex([_flat() for _ in range(shards)])
+    single = _flat()
+    sharded.add_with_ids(vectors, labels)
+    single.add_with_ids(vectors, labels)
+    return sharded, single, vectors
+
+def test_labels_are_routed_by_modulo():
+    sharded, _, _ = _pair(10)
+    assert [shard.ntotal for shard in sharded.shards] == [3, 3, 2, 2]
+    assert sharded.ntotal == 10
+
+def test_search_merges_shards_like_a_single_index():
+    sharded, single, _ = _pair(200)
+    queries = random_vectors(5, seed=1)
+    distances, labels = sharded.search(queries, 10)
+    expected_distances, expected_labels = single.search(queries, 10)
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-6)
+
+def test_search_pads_missing_results():
+    sharded, _, _ = _pair(3)
+    distances, labels = sharded.search(random_vectors(1, seed=1), 5)
+    assert sorted(labels[0, :3].tolist()) == [0, 1, 2]
+    assert labels[0, 3:].tolist() == [-1, -1]
+
+def test_remove_and_reconstruct():
+    sharded, _, vectors = _pair(20)
+    sharded.dirty.clear()
+    assert sharded.remove_ids(np.array([1, 5, 6])) == 3
+    assert sharded.dirty == {1, 2}
+    assert sharded.ntotal == 17
+
+    labels = np.array([7, 0, 19, 2])
+    np.testing.assert_array_equal(sharded.reconstruct_batch(labels), vectors[labels])
+    assert sharded.dirty == {1, 2}
+    _, found = sharded.search(vectors[5:6], 20)
+    assert 5 not in found[0].tolist()
@@ -0,0 +1,264 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import random_vectors
+
+pytest.importorskip("faiss")
+
+from vector_db import VectorDatabase  # noqa: E402
+
+PAPERS = [
+    {'title': "Graph neural networks", 'abstract': "Message passing on graphs.",
+     'categories': ["cs.LG"], 'authors': ["Ada Lovelace"], 'publishedDate': "2019-05-01"},
+    {'title': "Attention is all you need", 'abstract': "Transformers rely on attention.",
+     'categories': ["cs.CL"], 'authors': ["Alan Turing"], 'publishedDate': "2021-01-15"},
+    {'title': "Protein structure prediction", 'abstract': "Deep learning for proteins.",
+     'categories': ["q-bio"], 'authors': ["Ada Lovelace"], 'publishedDate': "2022-03-01"},
+]
+
+@pytest.fixture
+def open_db(db_settings):
+    """Open vector databases on the test settings; their writer locks are released afterwards"""
+    opened = []
+
+    def open_db() -> VectorDatabase:
+        db = VectorDatabase()
+        db.load()
+        opened.append(db)
+        return db
+
+    yield open_db
+    for db in opened:
+        if db._task_thread is not None:
+            db._task_thread.join()
+        db.stop_compaction()
+        db.stop_sync()
+        if db._writer_lock_file is not None:
+            db._writer_lock_file.close()
+
+def crash(db: VectorDatabase):
+    """Drop a database without checkpointing, as a killed process would"""
+    db._writer_lock_file.close()
+    db._writer_lock_file = None
+
+def _add(db: VectorDatabase, count: int, start: int = 0) -> np.ndarray:
+    vectors = random_vectors(count, seed=start)
+    ids = [f"paper-{i}" for i in range(start, start + count)]
+    metadatas = [{**PAPERS[i % len(PAPERS)], 'id': paper_id} for i, paper_id in zip(range(start, start + count), ids)]
+    db.add_embeddings_batch(ids, vectors, metadatas)
+    return vectors
+
+def _top(db: VectorDatabase, vector: np.ndarray, k: int = 1, **kwargs) -> list:
+    return [result['paperId'] for result in db.search(vector, k, **kwargs)]
+
+def test_add_search_and_remove(open_db):
+    db = open_db()
+    vectors = _add(db, 50)
+    assert db.live_count == 50 and db.is_writer
+    assert _top(db, vectors[7]) == ["paper-7"]
+    assert db.get_paper("paper-7")['title'] == PAPERS[7 % 3]['title']
+
+    assert db.remove_paper("paper-7")
+    assert not db.remove_paper("paper-7")
+    assert db.live_count == 49 and not db.tombstones
+    assert "paper-7" not in _top(db, vectors[7], k=49)
+
+def test_readding_a_paper_replaces_its_vector(open_db):
+    db = open_db()
+    vectors = _add(db, 10)
+    replacement = random_vectors(1, seed=99)[0]
+    db.add_embedding("paper-3", replacement, {'title': "Replaced"})
+    assert db.live_count == 10
+    assert _top(db, replacement) == ["paper-3"]
+    assert "paper-3" not in _top(db, vectors[3], k=2)
+    assert db.get_paper("paper-3")['title'] == "Replaced"
+
+def test_metadata_update_keeps_the_vector(open_db):
+    db = open_db()
+    vectors = _add(db, 10)
+    db.build_search_indexes()
+    assert db.update_metadata("paper-0", {'title': "Quantum annealing", 'categories': ["quant-ph"]})
+    assert not db.update_metadata("missing", {'title': "Nothing"})
+
+    paper = db.get_paper("paper-0")
+    assert paper['title'] == "Quantum annealing" and paper['authors'] == PAPERS[0]['authors']
+    assert db.live_count == 10
+    assert _top(db, vectors[0]) == ["paper-0"]
+    assert [r['paperId'] for r in db.search(vectors[0], 10, filters={'categories': ["quant-ph"]})] == ["paper-0"]
+    assert "paper-0" not in [r['paperId'] for r in db.search(vectors[0], 10, filters={'categories': ["cs.LG"]})]
+    assert set(_top(db, vectors[5], k=2, query_text="quantum annealing")) == {"paper-5", "paper-0"}
+
+def test_unsaved_writes_are_replayed_from_the_log(open_db):
+    db = open_db()
+    vectors = _add(db, 20)
+    db._save_index()
+    _add(db, 5, start=20)
+    db.remove_paper("paper-2")
+    crash(db)
+
+    recovered = open_db()
+    assert recovered.is_writer
+    assert recovered.live_count == 24
+    assert _top(recovered, vectors[5]) == ["paper-5"]
+    assert _top(recovered, random_vectors(5, seed=20)[4]) == ["paper-24"]
+    assert recovered.get_paper("paper-2") is None
+
+def test_checkpoint_trims_the_log(open_db):
+    db = open_db()
+    _add(db, 20)
+    before = db.wal.size
+    db._save_index()
+    assert db.checkpoint_number >= 1 and db.wal.size < before
+    assert not db.save_if_changed()
+
+    _add(db, 1, start=20)
+    assert db.save_if_changed()
+    crash(db)
+    assert open_db().live_count == 21
+
+def test_writes_leave_checkpoints_to_the_sync_thread(open_db, db_settings, monkeypatch):
+    db_settings.WAL_CHECKPOINT_MIN_BYTES = 1
+    db = open_db()
+    saved = []
+    save = db._save_index
+    monkeypatch.setattr(db, "_save_index", lambda *args, **kwargs: (saved.append(threading.current_thread().name),
+                                                                   save(*args, **kwargs)))
+    db.start_sync()
+    _add(db, 5)
+    deadline = time.monotonic() + 5
+    while not saved and time.monotonic() < deadline:
+        time.sleep(0.01)
+    db.stop_sync()
+    assert saved and set(saved) == {"vector-db-sync"}
+
+def test_reader_follows_the_writer(open_db):
+    writer = open_db()
+    vectors = _add(writer, 10)
+    writer._save_index()
+    reader = open_db()
+    assert not reader.is_writer and reader.live_count == 10
+
+    _add(writer, 3, start=10)
+    writer.remove_paper("paper-0")
+    reader.refresh()
+    assert reader.live_count == 12
+    assert _top(reader, random_vectors(3, seed=10)[2]) == ["paper-12"]
+    assert "paper-0" not in _top(reader, vectors[0], k=12)
+
+def test_hnsw_removals_are_tombstoned_until_compaction(open_db, db_settings):
+    db_settings.FAISS_INDEX_TYPE = "hnsw"
+    db = open_db()
+    vectors = _add(db, 30)
+    for i in (1, 2, 3):
+        db.remove_paper(f"paper-{i}")
+    assert db.tombstones and db.index.ntotal == 30
+    assert not {"paper-1", "paper-2", "paper-3"} & set(_top(db, vectors[2], k=27))
+
+    db.build_search_indexes()
+    db.compact()
+    assert not db.tombstones and db.index.ntotal == 27 and db.live_count == 27
+    assert db.lexical.removed == 0 and db.lexical.doc_count == 27
+    assert _top(db, vectors[10]) == ["paper-10"]
+
+def test_training_runs_in_the_background(open_db, db_settings):
+    db_settings.FAISS_INDEX_TYPE = "ivf_flat"
+    db_settings.FAISS_IVF_NLIST = 4
+    db = open_db()
+    vectors = _add(db, 100)
+    assert db._task_thread is None
+
+    # Crossing the training threshold queues a build; the write itself doesn't train
+    _add(db, 100, start=100)
+    assert db._task_thread is not None
+    db._task_thread.join()
+    assert db.get_snapshots()['task']['state'] == "done"
+    assert db.get_stats()['index_type'] == "ivf_flat" and db.live_count == 200
+    assert db.last_recall is not None
+    assert _top(db, vectors[42], nprobe=4) == ["paper-42"]
+
+def test_build_and_roll_back_a_snapshot(open_db, db_settings):
+    db_settings.FAISS_IVF_NLIST = 4
+    db = open_db()
+    vectors = _add(db, 200)
+    db._save_index()
+    flat = db.checkpoint_number
+
+    db.build_snapshot("ivf_flat")
+    assert db.index_type == "ivf_flat" and db.get_stats()['index_type'] == "ivf_flat"
+    assert db.checkpoint_number > flat
+    assert _top(db, vectors[42], nprobe=4) == ["paper-42"]
+
+    # Writes after the build survive the rollback
+    _add(db, 1, start=200)
+    db.rollback_snapshot()
+    assert db.index_type == "flat" and db.get_stats()['index_type'] == "flat"
+    assert db.live_count == 201
+    assert _top(db, random_vectors(1, seed=200)[0]) == ["paper-200"]
+
+    with pytest.raises(ValueError):
+        db.build_snapshot("annoy")
+
+def test_filtered_search(open_db):
+    db = open_db()
+    vectors = _add(db, 30)
+    results = db.search(vectors[0], 30, filters={'categories': ["cs.CL"]})
+    assert len(results) == 10 and all(result['categories'] == ["cs.CL"] for result in results)
+
+    results = db.search(vectors[0], 5, filters={'authors': ["ada lovelace"], 'publishedFrom': "2020-01-01"})
+    assert len(results) == 5 and all(result['title'] == PAPERS[2]['title'] for result in results)
+
+    db.remove_paper("paper-1")
+    assert "paper-1" not in [r['paperId'] for r in db.search(vectors[1], 30, filters={'categories': ["cs.CL"]})]
+
+def test_hybrid_search_fuses_keyword_hits(open_db):
+    db = open_db()
+    vectors = _add(db, 30)
+    db.add_embedding("quantum", random_vectors(1, seed=99)[0], {'title': "Quantum annealing"})
+    # The query vector points at one paper, the text at another
+    results = db.search(vectors[0], 5, query_text="quantum annealing")
+    ids = [result['paperId'] for result in results]
+    assert set(ids[:2]) == {"paper-0", "quantum"}
+    assert all('score' in result for result in results)
+    assert [result['score'] for result in results] == sorted((result['score'] for result in results), reverse=True)
+
+def test_search_indexes_follow_writes(open_db):
+    db = open_db()
+    _add(db, 9)
+    db.build_search_indexes()
+    _add(db, 3, start=9)
+    db.remove_paper("paper-2")
+    assert db.lexical.doc_count == 11
+    results = db.search(random_vectors(1, seed=9)[0], 20, filters={'categories': ["q-bio"]})
+    assert sorted(result['paperId'] for result in results) == ["paper-11", "paper-5", "paper-8"]
+
+def test_search_indexes_are_rebuilt_once_removals_pile_up(open_db):
+    db = open_db()
+    _add(db, 10)
+    db.build_search_indexes()
+    for i in range(3):
+        _add(db, 1, start=i)  # an edited paper is upserted under a new label
+    assert db.lexical.removed == 3 and db._search_indexes_stale()
+
+    db.build_search_indexes(rebuild=True)
+    assert db.lexical.removed == 0 and db.lexical.doc_count == 10
+    assert not db._search_indexes_stale()
+
+def test_sharded_index_matches_a_single_index(open_db, db_settings, tmp_path, monkeypatch):
+    single = open_db()
+    vectors = _add(single, 100)
+    queries = random_vectors(5, seed=1)
+    expected = single.search_batch(queries, 10)
+    crash(single)
+
+    db_settings.FAISS_SHARDS = 4
+    for name in ("CHECKPOINT_DIR", "WAL_PATH", "WRITER_LOCK_PATH", "METADATA_DB_PATH"):
+        monkeypatch.setattr(db_settings, name, str(tmp_path / "sharded" / name.lower()))
+    sharded = open_db()
+    _add(sharded, 100)
+    assert sharded.get_stats()['shards'] == 4
+    results = sharded.search_batch(queries, 10)
+    assert [[r['paperId'] for r in row] for row in results] == [[r['paperId'] for r in row] for row in expected]
+    assert _top(sharded, vectors[99]) == ["paper-99"]
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import random_vectors
+from wal import LogReset, WriteAheadLog
+
+def _append(log: WriteAheadLog, count: int, start: int = 0):
+    vectors = random_vectors(count, seed=start)
+    with log.exclusive():
+        for i in range(count):
+            log.append('add', f"paper-{start + i}", start + i, vectors[i], {'title': f"Paper {start + i}"})
+    return vectors
+
+def test_records_round_trip(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log", fsync=False)
+    vectors = _append(log, 3)
+    with log.exclusive():
+        log.append('remove', "paper-1", 1)
+
+    records = list(WriteAheadLog(tmp_path / "wal.log", fsync=False).tail())
+    assert [record['seq'] for record in records] == [1, 2, 3, 4]
+    assert [record['op'] for record in records] == ['add', 'add', 'add', 'remove']
+    assert records[0]['paperId'] == "paper-0" and records[0]['metadata'] == {'title': "Paper 0"}
+    np.testing.assert_array_equal(np.stack([record['vector'] for record in records[:3]]), vectors)
+    assert records[3]['vector'] is None and records[3]['label'] == 1
+
+def test_tail_only_returns_new_records(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log", fsync=False)
+    reader = WriteAheadLog(tmp_path / "wal.log", fsync=False)
+    _append(log, 2)
+    assert len(list(reader.tail())) == 2
+    _append(log, 1, start=2)
+    assert [record['seq'] for record in reader.tail()] == [3]
+    assert list(reader.tail()) == []
+
+def test_torn_tail_is_ignored_then_truncated(tmp_path):
+    path = tmp_path / "wal.log"
+    _append(WriteAheadLog(path, fsync=False), 2)
+    intact = path.stat().st_size
+    with open(path, 'ab') as f:
+        # A header promising more payload than was written, as a crash mid-append leaves it
+        f.write(b'\x03' + b'\x00' * 7 + b'\xff\x00\x00\x00' + b'\x00' * 10)
+
+    log = WriteAheadLog(path, fsync=False)
+    assert [record['seq'] for record in log.tail()] == [1, 2]
+    assert log.size == intact
+
+    _append(log, 1, start=2)
+    assert [record['seq'] for record in WriteAheadLog(path, fsync=False).tail()] == [1, 2, 3]
+
+def test_corrupt_record_stops_replay(tmp_path):
+    path = tmp_path / "wal.log"
+    _append(WriteAheadLog(path, fsync=False), 3)
+    record_size = path.stat().st_size // 3  # the three records are the same size
+    with open(path, 'r+b') as f:
+        # Flip a payload byte of the second record: its CRC no longer matches
+        f.seek(2 * record_size - 1)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    assert [record['seq'] for record in WriteAheadLog(path, fsync=False).tail()] == [1]
+
+def test_reset_keeps_records_after_the_checkpoint(tmp_path):
+    path = tmp_path / "wal.log"
+    log = WriteAheadLog(path, fsync=False)
+    _append(log, 5)
+    with log.exclusive():
+        log.reset(3)
+        assert log.last_seq == 5
+        log.append('remove', "paper-0", 0)
+
+    records = list(WriteAheadLog(path, fsync=False).tail())
+    assert [record['seq'] for record in records] == [4, 5, 6]
+
+def test_reader_sees_reset_as_log_reset(tmp_path):
+    path = tmp_path / "wal.log"
+    log = WriteAheadLog(path, fsync=False)
+    reader = WriteAheadLog(path, fsync=False)
+    _append(log, 2)
+    list(reader.tail())
+    with log.exclusive():
+        log.reset(2)
+    with pytest.raises(LogReset):
+        list(reader.tail())
+    _append(log, 1, start=2)
+    assert [record['seq'] for record in reader.tail()] == [3]
@@ -1,5 +1,9 @@
+import json
 import logging
+import os
+import threading
 import colorlog
+from contextlib import contextmanager
 from config.settings import settings
 
 def setup_logger(name: str) -> logging.Logger:
@@ -38,4 +42,94 @@ def setup_logger(name: str) -> logging.Logger:
     
     return logger
 
+def fsync_path(path) -> None:
+    """fsync a file or directory so a preceding write/rename survives a crash"""
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_json_atomic(path, data) -> None:
+    """Replace a JSON file so readers see either the old or the new content, never a partial one"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_path(os.path.dirname(os.path.abspath(path)))
+
+class ReadWriteLock:
+    """
+    Lock held either by any number of readers or by one writer
+
+    `with lock:` takes it exclusively and is re-entrant, like an RLock;
+    `with lock.shared():` admits the thread alongside other readers. A
+    thread holding the lock exclusively may also enter shared(). Waiting
+    writers keep new readers out, so a steady stream of readers can't
+    starve writes; a thread must therefore not enter shared() again while
+    it is already a reader, nor take the lock exclusively from inside
+    shared().
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._depth += 1
+                return
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._depth = 1
+
+    def release(self):
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError("Releasing a lock this thread doesn't hold exclusively")
+            self._depth -= 1
+            if self._depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def shared(self):
+        """Hold the lock as one of possibly many readers"""
+        with self._condition:
+            if self._writer == threading.get_ident():
+                # Already exclusive: nothing else can run, read under that
+                nested = True
+            else:
+                nested = False
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._condition:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._condition.notify_all()
+
 logger = setup_logger(__name__)
\ No newline at end of file
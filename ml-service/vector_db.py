@@ -2,207 +2,1632 @@ import faiss
 import numpy as np
 import json
 import os
-from typing import List, Dict, Tuple, Optional
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional, Set
 from pathlib import Path
 from config.settings import settings
-from utils import setup_logger
+from utils import setup_logger, fsync_path, write_json_atomic, ReadWriteLock
+from wal import WriteAheadLog, LogReset
+from metadata_store import MetadataStore
+import index_factory
+from sharded_index import ShardedIndex
+from filter_index import FilterIndex
+from lexical_index import LexicalIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
 
 logger = setup_logger(__name__)
 
 class VectorDatabase:
-    """FAISS-based vector database for semantic search"""
+    """
+    FAISS-based vector database for semantic search
+    
+    When several uvicorn workers share the data directory, the one holding
+    the writer lock keeps the index in memory, trains, compacts and writes
+    checkpoints. The other workers are readers: they memory-map the latest
+    checkpoint read-only, so they share its pages and start without copying
+    it, and keep vectors added since then in a small in-memory delta index.
+    Any worker may write; writes are serialised through the shared
+    write-ahead log, which every worker tails to stay current.
+    """
     
     def __init__(self):
         self.dimension = settings.EMBEDDING_DIMENSION
+        self.index_type = settings.FAISS_INDEX_TYPE
         self.index = None
-        self.metadata = {}  # paperId -> metadata mapping
-        self.id_to_index = {}  # paperId -> index position
-        self.index_to_id = {}  # index position -> paperId
-        self.current_index = 0
+        self.last_recall = None  # recall@k measured when the ANN index was last trained
+        # paperId / label / metadata rows live on disk, only liveness per label is kept in memory
+        self.store = MetadataStore(
+            Path(settings.METADATA_DB_PATH),
+            cache_size=settings.METADATA_CACHE_SIZE,
+            mmap_size=settings.METADATA_MMAP_BYTES
+        )
+        self.live = np.zeros(0, dtype=bool)  # live[label] is True while the label holds a current vector
+        self.live_count = 0
+        self.current_index = 0  # next FAISS label to assign
+        self.tombstones: Set[int] = set()  # removed labels still present in the index
+        self._tombstone_selector = None
+        self.filters: Optional[FilterIndex] = None  # built from the store by build_search_indexes()
+        self.lexical: Optional[LexicalIndex] = None  # BM25 index, built from the store by build_search_indexes()
         
+        # Reader workers only: vectors added after the mapped checkpoint, and the first label they may use
+        self.delta = None
+        self.base_end = 0
+        
+        # Pre-checkpoint layout, only read to migrate existing data
         self.index_path = Path(settings.FAISS_INDEX_PATH)
         self.metadata_path = Path(settings.EMBEDDING_METADATA_PATH)
         
-        self._initialize_index()
+        self.checkpoint_dir = Path(settings.CHECKPOINT_DIR)
+        self.manifest_path = self.checkpoint_dir / 'manifest.json'  # active snapshot and retained versions
+        self.task_path = self.checkpoint_dir / 'task.json'  # last requested snapshot build/rollback
+        self.checkpoint_number = 0  # version of the snapshot the index was loaded from or saved as
+        self.build_id = None  # first snapshot holding the current index structure (None = not saved yet)
+        self.checkpoint_seq = 0  # last write-ahead log record covered by the checkpoint
+        self.checkpoint_bytes = 0
+        self.applied_seq = 0  # last write-ahead log record applied to the in-memory index
+        self.wal = None
+        self.is_writer = False
+        self._writer_lock_file = None
+        
+        # Guards the index and mappings: searches hold it shared, so they run in parallel,
+        # writes and the background threads exclusively
+        self._lock = ReadWriteLock()
+        self._selector_lock = threading.Lock()
+        # One snapshot save at a time; taken before the index lock, never while holding it
+        self._save_lock = threading.RLock()
+        # Search index builds: one at a time, recording (label, metadata) adds and (label, None)
+        # removals made while the store is scanned
+        self._search_build_lock = threading.Lock()
+        self._search_backlog: Optional[List[Tuple[int, Optional[Dict]]]] = None
+        self._search_generation = 0  # bumped when in-memory state is dropped, invalidating a running build
+        self._compaction_thread = None
+        self._stop_compaction = threading.Event()
+        self._sync_thread = None
+        self._stop_sync = threading.Event()
+        self._checkpoint_due = threading.Event()  # wakes the sync thread when a write passes the log threshold
+        self._task_thread = None
+        self._building = False  # a replacement index is being prepared, so the bootstrap isn't trained
+        
+        # The index is opened by load(), from the service's startup task or on first use
+        self.loaded = False
+        self._load_lock = threading.Lock()
+    
+    def load(self):
+        """Open the index and replay the write-ahead log (once; later calls return immediately)"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            self._initialize_index()
+            self.loaded = True
+        # A bootstrap index may have reached the training threshold before a restart
+        self._maybe_train_index()
+    
+    def warm_up(self):
+        """Run a throwaway search so the first query doesn't fault in a mapped index or start thread pools"""
+        self.load()
+        query = np.random.default_rng(0).standard_normal((1, self.dimension)).astype('float32')
+        with self._lock.shared():
+            if self.index.ntotal:
+                self._search_index(query, k=10)
     
     def _initialize_index(self):
-        """Initialize or load FAISS index"""
+        """Initialize or load FAISS index, then replay the write-ahead log on top"""
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.is_writer = self._acquire_writer_lock()
+        self.wal = WriteAheadLog(settings.WAL_PATH, fsync=settings.WAL_FSYNC)
+        
+        with self._lock, self.wal.exclusive():
+            migrate = self._load_latest()
+            replayed = self._catch_up(write_store=True)
+            if replayed:
+                logger.info(f"Replayed {replayed} write-ahead log records")
+        
+        if migrate:
+            # Move legacy data into the current snapshot layout
+            self._save_index(source='migration')
+        
+        logger.info(f"Vector database serving as {'writer' if self.is_writer else 'reader'}")
+    
+    def _acquire_writer_lock(self) -> bool:
+        """Try to become the worker that checkpoints (non-blocking)"""
+        if fcntl is None:
+            return True
+        if self._writer_lock_file is None:
+            Path(settings.WRITER_LOCK_PATH).parent.mkdir(parents=True, exist_ok=True)
+            self._writer_lock_file = open(settings.WRITER_LOCK_PATH, 'a+b')
+        try:
+            fcntl.flock(self._writer_lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+    
+    def _snapshot_dirs(self) -> List[Path]:
+        """Complete snapshot directories by version (incomplete ones still carry a .tmp suffix)"""
+        return sorted(p for p in self.checkpoint_dir.iterdir() if p.is_dir() and p.name.isdigit())
+    
+    def _snapshot_path(self, version: int) -> Path:
+        return self.checkpoint_dir / f"{version:08d}"
+    
+    def _read_manifest(self) -> Optional[Dict]:
+        """The manifest, or None before the first snapshot was written with one"""
+        if not self.manifest_path.exists():
+            return None
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+    
+    def _manifest(self) -> Dict:
+        """The manifest, reconstructed from snapshot directories written before it existed"""
+        manifest = self._read_manifest()
+        if manifest is None:
+            snapshots = [self._snapshot_entry(p) for p in self._snapshot_dirs() if (p / 'state.json').exists()]
+            manifest = {'active': snapshots[-1]['version'] if snapshots else None, 'snapshots': snapshots}
+        return manifest
+    
+    def _snapshot_entry(self, path: Path) -> Dict:
+        """Manifest entry describing a snapshot directory"""
+        with open(path / 'state.json', 'r') as f:
+            state = json.load(f)
+        return {
+            'version': int(path.name),
+            'build': state.get('build', int(path.name)),
+            'source': state.get('source', 'checkpoint'),
+            'index_type': state.get('index_type'),
+            'shards': state.get('shards', 1),
+            'vectors': state.get('vectors'),
+            'wal_seq': state.get('wal_seq', 0),
+            'created_at': state.get('created_at')
+        }
+    
+    def _active_snapshot(self) -> Optional[Path]:
+        """Directory of the snapshot every worker should serve"""
+        active = self._manifest()['active']
+        return self._snapshot_path(active) if active is not None else None
+    
+    def _load_latest(self) -> bool:
+        """
+        Load the active snapshot, or legacy data, or start empty
+        
+        Returns:
+            True if legacy data was imported and should be checkpointed
+        """
+        snapshot = self._active_snapshot()
+        
+        if snapshot:
+            logger.info(f"Loading FAISS index from snapshot {snapshot.name}...")
+            self._load_index(snapshot)
+            return False
+        
+        if not self.is_writer:
+            # Legacy data is migrated by the writer; its first snapshot is picked up by refresh()
+            logger.info("No snapshot yet, waiting for the writer worker")
+            self._create_index()
+            return False
+        
+        checkpoint = self._snapshot_dirs()[-1] if self._snapshot_dirs() else None
+        if checkpoint:
+            logger.info(f"Importing JSON metadata from checkpoint {checkpoint.name}...")
+            self._reset_state()
+            self._load_legacy_index(checkpoint / 'index.faiss', checkpoint / 'metadata.json')
+            self.checkpoint_number = int(checkpoint.name)
+            return True
         if self.index_path.exists():
             logger.info("Loading existing FAISS index...")
-            self._load_index()
-        else:
-            logger.info("Creating new FAISS index...")
-            self._create_index()
+            self._reset_state()
+            self._load_legacy_index(self.index_path, self.metadata_path)
+            return True
+        
+        logger.info("Creating new FAISS index...")
+        self._create_index()
+        return False
+    
+    def _reset_state(self):
+        """Forget all in-memory label state before loading a checkpoint"""
+        self.live = np.zeros(0, dtype=bool)
+        self.live_count = 0
+        self.current_index = 0
+        self.tombstones = set()
+        self._tombstone_selector = None
+        self.filters = None
+        self.lexical = None
+        self._search_generation += 1
+        self.checkpoint_seq = 0
+        self.applied_seq = 0
+        self.base_end = 0
+        self.delta = None if self.is_writer else index_factory.create_index(self.dimension, "flat", shards=1, compress=False)
+        if self.wal:
+            # Records already read may be newer than what is loaded next
+            self.wal.rewind()
+    
+    def _catch_up(self, write_store: bool) -> int:
+        """
+        Apply write-ahead log records written since the last catch-up, by any worker
+        
+        Args:
+            write_store: Also apply records the metadata store has not seen yet
+                (only safe while holding the log's exclusive lock)
+        
+        Returns:
+            Number of records applied
+        """
+        # Sequence numbers continue from the loaded checkpoint even when the log is empty
+        self.wal.last_seq = max(self.wal.last_seq, self.applied_seq)
+        store_seq = self.store.get_applied_seq() if write_store else None
+        applied = 0
+        try:
+            for record in self.wal.tail():
+                if record['seq'] <= self.applied_seq:
+                    continue
+                if record['seq'] > self.applied_seq + 1:
+                    # Sequence numbers are contiguous, so the records in between are only in a snapshot
+                    raise RuntimeError(
+                        f"Write-ahead log continues at {record['seq']} after {self.applied_seq}; "
+                        f"the active snapshot must be loaded first"
+                    )
+                self._apply_record(record, write_store and record['seq'] > store_seq)
+                applied += 1
+        except LogReset:
+            # The writer saved a snapshot; records we may have missed are in it
+            active = self._active_snapshot()
+            if active and int(active.name) != self.checkpoint_number:
+                self._load_index(active)
+            return applied + self._catch_up(write_store)
+        
+        if write_store and applied:
+            self.store.set_applied_seq(self.applied_seq)
+            self.store.commit()
+        return applied
+    
+    def _apply_record(self, record: Dict, write_store: bool):
+        """Apply one write-ahead log record to the index (and the metadata store)"""
+        paper_id = record['paperId']
+        # Records logged before replaced/removed labels were recorded fall back to the store,
+        # which is exactly at the checkpoint state in that case
+        if record['op'] == 'add':
+            replaces = record['replaces'] if 'replaces' in record else self.store.get_label(paper_id)
+            self._apply_add(paper_id, record['label'], record['vector'].reshape(1, -1), record['metadata'],
+                            replaces, write_store)
+        elif record['op'] == 'remove':
+            label = record['label'] if record.get('label') is not None else self.store.get_label(paper_id)
+            self._apply_remove(paper_id, label, write_store)
+        self.applied_seq = record['seq']
+    
+    @contextmanager
+    def _exclusive(self):
+        """Serialise a write with every worker, starting from the latest logged state"""
+        with self._lock, self.wal.exclusive():
+            self._catch_up(write_store=True)
+            yield
+    
+    def refresh(self):
+        """
+        Pick up snapshots and log records written by other workers
+        
+        Readers map the active snapshot as soon as the manifest points to a
+        new one. A snapshot that fails to load is logged and retried on the
+        next call while the previous one keeps being served. A reader that
+        finds the writer lock free (the writer exited) takes over as writer,
+        and the writer starts queued snapshot builds and rollbacks.
+        """
+        self.load()
+        try:
+            migrate = False
+            with self._lock:
+                if not self.is_writer and self._acquire_writer_lock():
+                    logger.info("Writer lock is free, taking over as writer")
+                    try:
+                        self.is_writer = True
+                        with self.wal.exclusive():
+                            migrate = self._load_latest()
+                            self._catch_up(write_store=True)
+                    except Exception:
+                        # Keep serving as a reader; mapped indexes must never be written to
+                        self.is_writer = False
+                        fcntl.flock(self._writer_lock_file.fileno(), fcntl.LOCK_UN)
+                        raise
+                elif not self.is_writer:
+                    active = self._active_snapshot()
+                    if active and int(active.name) != self.checkpoint_number:
+                        logger.info(f"Mapping snapshot {active.name}")
+                        self._load_index(active)
+                
+                self._catch_up(write_store=False)
+            
+            if migrate:
+                self._save_index(source='migration')
+            if self.is_writer:
+                self._start_pending_task()
+            self._maybe_checkpoint()
+        except Exception as e:
+            logger.error(f"Error refreshing vector database: {e}")
+            raise
     
     def _create_index(self):
         """Create a new FAISS index"""
+        self._reset_state()
+        self.build_id = None
         # Using L2 distance (can be changed to inner product for cosine similarity)
-        self.index = faiss.IndexFlatL2(self.dimension)
-        logger.info(f"Created FAISS index with dimension {self.dimension}")
+        if index_factory.requires_training(self.index_type):
+            # IVF indexes and compression need training data, so serve from a flat index until enough vectors exist
+            self.index = index_factory.create_index(self.dimension, "flat", compress=False)
+            logger.info(
+                f"Created flat FAISS index with dimension {self.dimension}; "
+                f"{self.index_type} will be trained after {index_factory.min_training_vectors(self.index_type)} vectors"
+            )
+        else:
+            self.index = index_factory.create_index(self.dimension, self.index_type)
+            logger.info(f"Created {self.index_type} FAISS index with dimension {self.dimension}")
+    
+    def _needs_training(self) -> bool:
+        """Whether the index is still the flat bootstrap of a configured IVF or compressed index"""
+        return (
+            index_factory.requires_training(self.index_type)
+            and (index_factory.get_index_type(self.index) != self.index_type
+                 or index_factory.get_compression(self.index) != index_factory.configured_compression())
+        )
+    
+    def _maybe_train_index(self):
+        """
+        Queue a build of the configured IVF index once the bootstrap index holds enough vectors
+        
+        Training runs as a snapshot build on the task thread, so the write
+        that crosses the threshold returns at once and searches keep using
+        the flat index until the trained one is swapped in. Called without
+        holding the index lock.
+        """
+        if self._task_thread is not None and self._task_thread.is_alive():
+            return
+        if (self.is_writer and not self._building and self._needs_training()
+                and self.index.ntotal >= index_factory.min_training_vectors(self.index_type)):
+            try:
+                self.request_snapshot_task('build', self.index_type)
+            except RuntimeError:
+                pass  # A build or rollback is already queued or running
+    
+    def _live_labels(self) -> np.ndarray:
+        """Labels of all papers currently in the index (excluding tombstones)"""
+        return np.flatnonzero(self.live).astype('int64')
+    
+    def _is_live(self, label: int) -> bool:
+        return 0 <= label < len(self.live) and bool(self.live[label])
+    
+    def _set_live(self, label: int, value: bool):
+        """Flip a label's liveness, growing the array geometrically as labels are assigned"""
+        if label >= len(self.live):
+            grown = np.zeros(max(label + 1, 2 * len(self.live), 1024), dtype=bool)
+            grown[:len(self.live)] = self.live
+            self.live = grown
+        if self.live[label] != value:
+            self.live[label] = value
+            self.live_count += 1 if value else -1
     
-    def _save_index(self):
-        """Save FAISS index and metadata to disk"""
+    def _save_index(self, source: str = 'checkpoint', build: Optional[int] = None):
+        """
+        Save the in-memory index as a new immutable snapshot, activate it and truncate the log
+        
+        Only copying the index into memory happens under the lock; the files
+        are written and fsynced while searches and writes go on, and the lock
+        is taken again just to swap the manifest and truncate the log (records
+        logged meanwhile stay in it). The files go into a temporary directory
+        that is renamed into place and only becomes active through an atomic
+        manifest update, so a crash leaves either the previous snapshot active
+        or the new one. The metadata store is flushed first, so it never lags
+        a snapshot. Only the writer worker saves snapshots.
+        
+        Args:
+            source: What produced the snapshot (checkpoint, build, rollback, compaction, migration)
+            build: Version that first saved this index structure, when restoring one
+        """
+        if not self.is_writer:
+            return
+        
         try:
-            # Save FAISS index
-            faiss.write_index(self.index, str(self.index_path))
+            with self._save_lock:
+                with self._lock, self.wal.exclusive():
+                    self._catch_up(write_store=True)
+                    seq = self.wal.last_seq
+                    # Versions are never reused, not even those of snapshots a crash left unreferenced
+                    number = max([self.checkpoint_number] + [int(p.name) for p in self._snapshot_dirs()]) + 1
+                    build = build or self.build_id or number
+                    previous = self._snapshot_path(self.checkpoint_number)
+                    
+                    # In-memory copies of the index and label state (metadata itself lives in the store)
+                    index = self.index
+                    files = index_factory.serialize_index(index, previous=previous)
+                    dirty = set(index.dirty) if isinstance(index, ShardedIndex) else set()
+                    if isinstance(index, ShardedIndex):
+                        # Shards changed from here on are marked dirty again for the next save
+                        index.dirty.clear()
+                    labels = self.live[:self.current_index].copy()
+                    vectors = index.ntotal
+                    state = {
+                        'current_index': self.current_index,
+                        'tombstones': sorted(self.tombstones),
+                        'wal_seq': seq,
+                        'index_type': index_factory.get_index_type(index),
+                        'target_type': self.index_type,
+                        'shards': index_factory.shard_count(index),
+                        'vectors': self.live_count,
+                        'build': build,
+                        'source': source,
+                        'created_at': time.time()
+                    }
+                
+                try:
+                    final_dir = self._write_snapshot(number, files, labels, state, previous)
+                    
+                    with self._lock, self.wal.exclusive():
+                        manifest = self._manifest()
+                        snapshots = self._retained_snapshots(manifest['snapshots'] + [self._snapshot_entry(final_dir)])
+                        write_json_atomic(self.manifest_path, {'active': number, 'snapshots': snapshots})
+                        
+                        # Everything up to seq is now in the active snapshot
+                        self.wal.reset(seq)
+                        self.checkpoint_number = number
+                        self.checkpoint_seq = seq
+                        self.checkpoint_bytes = sum(p.stat().st_size for p in final_dir.iterdir())
+                        if self.index is index:
+                            # Unless the index was retrained meanwhile, which starts a new build
+                            self.build_id = build
+                except BaseException:
+                    if isinstance(index, ShardedIndex):
+                        with self._lock:
+                            index.dirty.update(dirty)
+                    raise
+                
+                retained = {self._snapshot_path(entry['version']) for entry in snapshots}
+                for path in self.checkpoint_dir.iterdir():
+                    if path.is_dir() and path not in retained:
+                        shutil.rmtree(path, ignore_errors=True)
             
-            # Save metadata
-            metadata_dict = {
-                'metadata': self.metadata,
-                'id_to_index': self.id_to_index,
-                'index_to_id': {str(k): v for k, v in self.index_to_id.items()},
-                'current_index': self.current_index
-            }
+            logger.info(f"Saved snapshot {number} ({source}) with {vectors} vectors")
+        except Exception as e:
+            logger.error(f"Error saving index: {e}")
+            raise
+    
+    def _write_snapshot(self, number: int, files: Dict, labels: np.ndarray, state: Dict, previous: Path) -> Path:
+        """Write a snapshot's files durably and rename the directory into place (no lock needed)"""
+        # Log records and store rows the snapshot covers must be durable before it is
+        self.wal.sync()
+        self.store.sync()
+        
+        final_dir = self._snapshot_path(number)
+        tmp_dir = self.checkpoint_dir / f"{number:08d}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        
+        # Save FAISS index; unchanged shards are linked from the previous snapshot
+        index_factory.write_index(files, tmp_dir, previous=previous)
+        np.save(tmp_dir / 'labels.npy', labels)
+        with open(tmp_dir / 'state.json', 'w') as f:
+            json.dump(state, f)
+        
+        for path in tmp_dir.iterdir():
+            fsync_path(path)
+        os.rename(tmp_dir, final_dir)
+        fsync_path(self.checkpoint_dir)
+        return final_dir
+    
+    def _retained_snapshots(self, snapshots: List[Dict]) -> List[Dict]:
+        """
+        Manifest entries worth keeping
+        
+        The two newest versions are kept because readers may still be mapping
+        the previous one, plus the newest version of each of the last
+        SNAPSHOT_RETAIN_BUILDS index builds as rollback targets.
+        """
+        snapshots = sorted(snapshots, key=lambda entry: entry['version'])
+        keep = {entry['version'] for entry in snapshots[-2:]}
+        newest_per_build = {}
+        for entry in snapshots:
+            newest_per_build[entry['build']] = entry['version']
+        keep.update(sorted(newest_per_build.values())[-settings.SNAPSHOT_RETAIN_BUILDS:])
+        return [entry for entry in snapshots if entry['version'] in keep]
+    
+    def _checkpoint_threshold(self) -> float:
+        """Log size that triggers a checkpoint: a fixed fraction of the last checkpoint
+        
+        Tying the interval to the checkpoint size keeps the amortised write
+        cost per operation constant as the corpus grows.
+        """
+        return max(settings.WAL_CHECKPOINT_MIN_BYTES, settings.WAL_CHECKPOINT_RATIO * self.checkpoint_bytes)
+    
+    def _maybe_checkpoint(self):
+        """Checkpoint once the log has grown past the threshold"""
+        threshold = self._checkpoint_threshold()
+        if self.is_writer and self.wal.size > threshold:
+            with self._save_lock:
+                # Another thread may have just saved while this one waited
+                if self.wal.size > threshold:
+                    self._save_index()
+    
+    def _request_checkpoint(self):
+        """
+        After a write: have the sync thread checkpoint if the log passed the threshold
+        
+        Keeps snapshot writes off the request path. Without a sync thread
+        (the offline builder, scripts) the caller checkpoints itself.
+        """
+        if self._sync_thread is None or not self._sync_thread.is_alive():
+            self._maybe_checkpoint()
+        elif self.is_writer and self.wal.size > self._checkpoint_threshold():
+            self._checkpoint_due.set()
+    
+    def save_if_changed(self) -> bool:
+        """
+        Checkpoint only if the log has records past the active snapshot
+        
+        Saving unconditionally (e.g. on every shutdown) would add a snapshot
+        per restart and could push the one an operator wants to roll back
+        to out of retention.
+        
+        Returns:
+            True if a snapshot was saved
+        """
+        if not self.is_writer:
+            return False
+        with self._exclusive():
+            changed = self.applied_seq > self.checkpoint_seq
+        if changed:
+            self._save_index()
+        return changed
+    
+    def _load_index(self, checkpoint: Path):
+        """
+        Load FAISS index and label state from a snapshot directory (mapped read-only on readers)
+        
+        Everything is read before any state is replaced, so a snapshot that
+        fails to load leaves the current one in place. The error is raised:
+        serving an empty index instead would silently drop every paper.
+        """
+        try:
+            mmap = settings.FAISS_MMAP and not self.is_writer
+            with open(checkpoint / 'state.json', 'r') as f:
+                state = json.load(f)
             
-            with open(self.metadata_path, 'w') as f:
-                json.dump(metadata_dict, f, indent=2)
+            # Load FAISS index
+            index = index_factory.load_index(checkpoint, mmap=mmap, index_type=state.get('index_type'))
+            index_factory.configure_search(index)
             
-            logger.info(f"Saved index with {self.index.ntotal} vectors")
+            # Load label state; a copy-on-write mapping stays shared until a reader flips a label
+            live = np.load(checkpoint / 'labels.npy', mmap_mode='c' if mmap else None)
         except Exception as e:
-            logger.error(f"Error saving index: {e}")
+            logger.error(f"Error loading snapshot {checkpoint.name}: {e}")
             raise
+        
+        previous_live = self.live[:self.current_index]
+        filters, lexical = self.filters, self.lexical
+        target_type = state.get('target_type', self.index_type)
+        self._reset_state()
+        # The index and its target type change together
+        self.index = index
+        self.index_type = target_type
+        self.live = live
+        self.live_count = int(self.live.sum())
+        self.current_index = state.get('current_index', len(self.live))
+        self.base_end = self.current_index
+        self.tombstones = set(state.get('tombstones', []))
+        self.checkpoint_number = int(checkpoint.name)
+        self.checkpoint_seq = self.applied_seq = state.get('wal_seq', 0)
+        self.checkpoint_bytes = sum(p.stat().st_size for p in checkpoint.iterdir())
+        self.build_id = state.get('build', self.checkpoint_number)
+        if filters is not None:
+            self.filters, self.lexical = filters, lexical
+            self._update_search_indexes(previous_live)
+        
+        # A snapshot built through the admin API keeps its type across restarts
+        if target_type != settings.FAISS_INDEX_TYPE:
+            logger.warning(
+                f"Snapshot {checkpoint.name} targets {target_type}, ignoring FAISS_INDEX_TYPE={settings.FAISS_INDEX_TYPE}; "
+                f"build a snapshot to switch types"
+            )
+        
+        shards = index_factory.shard_count(self.index)
+        if shards != settings.FAISS_SHARDS:
+            logger.warning(
+                f"Snapshot {checkpoint.name} has {shards} shard(s), FAISS_SHARDS={settings.FAISS_SHARDS}; "
+                f"build a snapshot to reshard"
+            )
+        
+        logger.info(f"Loaded index with {self.index.ntotal} vectors{' (memory-mapped)' if mmap else ''}")
+        self._check_index_type()
     
-    def _load_index(self):
-        """Load FAISS index and metadata from disk"""
+    def _load_legacy_index(self, index_path: Path, metadata_path: Path):
+        """Load a FAISS index with a JSON metadata file and import the metadata into the store"""
         try:
             # Load FAISS index
-            self.index = faiss.read_index(str(self.index_path))
+            self.index = index_factory.ensure_id_mapped(faiss.read_index(str(index_path)))
+            index_factory.configure_search(self.index)
             
             # Load metadata
-            if self.metadata_path.exists():
-                with open(self.metadata_path, 'r') as f:
+            if metadata_path.exists():
+                with open(metadata_path, 'r') as f:
                     data = json.load(f)
-                    self.metadata = data.get('metadata', {})
-                    self.id_to_index = data.get('id_to_index', {})
-                    self.index_to_id = {int(k): v for k, v in data.get('index_to_id', {}).items()}
-                    self.current_index = data.get('current_index', 0)
+                metadata = data.get('metadata', {})
+                id_to_index = data.get('id_to_index', {})
+                
+                self.current_index = data.get('current_index', 0)
+                self.tombstones = set(data.get('tombstones', []))
+                self.checkpoint_seq = self.applied_seq = data.get('wal_seq', 0)
+                self.checkpoint_bytes = os.path.getsize(index_path) + os.path.getsize(metadata_path)
+                
+                self.store.clear()
+                self.store.put_many((paper_id, label, metadata.get(paper_id, {})) for paper_id, label in id_to_index.items())
+                self.store.set_applied_seq(self.checkpoint_seq)
+                self.store.commit()
+                for label in id_to_index.values():
+                    self._set_live(label, True)
             
-            logger.info(f"Loaded index with {self.index.ntotal} vectors")
+            logger.info(f"Loaded index with {self.index.ntotal} vectors, imported {self.live_count} metadata records")
+            self._check_index_type()
         except Exception as e:
             logger.error(f"Error loading index: {e}")
-            self._create_index()
+            raise
+    
+    def _check_index_type(self):
+        """Warn about a type mismatch with settings"""
+        loaded_type = index_factory.get_index_type(self.index)
+        if loaded_type != self.index_type and not self._needs_training():
+            logger.warning(
+                f"Loaded {loaded_type} index but FAISS_INDEX_TYPE is {self.index_type}; "
+                f"rebuild the index to switch types"
+            )
+        compression = index_factory.get_compression(self.index)
+        if compression != index_factory.configured_compression() and not self._needs_training():
+            logger.warning(
+                f"Loaded index compression is {compression} but settings ask for "
+                f"{index_factory.configured_compression()}; rebuild the index to switch"
+            )
     
     def add_embedding(self, paper_id: str, embedding: np.ndarray, metadata: Dict):
         """
-        Add a single embedding to the index
+        Add a single embedding to the index, replacing any existing one
         
         Args:
             paper_id: Unique identifier for the paper
             embedding: Embedding vector
             metadata: Paper metadata (title, abstract, etc.)
         """
+        self.load()
         try:
-            # Check if already exists
-            if paper_id in self.id_to_index:
-                logger.warning(f"Paper {paper_id} already exists in index")
-                return
-            
-            # Ensure embedding is 2D
-            if embedding.ndim == 1:
-                embedding = embedding.reshape(1, -1)
-            
-            # Add to FAISS index
-            self.index.add(embedding.astype('float32'))
-            
-            # Update mappings
-            self.id_to_index[paper_id] = self.current_index
-            self.index_to_id[self.current_index] = paper_id
-            self.metadata[paper_id] = metadata
-            self.current_index += 1
-            
-            # Save periodically
-            if self.current_index % 10 == 0:
-                self._save_index()
+            with self._exclusive():
+                self._add_logged(paper_id, embedding, metadata, sync=True)
+                self.store.commit()
+            self._request_checkpoint()
+            self._maybe_train_index()
             
             logger.info(f"Added embedding for paper {paper_id}")
         except Exception as e:
             logger.error(f"Error adding embedding: {e}")
             raise
     
-    def add_embeddings_batch(self, paper_ids: List[str], embeddings: np.ndarray, metadatas: List[Dict]):
+    def _add_logged(self, paper_id: str, embedding: np.ndarray, metadata: Dict, sync: bool):
+        """Log an add to the write-ahead log and apply it (inside _exclusive())"""
+        # Ensure embedding is 2D
+        if embedding.ndim == 1:
+            embedding = embedding.reshape(1, -1)
+        embedding = embedding.astype('float32')
+        
+        label = self.current_index
+        # Re-embedding an existing paper replaces its vector
+        replaces = self.store.get_label(paper_id)
+        if replaces is not None:
+            logger.info(f"Paper {paper_id} already exists in index, replacing it")
+        
+        seq = self.wal.append('add', paper_id, label, embedding[0], metadata, replaces=replaces, sync=sync)
+        self._apply_add(paper_id, label, embedding, metadata, replaces)
+        self.applied_seq = seq
+        self.store.set_applied_seq(seq)
+    
+    def _apply_add(self, paper_id: str, label: int, embedding: np.ndarray, metadata: Dict,
+                   replaces: Optional[int] = None, write_store: bool = True):
+        """Insert a vector under a given label (shared by live writes and log replay)"""
+        self._apply_add_many([paper_id], np.array([label], dtype='int64'), embedding, [metadata],
+                             [replaces], write_store)
+    
+    def _apply_add_many(self, paper_ids: List[str], labels: np.ndarray, embeddings: np.ndarray,
+                        metadatas: List[Dict], replaces: List[Optional[int]], write_store: bool = True):
+        """Insert vectors under given labels with a single index add"""
+        with self._lock:
+            # Add to FAISS index (readers never modify the mapped checkpoint)
+            target = self.delta if self.delta is not None else self.index
+            target.add_with_ids(embeddings, labels)
+            
+            # Update mappings
+            for label, metadata in zip(labels.tolist(), metadatas):
+                self._set_live(label, True)
+                if self.filters is not None:
+                    self.filters.add(label, metadata)
+                if self._search_backlog is not None:
+                    self._search_backlog.append((label, metadata))
+                if self.lexical is not None:
+                    self.lexical.add(label, metadata)
+            if write_store:
+                self.store.put_many(zip(paper_ids, labels.tolist(), metadatas))
+            self.current_index = max(self.current_index, int(labels.max()) + 1)
+            
+            # Drop replaced vectors last: a paper may be replaced by a later row of the same batch
+            for previous in replaces:
+                if previous is not None and self._is_live(previous):
+                    self._remove_label(previous)
+    
+    def add_embeddings_batch(self, paper_ids: List[str], embeddings: np.ndarray, metadatas: List[Dict],
+                             state: Optional[Dict[str, int]] = None):
         """
-        Add multiple embeddings to the index
+        Add multiple embeddings with one vectorised index add
+        
+        Every paper is still logged as its own record, but the log is synced
+        and the metadata store committed once for the whole batch.
         
         Args:
             paper_ids: List of paper IDs
             embeddings: Batch of embedding vectors
             metadatas: List of metadata dicts
+            state: Store bookkeeping values committed atomically with the batch
         """
+        self.load()
         try:
-            for paper_id, embedding, metadata in zip(paper_ids, embeddings, metadatas):
-                if paper_id not in self.id_to_index:
-                    self.add_embedding(paper_id, embedding, metadata)
+            if len(paper_ids) == 0:
+                return
+            embeddings = np.ascontiguousarray(embeddings, dtype='float32').reshape(len(paper_ids), -1)
             
-            self._save_index()
+            with self._exclusive():
+                labels = np.arange(self.current_index, self.current_index + len(paper_ids), dtype='int64')
+                replaces = []
+                batch_labels: Dict[str, int] = {}
+                for paper_id, label, embedding, metadata in zip(paper_ids, labels.tolist(), embeddings, metadatas):
+                    # Re-embedding an existing paper replaces its vector, even one added earlier in this batch
+                    previous = batch_labels.get(paper_id, self.store.get_label(paper_id))
+                    batch_labels[paper_id] = label
+                    seq = self.wal.append('add', paper_id, label, embedding, metadata, replaces=previous, sync=False)
+                    replaces.append(previous)
+                
+                # One durable flush, one index add and one commit for the whole batch
+                self.wal.sync()
+                self._apply_add_many(paper_ids, labels, embeddings, metadatas, replaces)
+                self.applied_seq = seq
+                self.store.set_applied_seq(seq)
+                for key, value in (state or {}).items():
+                    self.store.set_state(key, value)
+                self.store.commit()
+            self._request_checkpoint()
+            self._maybe_train_index()
             logger.info(f"Added {len(paper_ids)} embeddings to index")
         except Exception as e:
             logger.error(f"Error adding batch embeddings: {e}")
             raise
     
-    def search(self, query_embedding: np.ndarray, k: int = 10) -> List[Dict]:
+    def search(self, query_embedding: np.ndarray, k: int = 10,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filters: Optional[Dict] = None, query_text: Optional[str] = None) -> List[Dict]:
         """
         Search for similar papers
         
         Args:
             query_embedding: Query embedding vector
             k: Number of results to return
-            
+            nprobe: IVF lists to visit (overrides settings.FAISS_IVF_NPROBE)
+            ef_search: HNSW candidate list size (overrides settings.FAISS_HNSW_EF_SEARCH)
+            filters: Metadata filters (categories, authors, publishedFrom, publishedTo)
+            query_text: Query text; when given, vector hits are fused with BM25 hits (hybrid search)
+        
         Returns:
             List of dicts with paper info and similarity scores
         """
+        query_texts = [query_text] if query_text is not None else None
+        return self.search_batch(query_embedding.reshape(1, -1), k, nprobe, ef_search, filters, query_texts)[0]
+    
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 10,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     filters: Optional[Dict] = None, query_texts: Optional[List[str]] = None) -> List[List[Dict]]:
+        """
+        Search for similar papers for many queries with a single index search
+        
+        Filters are applied inside the index search rather than to its
+        results, so k matching papers come back whenever k exist.
+        
+        Args:
+            query_embeddings: Query embedding matrix (num_queries x dimension)
+            k: Number of results per query
+            nprobe: IVF lists to visit (overrides settings.FAISS_IVF_NPROBE)
+            ef_search: HNSW candidate list size (overrides settings.FAISS_HNSW_EF_SEARCH)
+            filters: Metadata filters (categories, authors, publishedFrom, publishedTo)
+            query_texts: Query texts; when given, vector hits are fused with BM25 hits
+                by reciprocal rank fusion and each result carries its fused score
+        
+        Returns:
+            One list of result dicts per query, in query order
+        """
+        self.load()
         try:
-            if self.index.ntotal == 0:
+            if self.live_count == 0:
                 logger.warning("Index is empty")
-                return []
+                return [[] for _ in range(len(query_embeddings))]
             
-            # Ensure embedding is 2D
-            if query_embedding.ndim == 1:
-                query_embedding = query_embedding.reshape(1, -1)
+            if (query_texts is not None or not FilterIndex.is_empty(filters)) and self.filters is None:
+                # Normally built at startup; never while holding the lock, which would stall every search
+                self.build_search_indexes()
             
-            # Search
-            k = min(k, self.index.ntotal)
-            distances, indices = self.index.search(query_embedding.astype('float32'), k)
+            # Search; concurrent searches share the lock and run in parallel
+            queries = np.ascontiguousarray(query_embeddings, dtype='float32')
+            scores = None
+            with self._lock.shared():
+                if query_texts is not None:
+                    distances, indices, scores = self._search_hybrid(
+                        queries, query_texts, k, nprobe, ef_search, filters
+                    )
+                elif FilterIndex.is_empty(filters):
+                    k = min(k, self.live_count)
+                    distances, indices = self._search_index(queries, k, nprobe, ef_search)
+                else:
+                    distances, indices = self._search_filtered(queries, k, nprobe, ef_search, self._filter_mask(filters))
+            
+            # Fetch metadata for the hits only, once for all queries
+            hits = self.store.get_by_labels(sorted({int(idx) for idx in indices.ravel() if idx != -1}))
             
             # Format results
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx == -1:  # FAISS returns -1 for invalid results
-                    continue
-                
-                paper_id = self.index_to_id.get(int(idx))
-                if paper_id:
-                    metadata = self.metadata.get(paper_id, {})
-                    results.append({
-                        'paperId': paper_id,
-                        'distance': float(dist),
-                        'similarity': float(1 / (1 + dist)),  # Convert distance to similarity
-                        **metadata
-                    })
-            
-            return results
+            batch_results = []
+            for row, (row_distances, row_indices) in enumerate(zip(distances, indices)):
+                results = []
+                for rank, (dist, idx) in enumerate(zip(row_distances, row_indices)):
+                    if idx == -1:  # FAISS returns -1 for invalid results
+                        continue
+                    
+                    if int(idx) in hits:
+                        paper_id, metadata = hits[int(idx)]
+                        result = {
+                            'paperId': paper_id,
+                            'distance': float(dist),
+                            'similarity': float(1 / (1 + dist)),  # Convert distance to similarity
+                            **metadata
+                        }
+                        if scores is not None:
+                            result['score'] = float(scores[row, rank])
+                        results.append(result)
+                batch_results.append(results)
+            
+            return batch_results
         except Exception as e:
             logger.error(f"Error searching index: {e}")
             raise
     
+    def _search_index(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k over the index, merged with the delta index on reader workers
+        
+        A selector, if given, must already exclude tombstoned labels.
+        """
+        if selector is None:
+            selector = self._get_tombstone_selector()
+        params = index_factory.search_params(self.index, nprobe, ef_search, selector)
+        distances, indices = self.index.search(queries, k, params=params)
+        
+        if self.delta is not None and self.delta.ntotal:
+            delta_params = faiss.SearchParameters(sel=selector) if selector is not None else None
+            delta_distances, delta_indices = self.delta.search(queries, min(k, self.delta.ntotal), params=delta_params)
+            distances = np.hstack([distances, delta_distances])
+            indices = np.hstack([indices, delta_indices])
+            # Missing results carry the largest float distance, so they sort last
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+        
+        return distances, indices
+    
+    def _search_filtered(self, queries: np.ndarray, k: int, nprobe: Optional[int], ef_search: Optional[int],
+                         mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k among the papers matching the filters
+        
+        Small match sets are searched exactly over their own vectors, which is
+        cheaper than the index search and always finds k results. Larger ones
+        go through the index with a bitmap ID selector; queries the
+        approximate index returns too few results for are redone exactly.
+        
+        Args:
+            mask: Labels allowed in the results, from _filter_mask()
+        """
+        matches = np.flatnonzero(mask).astype('int64')
+        k = min(k, len(matches))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype='float32'), np.zeros((len(queries), 0), dtype='int64')
+        if len(matches) <= settings.FILTER_EXACT_MAX:
+            return self._search_exact(queries, k, matches)
+        
+        # The selector only holds a pointer, the bitmap must outlive the search
+        bitmap = np.packbits(mask, bitorder='little')
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        distances, indices = self._search_index(queries, k, nprobe, ef_search, selector)
+        
+        short = (indices == -1).any(axis=1)
+        if short.any():
+            distances[short], indices[short] = self._search_exact(queries[short], k, matches)
+        return distances, indices
+    
+    def _search_hybrid(self, queries: np.ndarray, query_texts: List[str], k: int, nprobe: Optional[int],
+                       ef_search: Optional[int], filters: Optional[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fuse vector and BM25 results by reciprocal rank fusion
+        
+        Each retriever contributes its top HYBRID_CANDIDATES; a paper scores
+        the sum of 1 / (HYBRID_RRF_K + rank) over the lists it appears in.
+        Distances of papers only found lexically are computed from their
+        stored vectors, so every result has one.
+        
+        Returns:
+            (distances, labels, fused scores), rows padded with -1 labels
+        """
+        depth = max(k, settings.HYBRID_CANDIDATES)
+        if FilterIndex.is_empty(filters):
+            mask = self.live[:self.current_index]
+            _, vector_labels = self._search_index(queries, min(depth, self.live_count), nprobe, ef_search)
+        else:
+            mask = self._filter_mask(filters)
+            _, vector_labels = self._search_filtered(queries, depth, nprobe, ef_search, mask)
+        lexical = self.lexical
+        
+        distances = np.full((len(queries), k), np.finfo('float32').max, dtype='float32')
+        labels = np.full((len(queries), k), -1, dtype='int64')
+        scores = np.zeros((len(queries), k), dtype='float32')
+        for row, text in enumerate(query_texts):
+            fused: Dict[int, float] = {}
+            _, lexical_labels = lexical.search(text, depth, mask)
+            for ranked in (vector_labels[row], lexical_labels):
+                for rank, label in enumerate(int(label) for label in ranked if label != -1):
+                    fused[label] = fused.get(label, 0.0) + 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+            
+            top = sorted(fused.items(), key=lambda item: -item[1])[:k]
+            if not top:
+                continue
+            top_labels = np.array([label for label, _ in top], dtype='int64')
+            vectors = self._reconstruct(top_labels)
+            labels[row, :len(top)] = top_labels
+            scores[row, :len(top)] = [score for _, score in top]
+            distances[row, :len(top)] = ((vectors - queries[row]) ** 2).sum(axis=1)
+        return distances, labels, scores
+    
+    def _search_exact(self, queries: np.ndarray, k: int, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top-k over the stored vectors of the given labels"""
+        distances, positions = faiss.knn(queries, self._reconstruct(labels), k)
+        return distances, labels[positions]
+    
+    def _reconstruct(self, labels: np.ndarray) -> np.ndarray:
+        """Stored vectors of live labels, read from the delta index where readers keep them"""
+        if self.delta is None:
+            return self.index.reconstruct_batch(labels)
+        
+        vectors = np.empty((len(labels), self.dimension), dtype='float32')
+        in_delta = labels >= self.base_end
+        if (~in_delta).any():
+            vectors[~in_delta] = self.index.reconstruct_batch(labels[~in_delta])
+        if in_delta.any():
+            vectors[in_delta] = self.delta.reconstruct_batch(labels[in_delta])
+        return vectors
+    
+    def _filter_mask(self, filters: Dict) -> np.ndarray:
+        """Boolean mask of the live labels matching the filters"""
+        return self.filters.match(self.live[:self.current_index], filters)
+    
+    def build_search_indexes(self, rebuild: bool = False):
+        """
+        Build the filter and BM25 indexes from the metadata store, unless they are built already
+        
+        The store is scanned once without holding the index lock, so searches
+        and writes carry on meanwhile; papers added or removed during the scan
+        are recorded and applied before the result is swapped in. The service
+        calls this from its startup task, and a filtered or hybrid search that
+        comes first waits for it.
+        
+        Args:
+            rebuild: Replace built indexes too, dropping the postings of removed papers
+        """
+        self.load()
+        with self._search_build_lock:
+            while True:
+                with self._lock:
+                    if not rebuild and self.filters is not None and self.lexical is not None:
+                        return
+                    generation = self._search_generation
+                    self._search_backlog = []
+                
+                started = time.time()
+                filters, lexical = FilterIndex(), LexicalIndex()
+                for label, metadata in self.store.iter_metadata():
+                    filters.add(label, metadata)
+                    if self._is_live(label):
+                        lexical.add(label, metadata)
+                
+                with self._lock:
+                    backlog, self._search_backlog = self._search_backlog, None
+                    if generation != self._search_generation:
+                        # A different index was loaded meanwhile; scan again
+                        continue
+                    # Labels indexed by both the scan and the backlog are only added once to the
+                    # BM25 index; filter posting lists tolerate duplicates
+                    for label, metadata in backlog:
+                        if metadata is None:
+                            lexical.remove(label)
+                        else:
+                            filters.add(label, metadata)
+                            lexical.add(label, metadata)
+                    self.filters, self.lexical = filters, lexical
+                logger.info(
+                    f"Built search indexes over {lexical.doc_count} papers in {time.time() - started:.1f}s "
+                    f"({len(filters.postings)} categories and authors, {len(lexical.postings)} terms)"
+                )
+                return
+    
+    def _update_search_indexes(self, previous_live: np.ndarray):
+        """
+        Bring the search indexes from the label state in previous_live to the loaded one
+        
+        Called when a newer snapshot is mapped, so only the labels that
+        changed are read from the store instead of rebuilding the indexes.
+        Labels past the snapshot are kept: replaying the log adds them again,
+        which the BM25 index ignores for labels it already holds.
+        """
+        common = min(len(previous_live), self.current_index)
+        for label in np.flatnonzero(previous_live[:common] & ~self.live[:common]).tolist():
+            self.lexical.remove(label)
+        
+        added = np.array(self.live[:self.current_index], dtype=bool)
+        added[:common] &= ~previous_live[:common]
+        added = np.flatnonzero(added).tolist()
+        rows = self.store.get_by_labels(added) if added else {}
+        for label in added:
+            if label in rows:
+                self.filters.add(label, rows[label][1])
+                self.lexical.add(label, rows[label][1])
+    
+    def set_state(self, state: Dict[str, int]):
+        """
+        Commit store bookkeeping values (e.g. an ingestion job's progress) on their own
+        
+        Args:
+            state: Values to set, committed together under the write lock
+        """
+        self.load()
+        try:
+            with self._exclusive():
+                for key, value in state.items():
+                    self.store.set_state(key, value)
+                self.store.commit()
+        except Exception as e:
+            logger.error(f"Error saving state: {e}")
+            raise
+    
     def get_paper(self, paper_id: str) -> Optional[Dict]:
         """Get paper metadata by ID"""
-        return self.metadata.get(paper_id)
+        self.load()
+        return self.store.get(paper_id)
+    
+    def update_metadata(self, paper_id: str, metadata: Dict) -> bool:
+        """
+        Replace fields of a paper's metadata, keeping its vector
+        
+        Logged as an add of the stored vector under the merged metadata, so
+        the filter and BM25 indexes, log replay and reader workers all pick
+        the change up like any upsert. For ivf_pq indexes the stored vector
+        is its PQ-decoded approximation.
+        
+        Args:
+            paper_id: Unique identifier for the paper
+            metadata: Fields to set (title, authors, categories, publishedDate, ...)
+        
+        Returns:
+            True if the paper was in the index
+        """
+        self.load()
+        try:
+            with self._exclusive():
+                label = self.store.get_label(paper_id)
+                if label is None or not self._is_live(label):
+                    return False
+                
+                vector = self._reconstruct(np.array([label], dtype='int64'))
+                self._add_logged(paper_id, vector, {**self.store.get(paper_id), **metadata}, sync=True)
+                self.store.commit()
+            self._request_checkpoint()
+            
+            logger.info(f"Updated metadata of paper {paper_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error updating paper metadata: {e}")
+            raise
+    
+    def remove_paper(self, paper_id: str) -> bool:
+        """
+        Remove a paper and its vector from the index
+        
+        Args:
+            paper_id: Unique identifier for the paper
+        
+        Returns:
+            True if the paper was in the index
+        """
+        self.load()
+        try:
+            with self._exclusive():
+                label = self.store.get_label(paper_id)
+                if label is None:
+                    return False
+                
+                seq = self.wal.append('remove', paper_id, label)
+                self._apply_remove(paper_id, label)
+                self.applied_seq = seq
+                self.store.set_applied_seq(seq)
+                self.store.commit()
+            self._request_checkpoint()
+            
+            logger.info(f"Removed paper {paper_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error removing paper: {e}")
+            raise
+    
+    def _apply_remove(self, paper_id: str, label: Optional[int], write_store: bool = True):
+        """Drop a paper and its vector (shared by live writes and log replay)"""
+        with self._lock:
+            if write_store:
+                self.store.delete(paper_id)
+            if label is not None and self._is_live(label):
+                self._remove_label(label)
+    
+    def _remove_label(self, label: int):
+        """Delete a label in place, or tombstone it for indexes that cannot delete"""
+        self._set_live(label, False)
+        if self.lexical is not None:
+            self.lexical.remove(label)
+        if self._search_backlog is not None:
+            self._search_backlog.append((label, None))
+        if self.delta is not None and label >= self.base_end:
+            self.delta.remove_ids(np.array([label], dtype='int64'))
+        elif self.delta is None and index_factory.supports_remove(self.index):
+            self.index.remove_ids(np.array([label], dtype='int64'))
+        else:
+            # HNSW graphs and mapped checkpoints are never modified
+            self.tombstones.add(label)
+            self._tombstone_selector = None
+    
+    def _get_tombstone_selector(self) -> Optional[faiss.IDSelector]:
+        """ID selector excluding tombstoned labels from search (cached until tombstones change)"""
+        if not self.tombstones:
+            return None
+        # Concurrent searches build it once; it is only reset under the exclusive lock, so it
+        # outlives every search using it
+        with self._selector_lock:
+            if self._tombstone_selector is None:
+                # Keep the inner batch selector referenced, the Not selector only holds a pointer to it
+                batch = faiss.IDSelectorBatch(np.array(sorted(self.tombstones), dtype='int64'))
+                self._tombstone_selector = (faiss.IDSelectorNot(batch), batch)
+            return self._tombstone_selector[0]
+    
+    def tombstone_ratio(self) -> float:
+        """Fraction of index entries that are tombstones"""
+        return len(self.tombstones) / self.index.ntotal if self.index.ntotal else 0.0
+    
+    def compact(self):
+        """
+        Rebuild the index without tombstoned vectors (writer worker only)
+        
+        The rebuild runs outside the lock so searches keep being served; adds
+        and removals that happen meanwhile are replayed onto the new index
+        before it is swapped in.
+        """
+        self.load()
+        if not self.is_writer:
+            logger.info("Compaction runs on the writer worker, skipping")
+            return
+        
+        try:
+            with self._lock:
+                if not self.tombstones:
+                    return
+                removed = len(self.tombstones)
+            
+            logger.info(f"Compacting index: {self.live_count} live vectors, {removed} tombstones")
+            self._rebuild(index_factory.get_index_type(self.index), source='compaction')
+            if self.lexical is not None:
+                self.build_search_indexes(rebuild=True)
+            logger.info(f"Compaction finished, index holds {self.index.ntotal} vectors")
+        except Exception as e:
+            logger.error(f"Error compacting index: {e}")
+            raise
+    
+    def build_snapshot(self, index_type: Optional[str] = None) -> int:
+        """
+        Rebuild the index from the current vectors and activate it as a new snapshot
+        
+        Runs on the writer while searches and writes continue; reader workers
+        switch over when they see the new manifest.
+        
+        Args:
+            index_type: One of index_factory.INDEX_TYPES (defaults to the current target type)
+        
+        Returns:
+            Version of the activated snapshot
+        """
+        self.load()
+        index_type = index_type or self.index_type
+        try:
+            if index_type not in index_factory.INDEX_TYPES:
+                raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {index_factory.INDEX_TYPES})")
+            minimum = index_factory.min_training_vectors(index_type)
+            if index_factory.requires_training(index_type) and self.live_count < minimum:
+                raise ValueError(f"{index_type} needs {minimum} vectors to train, the index holds {self.live_count}")
+            
+            logger.info(f"Building {index_type} snapshot from {self.live_count} vectors")
+            self._rebuild(index_type, source='build', target_type=index_type)
+            return self.checkpoint_number
+        except Exception as e:
+            logger.error(f"Error building snapshot: {e}")
+            raise
+    
+    def rollback_snapshot(self, version: Optional[int] = None) -> int:
+        """
+        Serve an earlier snapshot's index structure again
+        
+        The old index is brought up to date with papers added and removed
+        since it was saved, so rolling back undoes a bad build, not writes.
+        Vectors added since are copied from the current index, which for
+        ivf_pq means their PQ-decoded approximations.
+        
+        Args:
+            version: Retained snapshot to restore (defaults to the newest one from an earlier build)
+        
+        Returns:
+            Version of the activated snapshot
+        """
+        self.load()
+        try:
+            snapshots = self._manifest()['snapshots']
+            current = next((entry['build'] for entry in snapshots if entry['version'] == self.checkpoint_number), None)
+            if version is None:
+                earlier = [entry for entry in snapshots if entry['build'] != current]
+                if not earlier:
+                    raise ValueError("No earlier build is retained to roll back to")
+                target = max(earlier, key=lambda entry: entry['version'])
+            else:
+                target = next((entry for entry in snapshots if entry['version'] == version), None)
+                if target is None:
+                    raise ValueError(f"Snapshot {version} is not retained")
+            
+            path = self._snapshot_path(target['version'])
+            logger.info(f"Rolling back to snapshot {path.name} (build {target['build']})")
+            with open(path / 'state.json', 'r') as f:
+                state = json.load(f)
+            # A private copy: the restored index is modified before it is saved again
+            index = index_factory.load_index(path)
+            if isinstance(index, ShardedIndex):
+                # Its files belong to another snapshot, none can be linked from the active one
+                index.dirty.update(range(len(index.shards)))
+            entries = np.union1d(
+                np.flatnonzero(np.load(path / 'labels.npy')), np.array(state.get('tombstones', []), dtype='int64')
+            ).astype('int64')
+            
+            self._activate(index, entries, source='rollback', build=target['build'],
+                           target_type=state.get('target_type', self.index_type))
+            return self.checkpoint_number
+        except Exception as e:
+            logger.error(f"Error rolling back snapshot: {e}")
+            raise
     
-    def remove_paper(self, paper_id: str):
-        """Remove a paper from the index (requires rebuild)"""
-        # Note: FAISS doesn't support direct deletion
-        # Would need to rebuild index without this paper
-        if paper_id in self.metadata:
-            del self.metadata[paper_id]
-            logger.info(f"Removed metadata for paper {paper_id}. Note: Vector still in index.")
+    def _rebuild(self, index_type: str, source: str, target_type: Optional[str] = None):
+        """Build a fresh index of a type from the live vectors, then activate it"""
+        self._building = True
+        try:
+            with self._lock:
+                labels = self._live_labels()
+                vectors = self.index.reconstruct_batch(labels) if len(labels) else None
+            
+            rebuilt = index_factory.create_index(self.dimension, index_type)
+            if vectors is not None:
+                trained = not rebuilt.is_trained
+                if trained:
+                    logger.info(f"Training {index_type} index on {len(vectors)} vectors...")
+                    index_factory.train_index(rebuilt, vectors)
+                rebuilt.add_with_ids(vectors, labels)
+                if trained:
+                    # Compared against the vectors the index was built from, so the recall includes
+                    # any loss from reduction and quantisation
+                    index_factory.configure_search(rebuilt)
+                    queries = vectors[np.random.choice(len(vectors), min(100, len(vectors)), replace=False)]
+                    self.last_recall = index_factory.recall_at_k(rebuilt, vectors, queries, k=10, ids=labels)
+                    logger.info(
+                        f"Trained {index_type} index, compression {index_factory.get_compression(rebuilt)}: "
+                        f"{index_factory.bytes_per_vector(rebuilt)} bytes/vector vs {4 * self.dimension} uncompressed, "
+                        f"recall@10 vs flat {self.last_recall:.3f}"
+                    )
+            self._activate(rebuilt, labels, source, target_type=target_type)
+        finally:
+            self._building = False
+    
+    def _activate(self, candidate: faiss.Index, entries: np.ndarray, source: str, build: Optional[int] = None,
+                  target_type: Optional[str] = None):
+        """
+        Swap a prepared index in and save it as the active snapshot
+        
+        The candidate holds the labels in `entries` and was prepared while
+        writes kept going: vectors added since are copied over from the
+        current index and labels removed since are dropped. Searches use the
+        old index until the swap, which is a single assignment under the lock.
+        No other save can start between the swap and the snapshot.
+        
+        Args:
+            target_type: New target index type, assigned together with the index (None keeps it)
+        """
+        with self._save_lock:
+            with self._lock:
+                live = self._live_labels()
+                
+                added = np.setdiff1d(live, entries)
+                if len(added):
+                    candidate.add_with_ids(self.index.reconstruct_batch(added), added)
+                
+                tombstones = set()
+                stale = np.setdiff1d(entries, live)
+                if len(stale):
+                    if index_factory.supports_remove(candidate):
+                        candidate.remove_ids(stale)
+                    else:
+                        tombstones = set(stale.tolist())
+                
+                index_factory.configure_search(candidate)
+                self.index = candidate
+                if target_type is not None:
+                    self.index_type = target_type
+                self.tombstones = tombstones
+                self._tombstone_selector = None
+                self.build_id = None
+            self._save_index(source=source, build=build)
+    
+    def request_snapshot_task(self, action: str, index_type: Optional[str] = None,
+                              version: Optional[int] = None) -> Dict:
+        """
+        Queue a snapshot build or rollback for the writer worker
+        
+        Any worker accepts the request; the writer starts it right away if
+        it is this process, otherwise on its next refresh.
+        
+        Args:
+            action: 'build' or 'rollback'
+            index_type: Index type to build
+            version: Snapshot to roll back to
+        
+        Returns:
+            The queued task
+        
+        Raises:
+            ValueError: Unknown action or index type
+            RuntimeError: Another task is still pending or running
+        """
+        self.load()
+        if action not in ('build', 'rollback'):
+            raise ValueError(f"Unknown snapshot action: {action}")
+        if index_type is not None and index_type not in index_factory.INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {index_factory.INDEX_TYPES})")
+        
+        with self.wal.exclusive():
+            task = self._read_task()
+            if task and task['state'] in ('pending', 'running'):
+                raise RuntimeError(f"A snapshot {task['action']} is already {task['state']}")
+            task = {
+                'action': action,
+                'index_type': index_type,
+                'version': version,
+                'state': 'pending',
+                'requested_at': time.time()
+            }
+            write_json_atomic(self.task_path, task)
+        
+        logger.info(f"Queued snapshot {action}")
+        if self.is_writer:
+            self._start_pending_task()
+        return task
+    
+    def _read_task(self) -> Optional[Dict]:
+        if not self.task_path.exists():
+            return None
+        with open(self.task_path, 'r') as f:
+            return json.load(f)
+    
+    def _start_pending_task(self):
+        """Run a queued snapshot task in the background (writer worker only)"""
+        running = self._task_thread is not None and self._task_thread.is_alive()
+        with self.wal.exclusive():
+            task = self._read_task()
+            if not task or running:
+                return
+            if task['state'] == 'running':
+                # The writer that was running it exited
+                task.update(state='failed', error='Interrupted by a worker restart', finished_at=time.time())
+                write_json_atomic(self.task_path, task)
+                return
+            if task['state'] != 'pending':
+                return
+            task.update(state='running', started_at=time.time())
+            write_json_atomic(self.task_path, task)
+        
+        self._task_thread = threading.Thread(
+            target=self._run_task, args=(task,), name="vector-db-snapshot", daemon=True
+        )
+        self._task_thread.start()
+    
+    def _run_task(self, task: Dict):
+        try:
+            if task['action'] == 'build':
+                task['result_version'] = self.build_snapshot(task.get('index_type'))
+            else:
+                task['result_version'] = self.rollback_snapshot(task.get('version'))
+            task['state'] = 'done'
+        except Exception as e:
+            task.update(state='failed', error=str(e))
+        
+        task['finished_at'] = time.time()
+        with self.wal.exclusive():
+            write_json_atomic(self.task_path, task)
+    
+    def get_snapshots(self) -> Dict:
+        """Retained snapshots, the active one, the one this worker serves and the last task"""
+        self.load()
+        manifest = self._manifest()
+        return {
+            'active': manifest['active'],
+            'serving': self.checkpoint_number,
+            'snapshots': manifest['snapshots'],
+            'task': self._read_task()
+        }
+    
+    def start_compaction(self):
+        """Start the background thread that compacts once tombstones, or removed papers in the search indexes, pass the threshold"""
+        self.load()
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+        
+        self._stop_compaction.clear()
+        self._compaction_thread = threading.Thread(
+            target=self._compaction_loop, name="vector-db-compaction", daemon=True
+        )
+        self._compaction_thread.start()
+    
+    def stop_compaction(self):
+        """Stop the background compaction thread"""
+        self._stop_compaction.set()
+        if self._compaction_thread:
+            self._compaction_thread.join()
+            self._compaction_thread = None
+    
+    def _search_indexes_stale(self) -> bool:
+        """Whether removed papers make up more than the compaction threshold of the BM25 postings"""
+        lexical = self.lexical
+        if lexical is None or not lexical.removed:
+            return False
+        return lexical.removed / (lexical.doc_count + lexical.removed) > settings.COMPACTION_TOMBSTONE_RATIO
+    
+    def _compaction_loop(self):
+        while not self._stop_compaction.wait(settings.COMPACTION_INTERVAL_SECONDS):
+            # Picks up training a worker that just took over as writer, or a failed build, left undone
+            self._maybe_train_index()
+            if self.is_writer and self.tombstone_ratio() > settings.COMPACTION_TOMBSTONE_RATIO:
+                try:
+                    self.compact()
+                except Exception:
+                    pass  # Already logged, retry on the next tick
+            # Every worker keeps its own search indexes, and indexes that remove in place never compact
+            if self._search_indexes_stale():
+                try:
+                    self.build_search_indexes(rebuild=True)
+                except Exception as e:
+                    logger.error(f"Error rebuilding search indexes: {e}")
+    
+    def start_sync(self):
+        """Start the background thread that follows other workers' checkpoints and writes, and checkpoints the writer's log"""
+        self.load()
+        if self._sync_thread and self._sync_thread.is_alive():
+            return
+        
+        self._stop_sync.clear()
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="vector-db-sync", daemon=True)
+        self._sync_thread.start()
+    
+    def stop_sync(self):
+        """Stop the background sync thread"""
+        self._stop_sync.set()
+        self._checkpoint_due.set()
+        if self._sync_thread:
+            self._sync_thread.join()
+            self._sync_thread = None
+    
+    def _sync_loop(self):
+        while True:
+            # Woken early by a write that pushed the log past the checkpoint threshold
+            self._checkpoint_due.wait(settings.SNAPSHOT_POLL_SECONDS)
+            self._checkpoint_due.clear()
+            if self._stop_sync.is_set():
+                return
+            try:
+                self.refresh()
+            except Exception:
+                pass  # Already logged, retry on the next tick
+    
+    def evaluate_recall(self, k: int = 10, sample_size: int = 100,
+                        nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict:
+        """
+        Measure recall@k of the current index against an exact flat baseline
+        
+        Queries are sampled from the indexed vectors. For ivf_pq and compressed
+        indexes the baseline is built from the decoded vectors, so quantisation
+        and reduction error is not counted (last_recall, measured against the
+        original vectors at training time, includes it). On reader workers only
+        the mapped checkpoint is measured.
+        
+        Args:
+            k: Number of neighbours compared per query
+            sample_size: Number of query vectors to sample
+            nprobe: IVF lists to visit for the index under test
+            ef_search: HNSW candidate list size for the index under test
+        
+        Returns:
+            Dict with the measured recall and the parameters used
+        """
+        self.load()
+        try:
+            with self._lock.shared():
+                labels = self._live_labels()
+                if self.delta is not None:
+                    labels = labels[labels < self.base_end]
+                if len(labels) == 0:
+                    return {'index_type': index_factory.get_index_type(self.index), 'k': k, 'recall': None}
+                
+                vectors = self.index.reconstruct_batch(labels)
+                queries = vectors[np.random.choice(len(labels), min(sample_size, len(labels)), replace=False)]
+                params = index_factory.search_params(self.index, nprobe, ef_search, self._get_tombstone_selector())
+                recall = index_factory.recall_at_k(self.index, vectors, queries, k, ids=labels, params=params)
+            
+            return {
+                'index_type': index_factory.get_index_type(self.index),
+                'compression': index_factory.get_compression(self.index),
+                'bytes_per_vector': index_factory.bytes_per_vector(self.index),
+                'k': k,
+                'sample_size': len(queries),
+                'nprobe': nprobe,
+                'ef_search': ef_search,
+                'recall': recall
+            }
+        except Exception as e:
+            logger.error(f"Error evaluating recall: {e}")
+            raise
     
     def get_stats(self) -> Dict:
         """Get database statistics"""
         return {
-            'total_papers': len(self.metadata),
+            'total_papers': self.live_count,
             'index_size': self.index.ntotal if self.index else 0,
-            'dimension': self.dimension
+            'tombstones': len(self.tombstones),
+            'dimension': self.dimension,
+            'index_type': index_factory.get_index_type(self.index) if self.index else None,
+            'configured_index_type': self.index_type,
+            'compression': index_factory.get_compression(self.index) if self.index else None,
+            'bytes_per_vector': index_factory.bytes_per_vector(self.index) if self.index else None,
+            'uncompressed_bytes_per_vector': 4 * self.dimension,
+            'shards': index_factory.shard_count(self.index) if self.index else 0,
+            'last_recall': self.last_recall,
+            'loaded': self.loaded,
+            'role': 'writer' if self.is_writer else 'reader',
+            'snapshot': self.checkpoint_number,
+            'applied_seq': self.applied_seq,
+            'delta_size': self.delta.ntotal if self.delta is not None else 0
         }
 
 # Global instance
-vector_db = VectorDatabase()
\ No newline at end of file
+vector_db = VectorDatabase()
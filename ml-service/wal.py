@@ -0,0 +1,217 @@
+import json
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from utils import setup_logger, fsync_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
+
+logger = setup_logger(__name__)
+
+# Record header: sequence number, payload length, CRC32 of the payload
+_HEADER = struct.Struct('<QII')
+_JSON_LEN = struct.Struct('<I')
+
+class LogReset(Exception):
+    """The log was replaced by a checkpoint since it was last read"""
+
+class WriteAheadLog:
+    """
+    Append-only log of vector database operations, shared by all workers
+
+    Each record is framed as header + payload, where the payload is a JSON
+    document (op, paperId, label, metadata, replaces) optionally followed by the raw
+    float32 vector. Appends from different processes are serialised with an
+    flock on a sidecar lock file; readers tail the file without locking and
+    stop at the first incomplete record. A torn write left by a crashed
+    process is cut off by the next append.
+    """
+
+    def __init__(self, path: Path, fsync: bool = True):
+        """
+        Args:
+            path: Log file location
+            fsync: fsync on every sync() (otherwise only flush to the OS)
+        """
+        self.path = Path(path)
+        self.fsync = fsync
+        self.last_seq = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = open(self.path.with_suffix(self.path.suffix + '.lock'), 'a+b')
+        self._open()
+
+    @property
+    def size(self) -> int:
+        """Bytes of intact records read or written so far"""
+        return self._offset
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the cross-process append lock (re-entrant within a process)"""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def append(self, op: str, paper_id: str, label: Optional[int] = None,
+               vector: Optional[np.ndarray] = None, metadata: Optional[Dict] = None,
+               replaces: Optional[int] = None, sync: bool = True) -> int:
+        """
+        Append an operation to the log
+
+        Must be called inside exclusive() after tail() has consumed every
+        record, so that the sequence number and end offset are current.
+
+        Args:
+            op: 'add' or 'remove'
+            paper_id: Paper the operation applies to
+            label: FAISS label added or removed
+            vector: Embedding vector (add only)
+            metadata: Paper metadata (add only)
+            replaces: Label of the paper's previous vector, if any (add only)
+            sync: Flush (and fsync if enabled) before returning
+
+        Returns:
+            Sequence number of the record
+        """
+        doc = json.dumps({
+            'op': op, 'paperId': paper_id, 'label': label, 'metadata': metadata, 'replaces': replaces
+        }).encode('utf-8')
+        payload = _JSON_LEN.pack(len(doc)) + doc
+        if vector is not None:
+            payload += np.ascontiguousarray(vector, dtype='float32').tobytes()
+
+        self._file.flush()
+        if os.fstat(self._file.fileno()).st_size > self._offset:
+            logger.warning(f"Truncating torn tail of write-ahead log at byte {self._offset}")
+            self._file.truncate(self._offset)
+
+        seq = self.last_seq + 1
+        self._file.write(_HEADER.pack(seq, len(payload), zlib.crc32(payload)) + payload)
+        self.last_seq = seq
+        self._offset += _HEADER.size + len(payload)
+
+        if sync:
+            self.sync()
+        return seq
+
+    def sync(self):
+        """Make appended records durable"""
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def tail(self) -> Iterator[Dict]:
+        """
+        Yield intact records written since the previous call, in order
+
+        Raises:
+            LogReset: The file was replaced by a checkpoint. The caller must
+                reload that checkpoint; the next tail() reads the new file.
+        """
+        self._file.flush()
+        if os.stat(self.path).st_ino != self._inode:
+            self._close_files()
+            self._open()
+            raise LogReset()
+
+        self._reader.seek(self._offset)
+        while True:
+            header = self._reader.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            seq, length, crc = _HEADER.unpack(header)
+            payload = self._reader.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+
+            (doc_len,) = _JSON_LEN.unpack_from(payload)
+            record = json.loads(payload[_JSON_LEN.size:_JSON_LEN.size + doc_len])
+            record['seq'] = seq
+            vector_bytes = payload[_JSON_LEN.size + doc_len:]
+            record['vector'] = np.frombuffer(vector_bytes, dtype='float32') if vector_bytes else None
+
+            self._offset += _HEADER.size + length
+            self.last_seq = max(self.last_seq, seq)
+            yield record
+
+    def rewind(self):
+        """Read the log from the start again on the next tail()"""
+        self._offset = 0
+
+    def reset(self, seq: int):
+        """
+        Drop the records up to seq, once a checkpoint covers them
+
+        Must be called inside exclusive(), after tail() has consumed every
+        record. Records after seq (appended while the checkpoint was being
+        written) are carried over. The new log replaces the old one
+        atomically, so a crash here leaves either the full old log (replay
+        skips records <= seq) or the new one.
+        """
+        self._file.flush()
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        kept = 0
+        with open(tmp_path, 'wb') as f:
+            start = self._offset_after(seq)
+            self._reader.seek(start)
+            while kept < self._offset - start:
+                data = self._reader.read(min(1024 * 1024, self._offset - start - kept))
+                if not data:
+                    break
+                f.write(data)
+                kept += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        fsync_path(self.path.parent)
+
+        self._close_files()
+        self._open()
+        self._offset = kept
+        self.last_seq = max(self.last_seq, seq)
+
+    def _offset_after(self, seq: int) -> int:
+        """Offset of the first record after seq (the end of the intact records if there is none)"""
+        if self.last_seq <= seq:
+            return self._offset
+        offset = 0
+        while offset < self._offset:
+            self._reader.seek(offset)
+            record_seq, length, _ = _HEADER.unpack(self._reader.read(_HEADER.size))
+            if record_seq > seq:
+                break
+            offset += _HEADER.size + length
+        return offset
+
+    def close(self):
+        self.sync()
+        self._close_files()
+        self._lock_file.close()
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        self._inode = os.fstat(self._reader.fileno()).st_ino
+        self._offset = 0
+
+    def _close_files(self):
+        self._file.close()
+        self._reader.close()